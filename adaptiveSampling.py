@@ -0,0 +1,51 @@
+import numpy as np
+import openmdao.api as om
+from multiOutputSurrogate import MultiOutputSurrogate
+from sparseSurrogate import farthestPointSample
+
+def selectTrainingPoints(x, y, nInitial = 50, maxPoints = 400, tolerance = 1e-3, nAdd = 10, sharedHyperparameters = True, surrogateClass = om.KrigingSurrogate, surrogateOptions = None):
+
+    # Greedy active learning over a table of known responses: start from a space-filling subset,
+    # fit the surrogate that will be trained on the selection (surrogateClass with surrogateOptions,
+    # one for all outputs or one per output as in MultiOutputSurrogate) to the selected points,
+    # predict the rest of the table and add the nAdd worst-predicted points. The table itself is the
+    # error oracle, so the error is the true held-out error on the points not yet used (normalized by
+    # each output's standard deviation) rather than an estimate. Stops when the RMS error of every
+    # output is below tolerance or the point budget is spent. Returns the selected indices and the
+    # held-out error after each round.
+    x = np.asarray(x, dtype = float)
+    y = np.asarray(y, dtype = float).reshape(x.shape[0], -1)
+    nPoints = x.shape[0]
+    maxPoints = min(maxPoints, nPoints)
+    outputs = list(range(y.shape[1]))
+
+    X_std = np.std(x, axis = 0)
+    X_std[X_std == 0.] = 1.
+    Y_std = np.std(y, axis = 0)
+    Y_std[Y_std == 0.] = 1.
+
+    idxSelected = farthestPointSample((x - np.mean(x, axis = 0)) / X_std, min(nInitial, maxPoints))
+    history = []
+
+    while True:
+        surrogate = MultiOutputSurrogate(outputs, sharedHyperparameters, surrogateClass = surrogateClass, **(surrogateOptions or {}))
+        surrogate.train(x[idxSelected], {output: y[idxSelected, output] for output in outputs})
+
+        idxHeldOut = np.setdiff1d(np.arange(nPoints), idxSelected)
+        if idxHeldOut.size == 0:
+            history.append({'nPoints': int(idxSelected.size), 'rmsError': [0.] * len(outputs), 'maxError': [0.] * len(outputs)})
+            break
+
+        prediction = surrogate.predict(x[idxHeldOut])
+        error = np.abs(np.column_stack([prediction[output][0] for output in outputs]) - y[idxHeldOut]) / Y_std
+        rmsError = np.sqrt(np.mean(error**2, axis = 0))
+        maxError = np.max(error, axis = 0)
+        history.append({'nPoints': int(idxSelected.size), 'rmsError': rmsError.tolist(), 'maxError': maxError.tolist()})
+
+        if np.all(rmsError <= tolerance) or idxSelected.size >= maxPoints:
+            break
+
+        nNew = min(nAdd, maxPoints - idxSelected.size)
+        idxSelected = np.append(idxSelected, idxHeldOut[np.argsort(np.max(error, axis = 1))[::-1][:nNew]])
+
+    return np.sort(idxSelected), history
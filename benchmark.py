@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import numpy as np
+import openmdao
+import openmdao.api as om
+from syntheticData import syntheticPropData, createSyntheticPropModel
+from surrogateCache import CachedKrigingSurrogate
+from sparseSurrogate import SparseKrigingSurrogate
+from compiledSurrogate import compileKrigingSurrogate, CompiledKrigingSurrogate
+from parametricSurrogate import ParametricPropSurrogate
+from motorModelOpenmdog import ElectricPropulsion, propInputNames
+from operatingPoint import limitThrottle
+from continuation import sweepOperatingPoints
+
+dirBenchmarkResults = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_results')
+
+# Motor, battery and prop of the propulsion benchmarks, sized for the synthetic prop
+benchmarkDesign = {
+    'battery.voltage_supply': 22.2,
+    'battery.resistance': 0.012,
+    'motor.kv': 400.,
+    'motor.resistance': 0.015,
+    'motor.idle_current': 1.,
+    'prop.diameter': 12.,
+    'prop.pitch': 6.
+}
+
+# Problem sizes of the full and quick (--quick) suites
+benchmarkSizes = {
+    'full': {'krigingSizes': [100, 200, 400, 800], 'sparseSizes': [1000, 4000, 16000, 64000], 'batchSizes': [1, 10, 100, 1000, 10000], 'nodes': [1, 51, 501], 'repeats': 5},
+    'quick': {'krigingSizes': [100, 200], 'sparseSizes': [1000, 4000], 'batchSizes': [1, 100, 1000], 'nodes': [1, 51], 'repeats': 3}
+}
+
+def timeCall(function, repeats = 5, minTime = 0.02):
+
+    # Best and median wall time per call over repeated samples; the best is the least noisy for
+    # comparisons. Fast calls are repeated within a sample until it takes minTime, so they are not
+    # dominated by the timer resolution
+    def sample(nCalls):
+        tStart = time.perf_counter()
+        for _ in range(nCalls):
+            function()
+        return time.perf_counter() - tStart
+
+    nCalls = 1
+    if minTime > 0:
+        while sample(nCalls) < minTime and nCalls < 2**20:
+            nCalls *= 2
+
+    times = [sample(nCalls) / nCalls for _ in range(repeats)]
+    return {'min': float(np.min(times)), 'median': float(np.median(times)), 'repeats': repeats, 'calls': nCalls}
+
+def propTrainingArrays(nPoints, seed = 0):
+
+    propData = syntheticPropData(nPoints, seed)
+    return np.column_stack([propData[name] for name in propInputNames]), np.column_stack([propData['thrust'], propData['power']])
+
+def benchmarkSurrogateTraining(dirWork, krigingSizes, sparseSizes):
+
+    # Training from scratch (no cache hits) against the number of training points
+    results = {}
+    for nPoints in krigingSizes:
+        x, y = propTrainingArrays(nPoints)
+        def train():
+            CachedKrigingSurrogate(cache_dir = os.path.join(dirWork, 'kriging_cache'), refresh = True, lapack_driver = 'gesdd').train(x, y)
+        results[f'train.kriging.{nPoints}'] = timeCall(train, 1, 0)
+
+    for nPoints in sparseSizes:
+        x, y = propTrainingArrays(nPoints)
+        def train():
+            SparseKrigingSurrogate(cache_dir = None).train(x, y)
+        results[f'train.sparse.{nPoints}'] = timeCall(train, 1, 0)
+
+    return results
+
+def benchmarkSurrogateEvaluation(dirWork, batchSizes, repeats):
+
+    # Batched predict and linearize of the compiled (exported dense Kriging), sparse and parametric
+    # (low fidelity) surrogates against the number of query points
+    x, y = propTrainingArrays(400)
+    kriging = CachedKrigingSurrogate(cache_dir = os.path.join(dirWork, 'kriging_cache'), lapack_driver = 'gesdd')
+    kriging.train(x, y)
+    pathCompiled = os.path.join(dirWork, 'benchmark.compiled.npz')
+    compileKrigingSurrogate(kriging, pathCompiled)
+
+    xSparse, ySparse = propTrainingArrays(4000)
+    sparse = SparseKrigingSurrogate(cache_dir = None)
+    sparse.train(xSparse, ySparse)
+
+    parametric = ParametricPropSurrogate()
+    parametric.train(xSparse, ySparse)
+
+    surrogates = {'compiled': CompiledKrigingSurrogate(path = pathCompiled), 'sparse': sparse, 'parametric': parametric}
+    results = {}
+    for batchSize in batchSizes:
+        xQuery, _ = propTrainingArrays(batchSize, seed = 1)
+        for name, surrogate in surrogates.items():
+            results[f'predict.{name}.{batchSize}'] = timeCall(lambda: surrogate.vectorized_predict(xQuery), repeats)
+            results[f'linearize.{name}.{batchSize}'] = timeCall(lambda: surrogate.vectorized_linearize(xQuery), repeats)
+
+    return results
+
+def propulsionProblem(nn, dirModel, propSurrogateType, powerBalanceSolver):
+
+    prob = om.Problem(reports = None)
+    if not powerBalanceSolver:
+        prob.model.nonlinear_solver = om.NewtonSolver(solve_subsystems = True, maxiter = 50, atol = 1e-8, rtol = 1e-9, iprint = 0)
+        prob.model.linear_solver = om.DirectSolver()
+    prob.model.add_subsystem('electric_propulsion', ElectricPropulsion(num_nodes = nn, power_balance_solver = powerBalanceSolver, prop_model_dir = dirModel, prop_surrogate_type = propSurrogateType), promotes = ['*'])
+    prob.setup()
+
+    for name, value in benchmarkDesign.items():
+        prob.set_val(name, value)
+    prob.set_val('esc.throttle', 1.)
+    prob.set_val('prop.velocity', np.linspace(0, 20, nn))
+    return prob
+
+def benchmarkPropulsion(dirModel, propSurrogateType, nodes, repeats):
+
+    # Operating point solves with Newton and with the power balance solver, a natural continuation
+    # sweep and the full-throttle plus 500 W power-limited thrust curves of thrustCurve.py
+    results = {}
+    for nn in nodes:
+        for solverName, powerBalanceSolver in [('newton', False), ('power_balance', True)]:
+            prob = propulsionProblem(nn, dirModel, propSurrogateType, powerBalanceSolver)
+            def solve():
+                prob.set_val('power_net.current', 10.)
+                prob.run_model()
+            results[f'solve.{solverName}.{nn}'] = timeCall(solve, repeats)
+
+    # The sweep does its own Newton iteration, so its cost is also reported in Newton iterations,
+    # model evaluations and linearizations, which do not depend on the machine. The residual of the
+    # sparse surrogate is only reproducible to about 1e-7 W, so the tolerance is above that
+    prob = propulsionProblem(1, dirModel, propSurrogateType, False)
+    def sweep():
+        prob.set_val('power_net.current', 10.)
+        return sweepOperatingPoints(prob, 'velocity', np.linspace(0, 20, 41), units = 'm/s', atol = 1e-6)
+    counts = {name: int(np.sum(value)) for name, value in sweep().items() if name in ['iterations', 'evaluations', 'linearizations']}
+    results['sweep.velocity.natural'] = dict(timeCall(sweep, repeats), **counts)
+
+    prob = propulsionProblem(51, dirModel, propSurrogateType, True)
+    def thrustCurve():
+        prob.set_val('esc.throttle', 1.)
+        prob.set_val('power_net.current', 10.)
+        prob.run_model()
+        limitThrottle(prob, 'power', 500, units = 'W')
+    results['thrust_curve.51'] = timeCall(thrustCurve, repeats)
+
+    return results
+
+def gitCommit():
+
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd = os.path.dirname(os.path.abspath(__file__)), capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def runBenchmarks(dirWork = None, quick = False, propPoints = 2000, propSurrogateType = 'sparse'):
+
+    # The whole suite on synthetic data written to dirWork (a temporary directory by default)
+    sizes = benchmarkSizes['quick' if quick else 'full']
+    dirTemporary = None
+    if dirWork is None:
+        dirWork = dirTemporary = tempfile.mkdtemp(prefix = 'benchmark_')
+
+    try:
+        dirModel = createSyntheticPropModel(os.path.join(dirWork, 'prop_model'), propPoints)
+        results = {}
+        for name, benchmark in [('surrogate training', lambda: benchmarkSurrogateTraining(dirWork, sizes['krigingSizes'], sizes['sparseSizes'])),
+                                ('surrogate evaluation', lambda: benchmarkSurrogateEvaluation(dirWork, sizes['batchSizes'], sizes['repeats'])),
+                                ('propulsion', lambda: benchmarkPropulsion(dirModel, propSurrogateType, sizes['nodes'], sizes['repeats']))]:
+            tStart = time.time()
+            results.update(benchmark())
+            print(f'{name}: {time.time() - tStart:.1f} s')
+    finally:
+        if dirTemporary is not None:
+            shutil.rmtree(dirTemporary, ignore_errors = True)
+
+    metadata = {
+        'commit': gitCommit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'suite': 'quick' if quick else 'full',
+        'propPoints': propPoints,
+        'propSurrogateType': propSurrogateType,
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'openmdao': openmdao.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor()
+    }
+    return {'metadata': metadata, 'results': results}
+
+def saveBenchmarkResults(benchmarkResults, dirResults = dirBenchmarkResults):
+
+    os.makedirs(dirResults, exist_ok = True)
+    metadata = benchmarkResults['metadata']
+    pathResults = os.path.join(dirResults, f'{metadata["time"].replace(":", "")}_{metadata["commit"]}_{metadata["suite"]}.json')
+    pathTemporary = f'{pathResults}.{os.getpid()}.tmp'
+    with open(pathTemporary, 'w') as fileResults:
+        json.dump(benchmarkResults, fileResults, indent = 4)
+    os.replace(pathTemporary, pathResults)
+    return pathResults
+
+def compareBenchmarkResults(baseline, current, tolerance = 1.25):
+
+    # Ratio of the best times of the benchmarks in both runs; slower than tolerance times the
+    # baseline is a regression
+    comparison = []
+    for name in sorted(set(baseline['results']) & set(current['results'])):
+        ratio = current['results'][name]['min'] / max(baseline['results'][name]['min'], 1e-12)
+        comparison.append({'name': name, 'baseline': baseline['results'][name]['min'], 'current': current['results'][name]['min'], 'ratio': ratio, 'regression': ratio > tolerance})
+    return comparison
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description = 'Time surrogate training and evaluation and ElectricPropulsion solves on synthetic data')
+    parser.add_argument('--quick', action = 'store_true', help = 'smaller problem sizes and fewer repeats')
+    parser.add_argument('--dir-work', default = None, help = 'directory for the synthetic data and surrogate caches (default: a temporary directory)')
+    parser.add_argument('--dir-results', default = dirBenchmarkResults, help = 'directory the results are written to')
+    parser.add_argument('--prop-points', type = int, default = 2000, help = 'synthetic prop table points of the propulsion benchmarks')
+    parser.add_argument('--prop-surrogate', default = 'sparse', choices = ['kriging', 'compiled', 'sparse'], help = 'prop surrogate type of the propulsion benchmarks')
+    parser.add_argument('--compare', default = None, help = 'earlier results file to compare against')
+    parser.add_argument('--tolerance', type = float, default = 1.25, help = 'slowdown ratio reported as a regression')
+    args = parser.parse_args()
+
+    benchmarkResults = runBenchmarks(args.dir_work, args.quick, args.prop_points, args.prop_surrogate)
+    pathResults = saveBenchmarkResults(benchmarkResults, args.dir_results)
+    print(f'Results written to {pathResults}')
+
+    for name, timing in benchmarkResults['results'].items():
+        counts = ''.join(f'  {timing[count]} {count}' for count in ['iterations', 'evaluations', 'linearizations'] if count in timing)
+        print(f'{name:36s} {1e3 * timing["min"]:12.3f} ms{counts}')
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as fileBaseline:
+            baseline = json.load(fileBaseline)
+        comparison = compareBenchmarkResults(baseline, benchmarkResults, args.tolerance)
+        print(f'\nAgainst {baseline["metadata"]["commit"]} ({baseline["metadata"]["time"]}):')
+        for row in comparison:
+            print(f'{row["name"]:36s} {row["ratio"]:6.2f}x{"  REGRESSION" if row["regression"] else ""}')
+        if any(row['regression'] for row in comparison):
+            sys.exit(1)
@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import shutil
+import pickle
+from collections.abc import Mapping
+import numpy as np
+import scipy as sc
+
+def saveColumns(dirColumns, columns, index = None):
+
+    # One .npy file per column in a new version directory, then an index.json naming the version
+    # and the columns, written to a temporary name and moved into place. Replacing the index is the
+    # only step readers can observe, so they see either the old or the new database as a whole,
+    # never a mix of columns from both. Versions older than the one the replaced index named are
+    # removed; that one is kept for readers that loaded the old index before the replace.
+    os.makedirs(dirColumns, exist_ok = True)
+    try:
+        previousVersion = loadColumnIndex(dirColumns).get('version')
+    except (FileNotFoundError, ValueError):
+        previousVersion = None
+
+    version = f'v{time.time_ns():020d}_{os.getpid()}'
+    dirVersion = os.path.join(dirColumns, version)
+    os.makedirs(dirVersion)
+    for name, column in columns.items():
+        np.save(os.path.join(dirVersion, f'{name}.npy'), np.ascontiguousarray(column))
+
+    index = dict(index or {})
+    index['version'] = version
+    index['columns'] = list(columns)
+    pathIndex = os.path.join(dirColumns, 'index.json')
+    pathTemporary = f'{pathIndex}.{os.getpid()}.tmp'
+    with open(pathTemporary, 'w') as fileIndex:
+        json.dump(index, fileIndex, indent = 4)
+    os.replace(pathTemporary, pathIndex)
+
+    # Versions newer than the previous one other than this one may belong to a concurrent save
+    # and are left alone. Columns written before versioning lie directly in dirColumns and are
+    # removed by the first versioned save, whose index no longer names them.
+    for name in os.listdir(dirColumns):
+        path = os.path.join(dirColumns, name)
+        if os.path.isdir(path) and isColumnVersion(name) and previousVersion is not None and name < previousVersion:
+            shutil.rmtree(path, ignore_errors = True)
+        elif os.path.isfile(path) and name.endswith('.npy'):
+            os.remove(path)
+
+def isColumnVersion(name):
+
+    return name.startswith('v') and name[1:].replace('_', '').isdigit()
+
+def loadColumnIndex(dirColumns):
+
+    with open(os.path.join(dirColumns, 'index.json'), 'r') as fileIndex:
+        return json.load(fileIndex)
+
+def columnDirectory(dirColumns, index):
+
+    # Directory holding the column files of an index; unversioned indexes (databases written
+    # before versioning, performance maps) keep them next to the index
+    if 'version' in index:
+        return os.path.join(dirColumns, index['version'])
+    return dirColumns
+
+def loadColumn(dirColumns, name, mmap = True):
+
+    # dirColumns is the directory of the column files, see columnDirectory
+    return np.load(os.path.join(dirColumns, f'{name}.npy'), mmap_mode = 'r' if mmap else None)
+
+def loadColumns(dirColumns, mmap = True):
+
+    # The index is read once, so all columns come from the same version
+    index = loadColumnIndex(dirColumns)
+    dirVersion = columnDirectory(dirColumns, index)
+    return {name: loadColumn(dirVersion, name, mmap) for name in index['columns']}
+
+def saveSurrogateModelData(dirModel, surrogateModelData):
+
+    saveColumns(os.path.join(dirModel, 'surrogate_model_data'), surrogateModelData)
+
+def loadSurrogateModelData(dirModel, mmap = True):
+
+    # Columnar surrogate_model_data/ directory. A legacy pickle (e.g. a prop model downloaded before
+    # the conversion) is converted on first load when the directory is writable.
+    dirSurrogateModelData = os.path.join(dirModel, 'surrogate_model_data')
+    if os.path.exists(os.path.join(dirSurrogateModelData, 'index.json')):
+        return loadColumns(dirSurrogateModelData, mmap)
+
+    with open(os.path.join(dirModel, 'surrogate_model_data.pickle'), 'rb') as fileSurrogateModelData:
+        surrogateModelData = pickle.load(fileSurrogateModelData)
+
+    try:
+        saveSurrogateModelData(dirModel, surrogateModelData)
+    except OSError:
+        return surrogateModelData
+
+    return loadColumns(dirSurrogateModelData, mmap)
+
+def convertMotoCalcData(pathMotoCalcData, dirDatabase):
+
+    # One-time conversion of the MATLAB MotoCalc export: every performance header becomes one column
+    # of all motors' rows stacked, and the index maps each motor to its row range
+    motoCalcDataMatlab = sc.io.loadmat(pathMotoCalcData)
+
+    motors = [string.strip(' ') for string in motoCalcDataMatlab['motors']]
+    motorDataHeaders = [string.strip(' ') for string in motoCalcDataMatlab['motorDataHeaders']]
+    motorPerformanceDataHeaders = [string.strip(' ') for string in motoCalcDataMatlab['motorPerformanceDataHeaders']]
+
+    motorPerformanceData = [data.astype(float) for data in np.squeeze(motoCalcDataMatlab['motorPerformanceData']).tolist()]
+    nRows = np.array([data.shape[0] for data in motorPerformanceData])
+    rowStop = np.cumsum(nRows)
+    rowStart = rowStop - nRows
+    motorPerformanceData = np.concatenate(motorPerformanceData, axis = 0)
+
+    columns = {'motorData': motoCalcDataMatlab['motorData'].astype(float)}
+    for idxMotorPerformanceDataHeader, motorPerformanceDataHeader in enumerate(motorPerformanceDataHeaders):
+        columns[motorPerformanceDataHeader] = motorPerformanceData[:, idxMotorPerformanceDataHeader]
+
+    index = {
+        'motors': motors,
+        'motorDataHeaders': motorDataHeaders,
+        'motorPerformanceDataHeaders': motorPerformanceDataHeaders,
+        'rows': {motor: [int(start), int(stop)] for motor, start, stop in zip(motors, rowStart, rowStop)}
+    }
+    saveColumns(dirDatabase, columns, index)
+
+class MotoCalcDatabase(Mapping):
+
+    # Read-only view of a converted MotoCalc database with the same layout as the dictionary
+    # loadMotoCalcData used to build: database[motor][motorDataHeader] and
+    # database[motor]['motorPerformanceData'][motorPerformanceDataHeader]. Columns are memory-mapped
+    # on first use and only the requested motor's rows are sliced out of them. The version read at
+    # construction is used throughout, so a database converted again meanwhile is not mixed in.
+    def __init__(self, dirDatabase):
+        self.dirDatabase = dirDatabase
+        index = loadColumnIndex(dirDatabase)
+        self.dirColumns = columnDirectory(dirDatabase, index)
+        self.motors = index['motors']
+        self.motorDataHeaders = index['motorDataHeaders']
+        self.motorPerformanceDataHeaders = index['motorPerformanceDataHeaders']
+        self.rows = index['rows']
+        self._idxMotor = {motor: idxMotor for idxMotor, motor in enumerate(self.motors)}
+        self._columns = {}
+
+    def column(self, name):
+        if name not in self._columns:
+            self._columns[name] = loadColumn(self.dirColumns, name)
+        return self._columns[name]
+
+    def motorData(self, motor):
+        motorData = self.column('motorData')[self._idxMotor[motor]]
+        return {motorDataHeader: float(motorData[idxMotorDataHeader]) for idxMotorDataHeader, motorDataHeader in enumerate(self.motorDataHeaders)}
+
+    def motorPerformanceData(self, motor, headers = None):
+        if headers is None:
+            headers = self.motorPerformanceDataHeaders
+        rowStart, rowStop = self.rows[motor]
+        return {header: self.column(header)[rowStart:rowStop] for header in headers}
+
+    def __getitem__(self, motor):
+        if motor not in self.rows:
+            raise KeyError(motor)
+        motorEntry = self.motorData(motor)
+        motorEntry['motorPerformanceData'] = self.motorPerformanceData(motor)
+        return motorEntry
+
+    def __iter__(self):
+        return iter(self.motors)
+
+    def __len__(self):
+        return len(self.motors)
+
+def openMotoCalcDatabase(pathMotoCalcData):
+
+    # A .mat export is converted next to itself on first use (or when the .mat is newer than the
+    # conversion); a directory is opened directly
+    if os.path.isdir(pathMotoCalcData):
+        return MotoCalcDatabase(pathMotoCalcData)
+
+    dirDatabase = os.path.splitext(pathMotoCalcData)[0] + '_columnar'
+    pathIndex = os.path.join(dirDatabase, 'index.json')
+    if not os.path.exists(pathIndex) or os.path.getmtime(pathIndex) < os.path.getmtime(pathMotoCalcData):
+        convertMotoCalcData(pathMotoCalcData, dirDatabase)
+
+    return MotoCalcDatabase(dirDatabase)
@@ -0,0 +1,108 @@
+import os
+import numpy as np
+import openmdao.api as om
+from instrumentation import ProfiledSection
+
+def saveCompiledSurrogate(pathCompiled, evaluationData):
+
+    # The inverse correlation matrix is only needed for the RMSE and is stored last, so evaluators
+    # that skip the RMSE never read it
+    os.makedirs(os.path.dirname(os.path.abspath(pathCompiled)), exist_ok = True)
+    pathTemporary = f'{pathCompiled}.{os.getpid()}.tmp'
+    with open(pathTemporary, 'wb') as fileCompiled:
+        np.savez(fileCompiled, **evaluationData)
+    os.replace(pathTemporary, pathCompiled)
+
+def loadCompiledSurrogate(pathCompiled, evalRmse = True):
+
+    with np.load(pathCompiled) as compiled:
+        return {name: compiled[name] for name in compiled.files if evalRmse or name != 'inverse_correlation'}
+
+def compileKrigingSurrogate(surrogate, pathCompiled):
+
+    # Export everything a trained KrigingSurrogate needs at evaluation time
+    inverseCorrelation = (surrogate.Vh.T * surrogate.S_inv).dot(surrogate.U.T)
+
+    saveCompiledSurrogate(pathCompiled, {
+        'X': surrogate.X,
+        'X_mean': surrogate.X_mean,
+        'X_std': surrogate.X_std,
+        'Y_mean': surrogate.Y_mean,
+        'Y_std': surrogate.Y_std,
+        'thetas': surrogate.thetas,
+        'alpha': surrogate.alpha,
+        'sigma2': surrogate.sigma2,
+        'inverse_correlation': inverseCorrelation
+    })
+
+class CompiledKrigingSurrogate(om.SurrogateModel):
+
+    # Batched NumPy evaluator for a Kriging surrogate exported by compileKrigingSurrogate. Values and
+    # gradients for N query points are computed with a few matrix products instead of one framework
+    # call per point, and the RMSE is only computed when eval_rmse is set.
+    def _declare_options(self):
+        self.options.declare('path', types = str, default = None, desc = 'Compiled surrogate file written by compileKrigingSurrogate')
+        self.options.declare('eval_rmse', types = bool, default = False, desc = 'Also return the root mean squared error of the prediction')
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+        if self.options['path'] is not None:
+            with ProfiledSection('surrogate', f'{type(self).__name__}.load'):
+                self.setEvaluationData(**loadCompiledSurrogate(self.options['path'], self.options['eval_rmse']))
+
+    def setEvaluationData(self, X, X_mean, X_std, Y_mean, Y_std, thetas, alpha, sigma2, inverse_correlation = None):
+        self.X_mean = X_mean
+        self.X_std = X_std
+        self.Y_mean = Y_mean
+        self.Y_std = Y_std
+        self.thetas = thetas
+        self.alpha = alpha
+        self.sigma2 = sigma2
+        self.inverseCorrelation = inverse_correlation
+
+        self.n_samples, self.n_dims = X.shape
+        self.n_outputs = alpha.shape[1]
+
+        # Training points stretched by sqrt(theta), so the correlation is exp(-squared distance)
+        self.XScaled = X * np.sqrt(thetas)
+        self.XScaledSquared = np.sum(self.XScaled**2, axis = 1)
+        self.alphaX = (alpha[:, :, np.newaxis] * X[:, np.newaxis, :]).reshape(self.n_samples, -1)
+        self.trained = True
+
+    def train(self, x, y):
+        raise RuntimeError('CompiledKrigingSurrogate is evaluation only; train a KrigingSurrogate and export it with compileKrigingSurrogate')
+
+    def _correlation(self, x):
+        x = np.atleast_2d(np.asarray(x, dtype = float)).reshape(-1, self.n_dims)
+        xNormalized = (x - self.X_mean) / self.X_std
+        xScaled = xNormalized * np.sqrt(self.thetas)
+
+        distanceSquared = np.sum(xScaled**2, axis = 1)[:, np.newaxis] + self.XScaledSquared - 2 * xScaled.dot(self.XScaled.T)
+        return xNormalized, np.exp(-np.maximum(distanceSquared, 0))
+
+    def vectorized_predict(self, x):
+        xNormalized, r = self._correlation(x)
+        y = self.Y_mean + self.Y_std * r.dot(self.alpha)
+
+        if self.options['eval_rmse']:
+            mse = (1 - np.sum(r.dot(self.inverseCorrelation) * r, axis = 1))[:, np.newaxis] * self.sigma2
+            return y, np.sqrt(np.maximum(mse, 0))
+
+        return y
+
+    def predict(self, x):
+        return self.vectorized_predict(x)
+
+    def vectorized_linearize(self, x):
+        # dy_o/dx_k = -2 theta_k sum_j alpha_jo r_j (x_k - X_jk), scaled back to dimensional units;
+        # returns an (N, n_outputs, n_dims) array
+        xNormalized, r = self._correlation(x)
+        rAlpha = r.dot(self.alpha)
+        rAlphaX = r.dot(self.alphaX).reshape(-1, self.n_outputs, self.n_dims)
+
+        jac = -2 * self.thetas * (xNormalized[:, np.newaxis, :] * rAlpha[:, :, np.newaxis] - rAlphaX)
+        return jac * (self.Y_std[:, np.newaxis] / self.X_std)
+
+    def linearize(self, x):
+        return self.vectorized_linearize(x)[0]
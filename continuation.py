@@ -0,0 +1,209 @@
+import numpy as np
+import openmdao.api as om
+from motorModelOpenmdog import ElectricPropulsion, operatingPointInputNames
+
+# Parameters a sweep can walk, as paths inside ElectricPropulsion; any other input path also works
+sweepParameters = {
+    'velocity': 'prop.velocity',
+    'throttle': 'esc.throttle',
+    'voltage': 'battery.voltage_supply'
+}
+
+class OperatingPointResidual(object):
+
+    # Power balance of an ElectricPropulsion group as an explicit function of the battery current
+    # and one parameter, R(I, p) = battery + ESC + motor + prop power, one value per node. It is
+    # evaluated on a copy of the group with fixed_current set, in a problem of its own, so an
+    # evaluation is one run_model whatever nonlinear solvers the original problem has, and the sweep
+    # can do its own Newton iteration seeded from the previous point. dR/dI and dR/dp are totals of
+    # that problem; the nodes are independent, so only their diagonals are nonzero. The original
+    # problem is only read: its group's options and the operating point inputs at construction.
+    groupOptionNames = ['num_nodes', 'prop_model_dir', 'prop_surrogate_type', 'prop_eval_rmse', 'prop_shared_hyperparameters', 'prop_fidelity', 'evaluation_cache']
+
+    def __init__(self, prob, parameter, units = None, path = ''):
+        group = next((system for system in prob.model.system_iter(include_self = True, recurse = True, typ = ElectricPropulsion) if system.pathname == path or not path), None)
+        if group is None:
+            raise ValueError(f'No ElectricPropulsion group at {path or "the top of the model"}')
+
+        self.units = units
+        self.parameterPath = sweepParameters.get(parameter, parameter)
+        if self.parameterPath not in operatingPointInputNames:
+            raise ValueError(f'{parameter} is not one of the operating point inputs {operatingPointInputNames}')
+        self.nEvaluations = 0
+        self.nLinearizations = 0
+
+        self.prob = om.Problem(reports = None)
+        self.prob.model.add_subsystem('electric_propulsion', ElectricPropulsion(fixed_current = True, **{name: group.options[name] for name in self.groupOptionNames}), promotes = ['*'])
+        self.prob.setup()
+        for name in operatingPointInputNames:
+            self.prob.set_val(name, prob.get_val(self.name(name, path)))
+
+        # dR/dp in the units the parameter is given in
+        unitsDeclared = self.prob.model.get_io_metadata(iotypes = 'input', metadata_keys = ['units'], return_rel_names = False)[f'electric_propulsion.{self.parameterPath}']['units']
+        self.parameterScale = 1. if units is None else om.convert_units(1., units, unitsDeclared) - om.convert_units(0., units, unitsDeclared)
+
+    @staticmethod
+    def name(relativeName, path):
+        return f'{path}.{relativeName}' if path else relativeName
+
+    def __call__(self, current, parameter):
+        self.prob.set_val('current', current, units = 'A')
+        self.prob.set_val(self.parameterPath, parameter, units = self.units)
+        self.prob.run_model()
+        self.nEvaluations += 1
+        return self.prob.get_val('power_net.power_net', units = 'W').copy()
+
+    def jacobian(self):
+        # (dR/dI, dR/dp) at the last evaluated point
+        self.nLinearizations += 1
+        totals = self.prob.compute_totals(of = ['power_net.power_net'], wrt = ['current', self.parameterPath])
+        return np.diag(totals['power_net.power_net', 'current']).copy(), np.diag(totals['power_net.power_net', self.parameterPath]) * self.parameterScale
+
+def sweepOperatingPoints(prob, parameter, values, units = None, path = '', method = 'natural', record = ('prop.thrust', 'battery.power'), current = None, atol = 1e-8, maxiter = 20, maxSteps = 1000):
+
+    # Walk an ElectricPropulsion problem along parameter (velocity, throttle, voltage or an input
+    # path) and converge the battery current at every step with Newton's method, seeded from the
+    # previous solution and its tangent instead of a cold start.
+    #   natural:   step through values exactly, predicting the current from the tangent dI/dp
+    #   arclength: pseudo-arclength continuation from values[0] to values[-1], with len(values) - 1
+    #              as the nominal number of steps; the parameter is solved for along with the
+    #              current, so the sweep can pass turning points (near stall or windmilling) where
+    #              dI/dp is unbounded. Steps grow when the corrector converges quickly and are
+    #              halved when it fails. A node stops when it reaches values[-1] or its branch
+    #              turns back past values[0].
+    # Returns the parameter and current at every converged step (steps x nodes), the recorded
+    # outputs and the Newton iterations, model evaluations and linearizations per step. prob itself
+    # is not changed; the sweep runs on the copy of the group in OperatingPointResidual.
+    residualFunction = OperatingPointResidual(prob, parameter, units, path)
+    values = np.asarray(values, dtype = float)
+    nameCurrent = residualFunction.name('power_net.current', path)
+    nn = np.size(prob.get_val(nameCurrent))
+    record = list(record)
+
+    parameterPoint = np.broadcast_to(values[0], (nn,)).astype(float)
+    currentPoint = np.asarray(prob.get_val(nameCurrent, units = 'A'), dtype = float).copy() if current is None else np.broadcast_to(current, (nn,)).astype(float)
+
+    sweep = {'parameter': [], 'current': [], 'iterations': [], 'evaluations': [], 'linearizations': [], 'converged': []}
+    sweep.update({name: [] for name in record})
+
+    def newton(current, parameter, derivatives = None):
+        # Fixed parameter corrector. The residual is checked before the derivatives are computed, so
+        # the converged point returns those of the last Newton step (or the ones passed in); they
+        # only seed the predictor of the next point. The residual problem is left at the returned
+        # current.
+        for iteration in range(maxiter + 1):
+            residual = residualFunction(current, parameter)
+            converged = np.all(np.abs(residual) <= atol)
+            if converged or iteration == maxiter:
+                break
+            derivatives = residualFunction.jacobian()
+            current = current - residual / derivatives[0]
+        if derivatives is None:
+            derivatives = residualFunction.jacobian()
+        return current, derivatives, iteration, converged
+
+    def store(current, parameter, iterations, counts, converged):
+        # The residual problem is at this point, so the recorded outputs are read without evaluating
+        # again
+        sweep['parameter'].append(parameter.copy())
+        sweep['current'].append(current.copy())
+        sweep['iterations'].append(iterations)
+        sweep['evaluations'].append(residualFunction.nEvaluations - counts[0])
+        sweep['linearizations'].append(residualFunction.nLinearizations - counts[1])
+        sweep['converged'].append(converged)
+        for name in record:
+            sweep[name].append(residualFunction.prob.get_val(name).copy())
+
+    def counts():
+        return residualFunction.nEvaluations, residualFunction.nLinearizations
+
+    countsStep = counts()
+    currentPoint, (residualCurrent, residualParameter), iterations, converged = newton(currentPoint, parameterPoint)
+    store(currentPoint, parameterPoint, iterations, countsStep, converged)
+
+    if method == 'natural':
+        for value in values[1:]:
+            countsStep = counts()
+            parameterNext = np.broadcast_to(value, (nn,)).astype(float)
+            currentPredicted = currentPoint - residualParameter / residualCurrent * (parameterNext - parameterPoint)
+            currentPoint, (residualCurrent, residualParameter), iterations, converged = newton(currentPredicted, parameterNext, (residualCurrent, residualParameter))
+            parameterPoint = parameterNext
+            store(currentPoint, parameterPoint, iterations, countsStep, converged)
+
+    elif method == 'arclength':
+        # Arclength is measured in the parameter span and a current scale, so both count equally
+        parameterStart = np.broadcast_to(values[0], (nn,)).astype(float)
+        parameterEnd = np.broadcast_to(values[-1], (nn,)).astype(float)
+        parameterScale = np.where(parameterEnd != parameterStart, np.abs(parameterEnd - parameterStart), 1)
+        currentScale = np.maximum(np.abs(currentPoint), 1)
+        direction = np.sign(parameterEnd - parameterStart)
+
+        stepNominal = 1 / max(values.size - 1, 1)
+        step = stepNominal * np.ones(nn)
+
+        # Unit tangent (dI, dp) in scaled variables, oriented towards the end of the sweep
+        tangentCurrent = -residualParameter / residualCurrent * parameterScale / currentScale
+        tangentParameter = np.ones(nn)
+        tangentNorm = np.hypot(tangentCurrent, tangentParameter)
+        tangentCurrent, tangentParameter = direction * tangentCurrent / tangentNorm, direction * tangentParameter / tangentNorm
+        tangentParameter[direction == 0] = 0
+
+        logicalActive = direction != 0
+        for _ in range(maxSteps):
+            if not np.any(logicalActive):
+                break
+            countsStep = counts()
+
+            # Do not step past the end of the sweep
+            stepActive = np.where(logicalActive, step, 0)
+            stepEnd = (parameterEnd - parameterPoint) / parameterScale / np.where(tangentParameter != 0, tangentParameter, np.inf)
+            stepActive = np.where(logicalActive & (stepEnd > 0), np.minimum(stepActive, stepEnd), stepActive)
+
+            currentPredicted = currentPoint + stepActive * tangentCurrent * currentScale
+            parameterPredicted = parameterPoint + stepActive * tangentParameter * parameterScale
+            current, parameterNext = currentPredicted.copy(), parameterPredicted.copy()
+
+            # Newton on [R(I, p); tangent . ((I, p) - predicted) = 0], a 2 x 2 system per node
+            for iterations in range(maxiter + 1):
+                residual = residualFunction(current, parameterNext)
+                arclength = tangentCurrent * (current - currentPredicted) / currentScale + tangentParameter * (parameterNext - parameterPredicted) / parameterScale
+                converged = np.all(np.abs(residual[logicalActive]) <= atol) and np.all(np.abs(arclength[logicalActive]) <= 1e-10)
+                if converged or iterations == maxiter:
+                    break
+                residualCurrent, residualParameter = residualFunction.jacobian()
+                a11, a12 = residualCurrent * currentScale, residualParameter * parameterScale
+                a21, a22 = tangentCurrent, tangentParameter
+                determinant = a11 * a22 - a12 * a21
+                determinant[determinant == 0] = np.finfo(float).tiny
+                deltaCurrent = -(a22 * residual - a12 * arclength) / determinant
+                deltaParameter = -(-a21 * residual + a11 * arclength) / determinant
+                current = np.where(logicalActive, current + deltaCurrent * currentScale, current)
+                parameterNext = np.where(logicalActive, parameterNext + deltaParameter * parameterScale, parameterNext)
+
+            if not converged:
+                if np.all(step[logicalActive] < 1e-6 * stepNominal):
+                    store(current, parameterNext, iterations, countsStep, False)
+                    break
+                step[logicalActive] /= 2
+                continue
+
+            # Secant tangent through the last two points keeps the orientation along the branch
+            secantCurrent = (current - currentPoint) / currentScale
+            secantParameter = (parameterNext - parameterPoint) / parameterScale
+            secantNorm = np.hypot(secantCurrent, secantParameter)
+            logicalMoved = logicalActive & (secantNorm > 0)
+            tangentCurrent = np.where(logicalMoved, secantCurrent / np.where(logicalMoved, secantNorm, 1), tangentCurrent)
+            tangentParameter = np.where(logicalMoved, secantParameter / np.where(logicalMoved, secantNorm, 1), tangentParameter)
+
+            currentPoint, parameterPoint = current, parameterNext
+            store(currentPoint, parameterPoint, iterations, countsStep, True)
+
+            if iterations <= 3:
+                step[logicalActive] = np.minimum(1.5 * step[logicalActive], 4 * stepNominal)
+            # A branch that turns back past the start of the sweep has no solution further on
+            logicalActive &= (direction * (parameterEnd - parameterPoint) > 1e-12 * parameterScale) & (direction * (parameterPoint - parameterStart) >= 0)
+
+    else:
+        raise ValueError(f'Unknown continuation method {method}')
+
+    return {name: np.array(value) for name, value in sweep.items()}
@@ -1,110 +1,180 @@
 import os
-import pickle
+import json
 import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 import numpy as np
-import scipy as sc
 import openmdao.api as om
+from multiOutputSurrogate import MultiOutputSurrogate
+from surrogateCache import CachedKrigingSurrogate, dirSurrogateCache, surrogateCacheKey
+from sparseSurrogate import SparseKrigingSurrogate
+from adaptiveSampling import selectTrainingPoints
+from columnarData import openMotoCalcDatabase, loadColumns, saveSurrogateModelData, loadSurrogateModelData
+
+dirSurrogateModels = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'surrogate_models')
+surrogateInputNames = ['propDiameter', 'propPitch', 'throttle', 'velocity']
+surrogateOutputNames = ['thrust', 'inputPower']
+surrogateTypes = {
+    'kriging': (CachedKrigingSurrogate, {'eval_rmse': True, 'lapack_driver': 'gesdd'}),
+    'sparse': (SparseKrigingSurrogate, {'eval_rmse': True})
+}
+# The same models without the cache, fit in every round of the adaptive selection
+selectionSurrogateTypes = {
+    'kriging': (om.KrigingSurrogate, {'lapack_driver': 'gesdd'}),
+    'sparse': (SparseKrigingSurrogate, {'cache_dir': None})
+}
 
 def loadMotoCalcData(pathMotoCalcData):
 
-    motoCalcDataMatlab = sc.io.loadmat(pathMotoCalcData)
+    # Lazy, memory-mapped view of the database; a .mat export is converted to the columnar format
+    # once and only the motors that are accessed are ever read
+    return openMotoCalcDatabase(pathMotoCalcData)
 
-    strVars = ['motors', 'motorDataHeaders', 'motorPerformanceDataHeaders']
-    for var in strVars:
-        motoCalcDataMatlab[var] = [string.strip(' ') for string in motoCalcDataMatlab[var]]
+def velocityDecimationPattern(nBreakpoints, nSamples = 10):
 
-    motoCalcDataMatlab['motorData'] = motoCalcDataMatlab['motorData'].astype(float)
-    motoCalcDataMatlab['motorPerformanceData'] = np.squeeze(motoCalcDataMatlab['motorPerformanceData']).tolist()
-    motoCalcDataMatlab['motorPerformanceData'] = [data.astype(float) for data in motoCalcDataMatlab['motorPerformanceData']]
+    # Symmetric skip pattern that keeps nSamples of the nBreakpoints velocities of one
+    # (propDiameter, propPitch, throttle) group, skipping more points near the middle
+    nIntervals = nSamples - 1
 
-    motoCalcData = {}
-    for idxMotor, motor in enumerate(motoCalcDataMatlab['motors']):
-        motoCalcData[motor] = {}
-        for idxMotorDataHeader, motorDataHeader in enumerate(motoCalcDataMatlab['motorDataHeaders']):
-            motoCalcData[motor][motorDataHeader] = motoCalcDataMatlab['motorData'][idxMotor, idxMotorDataHeader]
-        motoCalcData[motor]['motorPerformanceData'] = {}
-        for idxMotorPerformanceDataHeader, motorPerformanceDataHeader in enumerate(motoCalcDataMatlab['motorPerformanceDataHeaders']):
-            motoCalcData[motor]['motorPerformanceData'][motorPerformanceDataHeader] = motoCalcDataMatlab['motorPerformanceData'][idxMotor][:, idxMotorPerformanceDataHeader]
-    
-    return motoCalcData
+    if nBreakpoints > nSamples:
+        nRemove = nBreakpoints - nSamples
+        idxMiddle = nSamples // 2 - 1
+        idxOffMiddle = np.setdiff1d(np.arange(nIntervals), idxMiddle)
+        nOffMiddle = abs(idxOffMiddle - idxMiddle)
+        nPattern = 2*nOffMiddle - 1
+        nGroup = nRemove // nIntervals
+        idxGroupStart = nGroup*nIntervals
 
-def createMotorModel(motoCalcData, motor):
+        nSkip = np.zeros(nIntervals, dtype = int)
+        nSkip[idxMiddle] = nGroup + (nRemove - idxGroupStart) % 2
+        nSkip[idxOffMiddle] = np.ceil((nRemove - nPattern) / nIntervals)
 
-    motorPerformanceData = motoCalcData[motor]['motorPerformanceData']
-    nPoints = motorPerformanceData['propDiameter'].size
+        nIncrement = nSkip + 1
+        idxKeep = np.cumsum(np.append(1, nIncrement)) - 1
+        logicalKeepLocal = np.zeros(nBreakpoints, dtype = bool)
+        logicalKeepLocal[idxKeep] = True
+
+    else:
+        logicalKeepLocal = np.ones(nBreakpoints, dtype = bool)
+
+    return logicalKeepLocal
+
+def selectVelocitySamples(motorPerformanceData, nSamples = 10):
+
+    # Group the points by (propDiameter, propPitch, throttle) with one stable sort, so the points
+    # of each group stay in their original order, then apply the decimation pattern once per
+    # distinct group size instead of once per group
+    propDiameter = motorPerformanceData['propDiameter']
+    propPitch = motorPerformanceData['propPitch']
+    throttle = motorPerformanceData['throttle']
+    nPoints = propDiameter.size
+
+    idxSort = np.lexsort((throttle, propPitch, propDiameter))
+    logicalBoundary = np.logical_or.reduce((np.diff(propDiameter[idxSort]) != 0, np.diff(propPitch[idxSort]) != 0, np.diff(throttle[idxSort]) != 0))
+    idxGroupStart = np.append(0, np.flatnonzero(logicalBoundary) + 1)
+    nGroupPoints = np.diff(np.append(idxGroupStart, nPoints))
+
+    logicalKeepSorted = np.zeros(nPoints, dtype = bool)
+    for nBreakpoints in np.unique(nGroupPoints):
+        logicalKeepLocal = velocityDecimationPattern(nBreakpoints, nSamples)
+        idxGroupPoints = idxGroupStart[nGroupPoints == nBreakpoints, np.newaxis] + np.arange(nBreakpoints)
+        logicalKeepSorted[idxGroupPoints] = logicalKeepLocal
 
-    propDiameterBreakpoints = np.unique(motorPerformanceData['propDiameter'])
-    throttleBreakpoints = np.unique(motorPerformanceData['throttle'])
     logicalKeep = np.zeros(nPoints, dtype = bool)
-    
-    for propDiameterBreakpoint in propDiameterBreakpoints:
-        propPitchBreakpoints = np.unique(motorPerformanceData['propPitch'][motorPerformanceData['propDiameter'] == propDiameterBreakpoint])
-        for propPitchBreakpoint in propPitchBreakpoints:
-            for throttleBreakpoint in throttleBreakpoints:
-                logicalBreakpoint = np.logical_and.reduce((motorPerformanceData['propDiameter'] == propDiameterBreakpoint, motorPerformanceData['propPitch'] == propPitchBreakpoint, motorPerformanceData['throttle'] == throttleBreakpoint))
-                velocityBreakpoints = motorPerformanceData['velocity'][logicalBreakpoint]
-                
-                nBreakpoints = velocityBreakpoints.size
-                nSamples = 10
-                nIntervals = nSamples - 1
-
-                if nBreakpoints > nSamples:
-                    nRemove = nBreakpoints - nSamples
-                    idxMiddle = nSamples // 2 - 1
-                    idxOffMiddle = np.setdiff1d(np.arange(nIntervals), idxMiddle)
-                    nOffMiddle = abs(idxOffMiddle - idxMiddle)
-                    nPattern = 2*nOffMiddle - 1
-                    nGroup = nRemove // nIntervals
-                    idxGroupStart = nGroup*nIntervals
-
-                    nSkip = np.zeros(nIntervals, dtype = int)
-                    nSkip[idxMiddle] = nGroup + (nRemove - idxGroupStart) % 2
-                    nSkip[idxOffMiddle] = np.ceil((nRemove - nPattern) / nIntervals)
-
-                    nIncrement = nSkip + 1
-                    idxKeep = np.cumsum(np.append(1, nIncrement)) - 1
-                    logicalKeepLocal = np.zeros(nBreakpoints, dtype = bool)
-                    logicalKeepLocal[idxKeep] = True
-
-                else:
-                    logicalKeepLocal = np.ones(nBreakpoints, dtype = bool)
-
-                logicalKeep[logicalBreakpoint] = logicalKeepLocal
-
-    motorPerformanceDataReduced = {k: v[logicalKeep] for (k, v) in motorPerformanceData.items()}
+    logicalKeep[idxSort] = logicalKeepSorted
 
-    motorModel = om.MetaModelUnStructuredComp()
+    return logicalKeep
 
-    surrogateModelData = {
-        'propDiameter': motorPerformanceDataReduced['propDiameter'],
-        'propPitch': motorPerformanceDataReduced['propPitch'],
-        'throttle': motorPerformanceDataReduced['throttle'],
-        'velocity': motorPerformanceDataReduced['velocity'],
-        'thrust': motorPerformanceDataReduced['thrust'],
-        'inputPower': motorPerformanceDataReduced['inputPower']
-    }
+def adaptiveSelectionPath(motorPerformanceData, adaptiveOptions, sharedHyperparameters = True, surrogateType = 'kriging'):
+
+    x = np.column_stack([motorPerformanceData[name] for name in surrogateInputNames])
+    y = np.column_stack([motorPerformanceData[name] for name in surrogateOutputNames])
+    return os.path.join(dirSurrogateCache, surrogateCacheKey(x, y, dict(adaptiveOptions, selection = 'adaptive', sharedHyperparameters = sharedHyperparameters, surrogateType = surrogateType)) + '.json')
+
+def selectAdaptiveTrainingPoints(motorPerformanceData, adaptiveOptions, sharedHyperparameters = True, surrogateType = 'kriging'):
+
+    # Active-learning selection (see selectTrainingPoints) of the whole table, with its error
+    # measured on the surrogate that will be trained on the selection. The selection is
+    # deterministic, so it is cached next to the trained surrogates, keyed on the table, the options
+    # and the surrogate.
+    pathSelection = adaptiveSelectionPath(motorPerformanceData, adaptiveOptions, sharedHyperparameters, surrogateType)
+
+    if os.path.exists(pathSelection):
+        with open(pathSelection, 'r') as fileSelection:
+            selection = json.load(fileSelection)
+        os.utime(pathSelection)
+        return np.array(selection['idxSelected'], dtype = int), selection['history']
+
+    x = np.column_stack([motorPerformanceData[name] for name in surrogateInputNames])
+    y = np.column_stack([motorPerformanceData[name] for name in surrogateOutputNames])
+    surrogateClass, surrogateOptions = selectionSurrogateTypes[surrogateType]
+    idxSelected, history = selectTrainingPoints(x, y, **adaptiveOptions, sharedHyperparameters = sharedHyperparameters, surrogateClass = surrogateClass, surrogateOptions = surrogateOptions)
+
+    os.makedirs(dirSurrogateCache, exist_ok = True)
+    pathTemporary = f'{pathSelection}.{os.getpid()}.tmp'
+    with open(pathTemporary, 'w') as fileSelection:
+        json.dump({'idxSelected': idxSelected.tolist(), 'history': history}, fileSelection)
+    os.replace(pathTemporary, pathSelection)
+
+    return idxSelected, history
+
+def createSurrogateModelData(motorPerformanceData, nSamples = 10, adaptiveOptions = None, sharedHyperparameters = True, surrogateType = 'kriging'):
+
+    if adaptiveOptions is not None:
+        idxSelected, _ = selectAdaptiveTrainingPoints(motorPerformanceData, adaptiveOptions, sharedHyperparameters, surrogateType)
+        return {name: np.asarray(motorPerformanceData[name])[idxSelected] for name in surrogateInputNames + surrogateOutputNames}
+
+    # nSamples = None keeps every point, for surrogates that scale to the full table
+    if nSamples is None:
+        return {name: np.asarray(motorPerformanceData[name]) for name in surrogateInputNames + surrogateOutputNames}
+
+    logicalKeep = selectVelocitySamples(motorPerformanceData, nSamples)
+
+    return {name: motorPerformanceData[name][logicalKeep] for name in surrogateInputNames + surrogateOutputNames}
+
+def createMotorSurrogate(sharedHyperparameters = True, surrogateType = 'kriging', refresh = False):
+
+    # Dense Kriging is O(n^3) and needs the decimated data; the sparse surrogate trains on every
+    # point through a fixed number of inducing points
+    surrogateClass, surrogateOptions = surrogateTypes[surrogateType]
+    return MultiOutputSurrogate(surrogateOutputNames, sharedHyperparameters, surrogateClass = surrogateClass, **surrogateOptions, refresh = refresh)
+
+def isSurrogateModelDataCurrent(dirModel, surrogateModelData):
+
+    try:
+        surrogateModelDataCached = loadColumns(os.path.join(dirModel, 'surrogate_model_data'))
+    except (OSError, ValueError, KeyError):
+        return False
+
+    return surrogateModelDataCached.keys() == surrogateModelData.keys() and all(np.array_equal(surrogateModelDataCached[name], surrogateModelData[name]) for name in surrogateModelData)
+
+def createMotorModel(motoCalcData, motor, nSamples = 10, refresh = False, sharedHyperparameters = True, surrogateType = 'kriging', adaptiveOptions = None):
+
+    motorPerformanceData = motoCalcData[motor]['motorPerformanceData']
+    surrogateModelData = createSurrogateModelData(motorPerformanceData, nSamples, adaptiveOptions, sharedHyperparameters, surrogateType)
+
+    motorModel = om.MetaModelUnStructuredComp()
 
-    motorModel.add_input('propDiameter', 0.0, training_data = motorPerformanceDataReduced['propDiameter'])
-    motorModel.add_input('propPitch', 0.0, training_data = motorPerformanceDataReduced['propPitch'])
-    motorModel.add_input('throttle', 0.0, training_data = motorPerformanceDataReduced['throttle'])
-    motorModel.add_input('velocity', 0.0, training_data = motorPerformanceDataReduced['velocity'])
+    motorModel.add_input('propDiameter', 0.0, training_data = surrogateModelData['propDiameter'])
+    motorModel.add_input('propPitch', 0.0, training_data = surrogateModelData['propPitch'])
+    motorModel.add_input('throttle', 0.0, training_data = surrogateModelData['throttle'])
+    motorModel.add_input('velocity', 0.0, training_data = surrogateModelData['velocity'])
 
-    dirSurrogateModels = os.path.join(os.path.dirname(__file__), 'surrogate_models')
-    if not os.path.isdir(dirSurrogateModels):
-        os.mkdir(dirSurrogateModels)
     dirTrainingCache = os.path.join(dirSurrogateModels, motor)
-    if not os.path.isdir(dirTrainingCache):
-        os.mkdir(dirTrainingCache)
+    os.makedirs(dirTrainingCache, exist_ok = True)
+
+    if not isSurrogateModelDataCurrent(dirTrainingCache, surrogateModelData):
+        saveSurrogateModelData(dirTrainingCache, surrogateModelData)
 
-    pathSurrogateModelData = os.path.join(dirTrainingCache, 'surrogate_model_data.pickle')
-    pathThrustTrainingData = os.path.join(dirTrainingCache, 'thrust_training_data.dat')
-    pathInputPowerTrainingData = os.path.join(dirTrainingCache, 'inputPower_training_data.dat')
-    
-    with open(pathSurrogateModelData, 'wb') as fileSurrogateModelData:
-        pickle.dump(surrogateModelData, fileSurrogateModelData)
+    # Trained surrogates live in the content-addressed cache, keyed on the training data and
+    # settings, so a change of data or nSamples can never pick up a stale model. With shared
+    # hyperparameters thrust and inputPower are fit together with a single factorization.
+    motorSurrogate = createMotorSurrogate(sharedHyperparameters, surrogateType, refresh)
 
-    motorModel.add_output('thrust', 0.0, training_data = motorPerformanceDataReduced['thrust'], surrogate = om.KrigingSurrogate(eval_rmse = True, lapack_driver = 'gesdd', training_cache = pathThrustTrainingData))
-    motorModel.add_output('inputPower', 0.0, training_data = motorPerformanceDataReduced['inputPower'], surrogate = om.KrigingSurrogate(eval_rmse = True, lapack_driver = 'gesdd', training_cache = pathInputPowerTrainingData))
+    motorModel.add_output('thrust', 0.0, training_data = surrogateModelData['thrust'], surrogate = motorSurrogate.view('thrust'))
+    motorModel.add_output('inputPower', 0.0, training_data = surrogateModelData['inputPower'], surrogate = motorSurrogate.view('inputPower'))
 
     motorModel.options['default_surrogate'] = om.KrigingSurrogate()
 
@@ -113,12 +183,133 @@ def createMotorModel(motoCalcData, motor):
     prob.setup()
     prob.run_model()
 
-motoCalcData = loadMotoCalcData('/home/adamwass/Documents/mfly_mdo/motoCalcDataPython.mat')
-motors = motoCalcData.keys()
-nMotors = len(motors)
-for idxMotor, motor in enumerate(motors):
+def isMotorModelCached(motoCalcData, motor, nSamples = 10, sharedHyperparameters = True, surrogateType = 'kriging', adaptiveOptions = None):
+
+    # A motor is complete when its surrogate data is current and both surrogates trained on exactly
+    # that data and settings are in the cache. A motor without a cached adaptive selection is not
+    # complete either, and the selection is left to the worker.
+    motorPerformanceData = motoCalcData[motor]['motorPerformanceData']
+    if adaptiveOptions is not None and not os.path.exists(adaptiveSelectionPath(motorPerformanceData, adaptiveOptions, sharedHyperparameters, surrogateType)):
+        return False
+
+    surrogateModelData = createSurrogateModelData(motorPerformanceData, nSamples, adaptiveOptions, sharedHyperparameters, surrogateType)
+    if not isSurrogateModelDataCurrent(os.path.join(dirSurrogateModels, motor), surrogateModelData):
+        return False
+
+    x = np.column_stack([surrogateModelData[name] for name in surrogateInputNames])
+    pathsCache = createMotorSurrogate(sharedHyperparameters, surrogateType).cachePaths(x, surrogateModelData)
+
+    return all(os.path.exists(pathCache) for pathCache in pathsCache)
+
+def loadMotorSurrogate(motor, sharedHyperparameters = True, surrogateType = 'kriging'):
+
+    # Thrust and inputPower surrogate of a motor trained by createMotorModel, from its surrogate data
+    # and the surrogate cache (trained here if the cache entry is missing)
+    surrogateModelData = loadSurrogateModelData(os.path.join(dirSurrogateModels, motor))
+    x = np.column_stack([surrogateModelData[name] for name in surrogateInputNames])
+    motorSurrogate = createMotorSurrogate(sharedHyperparameters, surrogateType)
+    motorSurrogate.train(x, surrogateModelData)
+    return motorSurrogate
+
+def trainMotorModel(motoCalcDataMotor, motor, nSamples = 10, refresh = False, sharedHyperparameters = True, surrogateType = 'kriging', adaptiveOptions = None):
+
     tStart = time.time()
-    createMotorModel(motoCalcData, motor)
-    tEnd = time.time()
-    print(f'Motor ({idxMotor + 1:2d}/{nMotors:2d}) = {motor}')
-    print(f'Training time = {tEnd - tStart:5.1f} s')
+    try:
+        createMotorModel(motoCalcDataMotor, motor, nSamples, refresh, sharedHyperparameters, surrogateType, adaptiveOptions)
+    except Exception:
+        return {'motor': motor, 'status': 'failed', 'time': time.time() - tStart, 'error': traceback.format_exc()}
+
+    return {'motor': motor, 'status': 'trained', 'time': time.time() - tStart, 'error': None, **motorSelectionReport(motoCalcDataMotor, motor, adaptiveOptions, sharedHyperparameters, surrogateType)}
+
+def motorSelectionReport(motoCalcData, motor, adaptiveOptions = None, sharedHyperparameters = True, surrogateType = 'kriging'):
+
+    # Points used and error reached by the adaptive selection (read back from its cache)
+    if adaptiveOptions is None:
+        return {}
+
+    idxSelected, history = selectAdaptiveTrainingPoints(motoCalcData[motor]['motorPerformanceData'], adaptiveOptions, sharedHyperparameters, surrogateType)
+    return {'trainingPoints': int(idxSelected.size), 'tablePoints': int(np.asarray(motoCalcData[motor]['motorPerformanceData'][surrogateInputNames[0]]).size), 'rmsError': dict(zip(surrogateOutputNames, history[-1]['rmsError'])), 'maxError': dict(zip(surrogateOutputNames, history[-1]['maxError']))}
+
+def trainMotorModels(motoCalcData, motors = None, nWorkers = None, retrain = False, pathSummary = None, nSamples = 10, sharedHyperparameters = True, surrogateType = 'kriging', adaptiveOptions = None):
+
+    if motors is None:
+        motors = list(motoCalcData.keys())
+    if pathSummary is None:
+        pathSummary = os.path.join(dirSurrogateModels, 'training_summary.json')
+
+    nMotors = len(motors)
+    tStart = time.time()
+    summary = []
+
+    with ProcessPoolExecutor(max_workers = nWorkers) as executor:
+        futures = {}
+        for motor in motors:
+            if not retrain and isMotorModelCached(motoCalcData, motor, nSamples, sharedHyperparameters, surrogateType, adaptiveOptions):
+                summary.append({'motor': motor, 'status': 'cached', 'time': 0.0, 'error': None, **motorSelectionReport(motoCalcData, motor, adaptiveOptions, sharedHyperparameters, surrogateType)})
+                continue
+            # Only ship the one motor each worker needs, not the whole database
+            try:
+                futures[executor.submit(trainMotorModel, {motor: motoCalcData[motor]}, motor, nSamples, retrain, sharedHyperparameters, surrogateType, adaptiveOptions)] = motor
+            except BrokenProcessPool:
+                summary.append({'motor': motor, 'status': 'failed', 'time': 0.0, 'error': traceback.format_exc()})
+
+        for idxFuture, future in enumerate(as_completed(futures)):
+            # trainMotorModel catches training errors itself; what reaches here failed outside it (the
+            # arguments could not be pickled, or a worker died and broke the pool, which fails every
+            # motor still pending). Either way the motor is failed and the others carry on.
+            try:
+                result = future.result()
+            except Exception:
+                result = {'motor': futures[future], 'status': 'failed', 'time': time.time() - tStart, 'error': traceback.format_exc()}
+            summary.append(result)
+            print(f'Motor ({idxFuture + 1:2d}/{len(futures):2d}) = {result["motor"]}, {result["status"]}')
+            print(f'Training time = {result["time"]:5.1f} s')
+            if 'trainingPoints' in result:
+                print(f'Training points = {result["trainingPoints"]} of {result["tablePoints"]}, RMS error = ' + ', '.join(f'{output} {error:.2e}' for output, error in result['rmsError'].items()))
+
+    summary.sort(key = lambda result: motors.index(result['motor']))
+    counts = {status: sum(result['status'] == status for result in summary) for status in ['trained', 'cached', 'failed']}
+    summaryData = {
+        'nMotors': nMotors,
+        'nWorkers': nWorkers if nWorkers is not None else os.cpu_count(),
+        'wallTime': time.time() - tStart,
+        'counts': counts,
+        'motors': summary
+    }
+
+    os.makedirs(os.path.dirname(pathSummary), exist_ok = True)
+    with open(pathSummary, 'w') as fileSummary:
+        json.dump(summaryData, fileSummary, indent = 4)
+
+    print(f'Trained {counts["trained"]}, cached {counts["cached"]}, failed {counts["failed"]} of {nMotors} motors in {summaryData["wallTime"]:.1f} s')
+    print(f'Summary written to {pathSummary}')
+
+    return summaryData
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description = 'Train thrust and inputPower surrogate models for every motor in the MotoCalc database')
+    parser.add_argument('pathMotoCalcData', nargs = '?', default = '/home/adamwass/Documents/mfly_mdo/motoCalcDataPython.mat', help = 'MotoCalc .mat export or converted columnar database directory')
+    parser.add_argument('--workers', type = int, default = None, help = 'number of worker processes (default: number of CPUs)')
+    parser.add_argument('--motors', nargs = '+', default = None, help = 'only train these motors')
+    parser.add_argument('--surrogate', choices = list(surrogateTypes), default = 'kriging', help = 'dense Kriging on decimated data or sparse Kriging on every point')
+    parser.add_argument('--samples', type = int, default = None, help = 'velocities kept per (propDiameter, propPitch, throttle) group (default: 10 for kriging, all for sparse)')
+    parser.add_argument('--adaptive', action = 'store_true', help = 'select training points by active learning instead of velocity decimation')
+    parser.add_argument('--initial-points', type = int, default = 50, help = 'space-filling points the adaptive selection starts from')
+    parser.add_argument('--max-points', type = int, default = 400, help = 'point budget of the adaptive selection')
+    parser.add_argument('--tolerance', type = float, default = 1e-3, help = 'target RMS error of the adaptive selection, relative to the output standard deviation')
+    parser.add_argument('--per-output-hyperparameters', action = 'store_true', help = 'fit thrust and inputPower with separate correlation models')
+    parser.add_argument('--retrain', action = 'store_true', help = 'retrain motors that already have a complete, valid cache')
+    parser.add_argument('--summary', default = None, help = 'path of the JSON training summary')
+    args = parser.parse_args()
+
+    nSamples = args.samples
+    if nSamples is None and args.surrogate == 'kriging':
+        nSamples = 10
+
+    adaptiveOptions = None
+    if args.adaptive:
+        adaptiveOptions = {'nInitial': args.initial_points, 'maxPoints': args.max_points, 'tolerance': args.tolerance}
+
+    motoCalcData = loadMotoCalcData(args.pathMotoCalcData)
+    trainMotorModels(motoCalcData, motors = args.motors, nWorkers = args.workers, retrain = args.retrain, pathSummary = args.summary, nSamples = nSamples, sharedHyperparameters = not args.per_output_hyperparameters, surrogateType = args.surrogate, adaptiveOptions = adaptiveOptions)
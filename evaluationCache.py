@@ -0,0 +1,132 @@
+import os
+import sys
+import pickle
+import threading
+from collections import OrderedDict
+from hashlib import sha256
+import numpy as np
+
+def quantize(x, significantBits = 40):
+
+    # Round every value to significantBits of mantissa in its binary representation, so inputs equal
+    # to a relative precision of about 2**-significantBits give the same key whatever their scale
+    x = np.ascontiguousarray(x, dtype = float) + 0.
+    shift = 52 - significantBits
+    bits = x.view(np.int64)
+    return (bits + (np.int64(1) << np.int64(shift - 1))) >> np.int64(shift)
+
+def evaluationCacheTag(*parts):
+
+    # Short namespace prefix for the keys of one kind of evaluation (e.g. one prop surrogate), so
+    # several kinds can share a cache
+    return sha256(repr(parts).encode()).digest()[:8]
+
+class EvaluationCache(object):
+
+    # In-memory LRU cache of per-node evaluation results keyed by quantized inputs, for repeated
+    # operating points (line searches, finite difference checks, replotting). Every row of an input
+    # array is one entry; lookups return the rows found and the caller evaluates the rest. Entries
+    # past maxBytes are evicted least recently used first. With a path the cache is loaded from it
+    # when it exists and written back by save().
+    def __init__(self, maxBytes = 256 * 2**20, significantBits = 40, path = None):
+        self.maxBytes = maxBytes
+        self.significantBits = significantBits
+        self.path = path
+        self.entries = OrderedDict()
+        self.nBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def keys(self, tag, x):
+        x = np.atleast_2d(x)
+        return [tag + row.tobytes() for row in quantize(x, self.significantBits)]
+
+    @staticmethod
+    def entryBytes(key, value):
+        return sys.getsizeof(key) + value.nbytes + 100
+
+    def get(self, tag, x, valueShape = ()):
+        # Values of the rows of x found in the cache (zeros elsewhere) and which rows were found
+        keys = self.keys(tag, x)
+        values = np.zeros((len(keys),) + tuple(valueShape))
+        logicalHit = np.zeros(len(keys), dtype = bool)
+
+        with self.lock:
+            for idxKey, key in enumerate(keys):
+                value = self.entries.get(key)
+                if value is not None:
+                    self.entries.move_to_end(key)
+                    values[idxKey] = value
+                    logicalHit[idxKey] = True
+            self.hits += int(np.sum(logicalHit))
+            self.misses += int(logicalHit.size - np.sum(logicalHit))
+
+        return values, logicalHit
+
+    def put(self, tag, x, values):
+        keys = self.keys(tag, x)
+        values = np.asarray(values, dtype = float)
+
+        with self.lock:
+            for key, value in zip(keys, values):
+                value = np.array(value)
+                if key in self.entries:
+                    self.nBytes -= self.entryBytes(key, self.entries.pop(key))
+                self.entries[key] = value
+                self.nBytes += self.entryBytes(key, value)
+
+            while self.nBytes > self.maxBytes and self.entries:
+                key, value = self.entries.popitem(last = False)
+                self.nBytes -= self.entryBytes(key, value)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nBytes = 0
+
+    def statistics(self):
+        with self.lock:
+            nLookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / nLookups if nLookups else 0.,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.nBytes,
+                'maxBytes': self.maxBytes
+            }
+
+    def save(self, path = None):
+        # Written to a private file and moved into place, so a concurrent reader never sees a
+        # partially written cache
+        path = self.path if path is None else path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok = True)
+        pathTemporary = f'{path}.{os.getpid()}.tmp'
+
+        with self.lock:
+            state = {'significantBits': self.significantBits, 'entries': list(self.entries.items())}
+            with open(pathTemporary, 'wb') as fileCache:
+                pickle.dump(state, fileCache, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(pathTemporary, path)
+
+    def load(self, path):
+        # Entries quantized with other settings would never be hit, so they are dropped
+        with open(path, 'rb') as fileCache:
+            state = pickle.load(fileCache)
+        if state['significantBits'] != self.significantBits:
+            return
+
+        with self.lock:
+            for key, value in state['entries']:
+                self.entries[key] = value
+                self.nBytes += self.entryBytes(key, value)
+            while self.nBytes > self.maxBytes and self.entries:
+                key, value = self.entries.popitem(last = False)
+                self.nBytes -= self.entryBytes(key, value)
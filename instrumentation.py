@@ -0,0 +1,170 @@
+import os
+import csv
+import json
+import time
+import functools
+import openmdao.api as om
+from openmdao.solvers.solver import NonlinearSolver, LinearSolver
+
+# Profiler currently recording, None when profiling is off; instrumented code checks it on every call
+activeProfiler = None
+
+def profiledMethod(method):
+
+    # Record the calls and time of a component method (compute, compute_partials, apply_nonlinear,
+    # linearize) under ClassName.method while a Profiler is active
+    @functools.wraps(method)
+    def profiledWrapper(self, *args, **kwargs):
+        profiler = activeProfiler
+        if profiler is None:
+            return method(self, *args, **kwargs)
+        tStart = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            profiler.record('component', f'{type(self).__name__}.{method.__name__}', time.perf_counter() - tStart)
+
+    return profiledWrapper
+
+class ProfiledSection(object):
+
+    # with ProfiledSection('surrogate', 'CachedKrigingSurrogate.train'): ... records the block while
+    # a Profiler is active
+    __slots__ = ['category', 'name', 'profiler', 'tStart']
+
+    def __init__(self, category, name):
+        self.category = category
+        self.name = name
+
+    def __enter__(self):
+        self.profiler = activeProfiler
+        if self.profiler is not None:
+            self.tStart = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.profiler is not None:
+            self.profiler.record(self.category, self.name, time.perf_counter() - self.tStart)
+        return False
+
+class Profiler(object):
+
+    # Call counts and cumulative time of the instrumented propulsion components and surrogates, and
+    # of every nonlinear solve (iterations and the linear solves and factorizations inside it),
+    # between start() and stop() or inside a with block. The OpenMDAO solver classes are wrapped
+    # only while recording. Results are exported with saveJson and saveCsv; solves holds one entry
+    # per nonlinear solve, i.e. per operating point (or vectorized batch of them) of each solver.
+    linearMethods = [(om.DirectSolver, 'solve', 'solve'), (om.DirectSolver, '_linearize', 'factorize'), (om.ScipyKrylov, 'solve', 'solve'), (om.LinearRunOnce, 'solve', 'solve'), (LinearSolver, '_solve', 'solve')]
+
+    def __init__(self, solvers = True):
+        self.solvers = solvers
+        self.calls = {}
+        self.solves = []
+        self.solveStack = []
+        self.patched = []
+        self.tStart = None
+        self.wallTime = 0.
+
+    def record(self, category, name, elapsed, iterations = 0, linearSolves = 0):
+        entry = self.calls.setdefault((category, name), {'count': 0, 'time': 0., 'iterations': 0, 'linearSolves': 0})
+        entry['count'] += 1
+        entry['time'] += elapsed
+        entry['iterations'] += iterations
+        entry['linearSolves'] += linearSolves
+
+    def patch(self, cls, name, wrapper):
+        original = cls.__dict__[name]
+        self.patched.append((cls, name, original))
+        setattr(cls, name, wrapper(original))
+
+    def wrapNonlinearSolve(self, original):
+        profiler = self
+
+        @functools.wraps(original)
+        def solve(solver):
+            system = solver._system()
+            profiler.solveStack.append({'linearSolves': 0, 'factorizations': 0})
+            tStart = time.perf_counter()
+            try:
+                return original(solver)
+            finally:
+                elapsed = time.perf_counter() - tStart
+                counts = profiler.solveStack.pop()
+                name = f'{solver.SOLVER} {system.pathname or "model"}'
+                profiler.record('nonlinear_solver', name, elapsed, solver._iter_count, counts['linearSolves'])
+                profiler.solves.append({'solver': solver.SOLVER, 'system': system.pathname, 'iterations': solver._iter_count, 'linearSolves': counts['linearSolves'], 'factorizations': counts['factorizations'], 'time': elapsed})
+
+        return solve
+
+    def wrapLinear(self, kind):
+        profiler = self
+
+        def wrapper(original):
+            @functools.wraps(original)
+            def linear(solver, *args, **kwargs):
+                tStart = time.perf_counter()
+                try:
+                    return original(solver, *args, **kwargs)
+                finally:
+                    profiler.record('linear_solver', f'{solver.SOLVER} {kind}', time.perf_counter() - tStart)
+                    if profiler.solveStack:
+                        profiler.solveStack[-1]['linearSolves' if kind == 'solve' else 'factorizations'] += 1
+            return linear
+
+        return wrapper
+
+    def start(self):
+        global activeProfiler
+        if activeProfiler is not None:
+            raise RuntimeError('A Profiler is already active')
+        activeProfiler = self
+
+        if self.solvers:
+            self.patch(NonlinearSolver, '_solve', self.wrapNonlinearSolve)
+            for cls, name, kind in self.linearMethods:
+                self.patch(cls, name, self.wrapLinear(kind))
+
+        self.tStart = time.perf_counter()
+        return self
+
+    def stop(self):
+        global activeProfiler
+        self.wallTime += time.perf_counter() - self.tStart
+        for cls, name, original in reversed(self.patched):
+            setattr(cls, name, original)
+        self.patched = []
+        activeProfiler = None
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def summary(self):
+        # One row per instrumented call site, most time first
+        rows = [{'category': category, 'name': name, 'count': entry['count'], 'time': entry['time'], 'meanTime': entry['time'] / entry['count'], 'iterations': entry['iterations'], 'linearSolves': entry['linearSolves']} for (category, name), entry in self.calls.items()]
+        return sorted(rows, key = lambda row: row['time'], reverse = True)
+
+    def report(self, nRows = 20):
+        lines = [f'{"category":16s} {"name":52s} {"count":>8s} {"time (s)":>10s} {"mean (ms)":>10s} {"iterations":>10s}']
+        for row in self.summary()[:nRows]:
+            lines.append(f'{row["category"]:16s} {row["name"][:52]:52s} {row["count"]:8d} {row["time"]:10.4f} {1e3 * row["meanTime"]:10.4f} {row["iterations"]:10d}')
+        lines.append(f'wall time {self.wallTime:.4f} s')
+        return '\n'.join(lines)
+
+    def saveJson(self, path):
+        pathTemporary = f'{path}.{os.getpid()}.tmp'
+        with open(pathTemporary, 'w') as fileProfile:
+            json.dump({'wallTime': self.wallTime, 'calls': self.summary(), 'solves': self.solves}, fileProfile, indent = 4)
+        os.replace(pathTemporary, path)
+
+    def saveCsv(self, path):
+        pathTemporary = f'{path}.{os.getpid()}.tmp'
+        with open(pathTemporary, 'w', newline = '') as fileProfile:
+            writer = csv.DictWriter(fileProfile, fieldnames = ['category', 'name', 'count', 'time', 'meanTime', 'iterations', 'linearSolves'])
+            writer.writeheader()
+            writer.writerows(self.summary())
+        os.replace(pathTemporary, path)
@@ -0,0 +1,228 @@
+import csv
+import argparse
+import numpy as np
+import openmdao.api as om
+from motorModelOpenmdog import ElectricPropulsion, dirPropModel
+
+def cumulativeTrapezoid(time, integrand):
+
+    # Running trapezoidal integral of integrand over time, zero at the first node
+    return np.concatenate([[0.], np.cumsum(np.diff(time) * 0.5 * (integrand[:-1] + integrand[1:]))])
+
+def cumulativeTrapezoidPartials(time, integrand, rows, cols):
+
+    # Derivatives of the running integral at node rows with respect to time and integrand at node
+    # cols, for the lower-triangular entries rows >= cols. Node j enters segments j - 1 and j, and
+    # node k sums the segments before it, so every node after j has the same derivative and only
+    # the diagonal, where segment j is not summed yet, differs
+    timeStep = np.append(np.diff(time), 0.)
+    integrandMean = np.append(0.5 * (integrand[:-1] + integrand[1:]), 0.)
+    logicalBelow = rows != cols
+    integralTime = np.append(0., integrandMean[:-1])[cols] - np.where(logicalBelow, integrandMean[cols], 0.)
+    integralIntegrand = 0.5 * (np.append(0., timeStep[:-1])[cols] + np.where(logicalBelow, timeStep[cols], 0.))
+    return integralTime, integralIntegrand
+
+class BatteryCapacity(om.ExplicitComponent):
+
+    # Battery state along a mission: the charge and energy drawn from the cells, integrated over
+    # time with the trapezoidal rule from the first node, the state of charge left of capacity and
+    # the voltage sag over the internal resistance. The cells deliver voltage_supply * current, of
+    # which Battery passes voltage_out * current on to the ESC.
+    def initialize(self):
+        self.options.declare('num_nodes', default = 1, types = int, desc = 'Number of mission time steps')
+
+    def setup(self):
+        nn = self.options['num_nodes']
+        arange = np.arange(nn)
+        rows, cols = np.tril_indices(nn)
+
+        self.add_input('time', shape = nn, units = 's')
+        self.add_input('current', shape = nn, units = 'A')
+        self.add_input('voltage_supply', shape = nn, units = 'V')
+        self.add_input('resistance', shape = nn, units = 'ohm')
+        self.add_input('capacity', val = 5., units = 'A*h')
+
+        self.add_output('charge', shape = nn, units = 'A*h')
+        self.add_output('energy', shape = nn, units = 'W*h')
+        self.add_output('state_of_charge', shape = nn)
+        self.add_output('voltage_sag', shape = nn, units = 'V')
+
+        self.declare_partials(['charge', 'energy', 'state_of_charge'], ['time', 'current'], rows = rows, cols = cols)
+        self.declare_partials('energy', 'voltage_supply', rows = rows, cols = cols)
+        self.declare_partials('state_of_charge', 'capacity', rows = arange, cols = np.zeros(nn, dtype = int))
+        self.declare_partials('voltage_sag', ['current', 'resistance'], rows = arange, cols = arange)
+
+    def compute(self, inputs, outputs):
+        # Internally in A*s and J, the units the inputs are converted to
+        charge = cumulativeTrapezoid(inputs['time'], inputs['current'])
+        energy = cumulativeTrapezoid(inputs['time'], inputs['voltage_supply'] * inputs['current'])
+
+        outputs['charge'] = charge / 3600
+        outputs['energy'] = energy / 3600
+        outputs['state_of_charge'] = 1 - charge / 3600 / inputs['capacity']
+        outputs['voltage_sag'] = inputs['current'] * inputs['resistance']
+
+    def compute_partials(self, inputs, partials):
+        rows, cols = np.tril_indices(self.options['num_nodes'])
+
+        charge = cumulativeTrapezoid(inputs['time'], inputs['current'])
+        chargeTime, chargeCurrent = cumulativeTrapezoidPartials(inputs['time'], inputs['current'], rows, cols)
+        energyTime, energyPower = cumulativeTrapezoidPartials(inputs['time'], inputs['voltage_supply'] * inputs['current'], rows, cols)
+
+        partials['charge', 'time'] = chargeTime / 3600
+        partials['charge', 'current'] = chargeCurrent / 3600
+        partials['energy', 'time'] = energyTime / 3600
+        partials['energy', 'current'] = energyPower * inputs['voltage_supply'][cols] / 3600
+        partials['energy', 'voltage_supply'] = energyPower * inputs['current'][cols] / 3600
+        partials['state_of_charge', 'time'] = -chargeTime / 3600 / inputs['capacity']
+        partials['state_of_charge', 'current'] = -chargeCurrent / 3600 / inputs['capacity']
+        partials['state_of_charge', 'capacity'] = charge / 3600 / inputs['capacity']**2
+
+        partials['voltage_sag', 'current'] = inputs['resistance']
+        partials['voltage_sag', 'resistance'] = inputs['current']
+
+class ThrottleBalance(om.ImplicitComponent):
+
+    # Throttle that makes the thrust equal thrust_required, clipped to [min_throttle, 1]: the
+    # residual max(min(thrust - thrust_required, s (throttle - min_throttle)), s (throttle - 1)),
+    # with s = thrust_scale, increases with throttle and is zero at the clipped throttle, so a step
+    # with more demand than full throttle gives is left at full throttle (and one with less than
+    # min_throttle gives at min_throttle) instead of stalling the Newton solver
+    def initialize(self):
+        self.options.declare('num_nodes', default = 1, types = int, desc = 'Number of operating points evaluated simultaneously')
+        self.options.declare('min_throttle', default = 0.05, types = float, desc = 'Lowest throttle')
+        self.options.declare('thrust_scale', default = 1000., types = float, desc = 'Residual per unit throttle at the throttle limits (N), large against the thrust range so the thrust term governs between them')
+
+    def setup(self):
+        nn = self.options['num_nodes']
+        arange = np.arange(nn)
+
+        self.add_input('thrust', shape = nn, units = 'N')
+        self.add_input('thrust_required', shape = nn, units = 'N')
+
+        self.add_output('throttle', val = 1., shape = nn, lower = self.options['min_throttle'], upper = 1.)
+
+        self.declare_partials('throttle', ['thrust', 'thrust_required', 'throttle'], rows = arange, cols = arange)
+
+    def residualTerms(self, inputs, outputs):
+        thrustExcess = inputs['thrust'] - inputs['thrust_required']
+        lowerExcess = self.options['thrust_scale'] * (outputs['throttle'] - self.options['min_throttle'])
+        upperExcess = self.options['thrust_scale'] * (outputs['throttle'] - 1)
+        logicalThrust = thrustExcess < lowerExcess
+        logicalUpper = np.where(logicalThrust, thrustExcess, lowerExcess) < upperExcess
+        return thrustExcess, lowerExcess, upperExcess, logicalThrust & ~logicalUpper, logicalUpper
+
+    def apply_nonlinear(self, inputs, outputs, residuals):
+        thrustExcess, lowerExcess, upperExcess, logicalThrust, logicalUpper = self.residualTerms(inputs, outputs)
+        residuals['throttle'] = np.where(logicalUpper, upperExcess, np.where(logicalThrust, thrustExcess, lowerExcess))
+
+    def linearize(self, inputs, outputs, partials):
+        _, _, _, logicalThrust, _ = self.residualTerms(inputs, outputs)
+        partials['throttle', 'thrust'] = np.where(logicalThrust, 1., 0.)
+        partials['throttle', 'thrust_required'] = np.where(logicalThrust, -1., 0.)
+        partials['throttle', 'throttle'] = np.where(logicalThrust, 0., self.options['thrust_scale'])
+
+class MissionAnalysis(om.Group):
+
+    # Every time step of a mission (velocity and thrust demand against time) is a node of one
+    # ElectricPropulsion. ThrottleBalance makes the prop thrust equal the demand at every node,
+    # converged with one Newton solver over all nodes (the power balance inside ElectricPropulsion
+    # is converged by PowerBalanceSolver at each Newton iteration), and BatteryCapacity integrates
+    # the battery current along the mission. The design inputs (diameter, pitch, kv,
+    # motor_resistance, idle_current, battery_resistance and capacity) are scalars shared by all
+    # nodes; time, velocity, thrust_required and voltage are per node. Steps where the demand
+    # exceeds full throttle are left at full throttle, short of thrust, and steps where it is below
+    # min_throttle at min_throttle.
+    def initialize(self):
+        self.options.declare('num_nodes', default = 1, types = int, desc = 'Number of mission time steps')
+        self.options.declare('prop_model_dir', default = dirPropModel, types = str, desc = 'Directory of the prop model training data and caches')
+        self.options.declare('prop_surrogate_type', default = 'kriging', values = ['kriging', 'compiled', 'sparse'], desc = 'Surrogate used by the prop component')
+        self.options.declare('prop_fidelity', default = 'full', values = ['full', 'parametric', 'corrected'], desc = 'Prop model fidelity of the prop component')
+        self.options.declare('min_throttle', default = 0.05, types = float, desc = 'Lower bound of the throttle balance')
+
+    def setup(self):
+        nn = self.options['num_nodes']
+        srcIndices = np.zeros(nn, dtype = int)
+
+        propulsion = self.add_subsystem('propulsion', om.Group())
+        propulsion.add_subsystem('electric_propulsion', ElectricPropulsion(num_nodes = nn, power_balance_solver = True, prop_model_dir = self.options['prop_model_dir'], prop_surrogate_type = self.options['prop_surrogate_type'], prop_fidelity = self.options['prop_fidelity']))
+        propulsion.add_subsystem('throttle_balance', ThrottleBalance(num_nodes = nn, min_throttle = self.options['min_throttle']))
+        propulsion.connect('throttle_balance.throttle', 'electric_propulsion.esc.throttle')
+        propulsion.connect('electric_propulsion.prop.thrust', 'throttle_balance.thrust')
+
+        propulsion.nonlinear_solver = om.NewtonSolver(solve_subsystems = True, maxiter = 30, atol = 1e-6, rtol = 1e-9, iprint = 0, err_on_non_converge = False)
+        propulsion.nonlinear_solver.linesearch = om.BoundsEnforceLS(bound_enforcement = 'scalar')
+        propulsion.linear_solver = om.DirectSolver(assemble_jac = True)
+
+        self.add_subsystem('capacity', BatteryCapacity(num_nodes = nn), promotes_inputs = ['time', 'capacity'])
+        self.connect('propulsion.electric_propulsion.power_net.current', 'capacity.current')
+
+        # Per node inputs
+        self.promotes('propulsion', inputs = [('electric_propulsion.prop.velocity', 'velocity'), ('throttle_balance.thrust_required', 'thrust_required')])
+        self.promotes('propulsion', inputs = [('electric_propulsion.battery.voltage_supply', 'voltage')])
+        self.promotes('capacity', inputs = [('voltage_supply', 'voltage')])
+
+        # Shared design inputs
+        shared = [('electric_propulsion.prop.diameter', 'diameter'), ('electric_propulsion.prop.pitch', 'pitch'), ('electric_propulsion.motor.kv', 'kv'), ('electric_propulsion.motor.resistance', 'motor_resistance'), ('electric_propulsion.motor.idle_current', 'idle_current'), ('electric_propulsion.battery.resistance', 'battery_resistance')]
+        self.promotes('propulsion', inputs = shared, src_indices = srcIndices, src_shape = (1,))
+        self.promotes('capacity', inputs = [('resistance', 'battery_resistance')], src_indices = srcIndices, src_shape = (1,))
+
+        self.set_input_defaults('voltage', val = 22.2 * np.ones(nn), units = 'V')
+        self.set_input_defaults('diameter', units = 'inch')
+        self.set_input_defaults('pitch', units = 'inch')
+        self.set_input_defaults('kv', units = 'rpm/V')
+        self.set_input_defaults('motor_resistance', units = 'ohm')
+        self.set_input_defaults('idle_current', units = 'A')
+        self.set_input_defaults('battery_resistance', units = 'ohm')
+
+def missionProblem(time, velocity, thrust, design, voltage = 22.2, propOptions = None):
+
+    # Set up and run a MissionAnalysis problem for a time series of velocity (m/s) and thrust (N)
+    # demand, design holding diameter and pitch (inch), kv (rpm/V), motor_resistance (ohm),
+    # idle_current (A), battery_resistance (ohm) and capacity (A*h)
+    if propOptions is None:
+        propOptions = {}
+    time = np.asarray(time, dtype = float)
+    nn = time.size
+
+    prob = om.Problem(reports = None)
+    prob.model.add_subsystem('mission', MissionAnalysis(num_nodes = nn, **propOptions), promotes = ['*'])
+    prob.setup()
+
+    prob.set_val('time', time, units = 's')
+    prob.set_val('velocity', np.broadcast_to(velocity, (nn,)), units = 'm/s')
+    prob.set_val('thrust_required', np.broadcast_to(thrust, (nn,)), units = 'N')
+    prob.set_val('voltage', np.broadcast_to(voltage, (nn,)), units = 'V')
+    for name, value in design.items():
+        prob.set_val(name, value)
+    prob.set_val('propulsion.electric_propulsion.power_net.current', 10., units = 'A')
+    prob.run_model()
+
+    return prob
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description = 'Battery charge, energy and state of charge along a mission of velocity and thrust demand')
+    parser.add_argument('pathMission', help = 'CSV file with columns time (s), velocity (m/s) and thrust (N)')
+    parser.add_argument('--diameter', type = float, default = 22, help = 'prop diameter (inch)')
+    parser.add_argument('--pitch', type = float, default = 10, help = 'prop pitch (inch)')
+    parser.add_argument('--kv', type = float, default = 280, help = 'motor kv (rpm/V)')
+    parser.add_argument('--motor-resistance', type = float, default = 0.0263, help = 'motor resistance (ohm)')
+    parser.add_argument('--idle-current', type = float, default = 1.2, help = 'motor idle current (A)')
+    parser.add_argument('--voltage', type = float, default = 22.2, help = 'battery voltage (V)')
+    parser.add_argument('--battery-resistance', type = float, default = 0.012, help = 'battery resistance (ohm)')
+    parser.add_argument('--capacity', type = float, default = 5, help = 'battery capacity (A*h)')
+    parser.add_argument('--prop-surrogate', default = 'compiled', choices = ['kriging', 'compiled', 'sparse'], help = 'prop surrogate type')
+    parser.add_argument('--prop-fidelity', default = 'full', choices = ['full', 'parametric', 'corrected'], help = 'prop model fidelity')
+    args = parser.parse_args()
+
+    with open(args.pathMission, 'r', newline = '') as fileMission:
+        mission = np.array([[float(row['time']), float(row['velocity']), float(row['thrust'])] for row in csv.DictReader(fileMission)])
+
+    design = {'diameter': args.diameter, 'pitch': args.pitch, 'kv': args.kv, 'motor_resistance': args.motor_resistance, 'idle_current': args.idle_current, 'battery_resistance': args.battery_resistance, 'capacity': args.capacity}
+    prob = missionProblem(mission[:, 0], mission[:, 1], mission[:, 2], design, args.voltage, {'prop_surrogate_type': args.prop_surrogate, 'prop_fidelity': args.prop_fidelity})
+
+    thrustShort = prob.get_val('thrust_required', units = 'N') - prob.get_val('propulsion.electric_propulsion.prop.thrust', units = 'N')
+    print(f'{mission.shape[0]} steps, {np.sum(thrustShort > 1e-6)} short of thrust at full throttle')
+    print(f'Charge {prob.get_val("capacity.charge", units = "A*h")[-1]:.3f} A*h, energy {prob.get_val("capacity.energy", units = "W*h")[-1]:.1f} W*h, final state of charge {prob.get_val("capacity.state_of_charge")[-1]:.3f}')
+    print(f'Peak current {np.max(prob.get_val("capacity.current", units = "A")):.1f} A, peak voltage sag {np.max(prob.get_val("capacity.voltage_sag", units = "V")):.2f} V')
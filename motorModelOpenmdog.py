@@ -1,24 +1,123 @@
 import os
-import pickle
+import threading
 import numpy as np
 import openmdao.api as om
+from openmdao.solvers.solver import NonlinearSolver
+from columnarData import loadSurrogateModelData
+from surrogateCache import surrogateCacheKey
+from compiledSurrogate import compileKrigingSurrogate, CompiledKrigingSurrogate
+from sparseSurrogate import SparseKrigingSurrogate
+from multiOutputSurrogate import MultiOutputSurrogate, CorrectedMultiOutputSurrogate
+from parametricSurrogate import ParametricPropSurrogate
+from evaluationCache import EvaluationCache, evaluationCacheTag
+from instrumentation import profiledMethod
+
+dirPropModel = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'surrogate_models', 'prop_model')
+propInputNames = ['diameter', 'pitch', 'rpm', 'velocity']
+propOutputNames = ['thrust', 'power']
+
+# Inputs that determine the operating point of one ElectricPropulsion node, as paths inside it
+operatingPointInputNames = ['battery.voltage_supply', 'battery.resistance', 'esc.throttle', 'motor.kv', 'motor.resistance', 'motor.idle_current', 'prop.diameter', 'prop.pitch', 'prop.velocity']
+
+# Trained prop surrogates shared by every Propeller in the process, keyed by prop model directory,
+# surrogate type, RMSE setting and fidelity
+propSurrogateRegistry = {}
+propSurrogateRegistryLock = threading.RLock()
+
+def loadPropSurrogates(dirModel = dirPropModel, surrogateType = 'kriging', evalRmse = True, sharedHyperparameters = True, fidelity = 'full'):
+
+    # Load the training data and train (or load from the surrogate cache) the thrust and power
+    # surrogates once per process; later calls return the same trained objects. With shared
+    # hyperparameters thrust and power come from one Kriging fit. The compiled surrogates are
+    # exported next to the Kriging cache entries and reused from there. The sparse surrogate is
+    # trained on every point of the data through a fixed number of inducing points. With fidelity
+    # 'parametric' thrust and power come from ParametricPropSurrogate alone (surrogateType is
+    # ignored), with 'corrected' from it plus a surrogate of surrogateType trained on its residual.
+    dirModel = os.path.abspath(dirModel)
+    if surrogateType == 'kriging':
+        evalRmse = True
+    if fidelity == 'parametric':
+        surrogateType, sharedHyperparameters = None, True
+    key = (dirModel, surrogateType, evalRmse, sharedHyperparameters, fidelity)
+
+    with propSurrogateRegistryLock:
+        if key not in propSurrogateRegistry:
+            surrogateModelData = loadSurrogateModelData(dirModel)
+            x = np.column_stack([surrogateModelData[name] for name in propInputNames])
+            y = {output: surrogateModelData[output] for output in propOutputNames}
+            contentKey = surrogateCacheKey(x, np.column_stack([y[output] for output in propOutputNames]), {'surrogateType': surrogateType, 'evalRmse': evalRmse, 'sharedHyperparameters': sharedHyperparameters, 'fidelity': fidelity})
+
+            seedCaches = {output: os.path.join(dirModel, f'{output}_training_data.dat') for output in propOutputNames}
+
+            if fidelity != 'full':
+                parametricPropSurrogate = MultiOutputSurrogate(propOutputNames, surrogateClass = ParametricPropSurrogate, eval_rmse = evalRmse and fidelity == 'parametric')
+                parametricPropSurrogate.train(x, y)
+                if fidelity == 'corrected':
+                    # The legacy seed caches hold fits of the full outputs, not of the residual
+                    prediction = parametricPropSurrogate.predict(x)
+                    y = {output: y[output] - prediction[output][0][:, 0] for output in propOutputNames}
+                    seedCaches = None
+
+            if fidelity == 'parametric':
+                propSurrogate = parametricPropSurrogate
+
+            elif surrogateType == 'kriging':
+                propSurrogate = MultiOutputSurrogate(propOutputNames, sharedHyperparameters, seedCaches = seedCaches, eval_rmse = True, lapack_driver = 'gesdd')
+                propSurrogate.train(x, y)
+
+            elif surrogateType == 'compiled':
+                # The untrained Kriging surrogate only names the cache entries the exports sit next to
+                propSurrogate = MultiOutputSurrogate(propOutputNames, sharedHyperparameters, seedCaches = seedCaches, eval_rmse = True, lapack_driver = 'gesdd')
+                pathsCompiled = [pathCache[:-len('.npz')] + '.compiled.npz' for pathCache in propSurrogate.cachePaths(x, y)]
+                if not all(os.path.exists(pathCompiled) for pathCompiled in pathsCompiled):
+                    krigingPropSurrogate = loadPropSurrogates(dirModel, 'kriging', True, sharedHyperparameters, fidelity)[propOutputNames[0]].multiOutputSurrogate
+                    if fidelity == 'corrected':
+                        krigingPropSurrogate = krigingPropSurrogate.correction
+                    for (surrogate, _), pathCompiled in zip(krigingPropSurrogate.surrogates, pathsCompiled):
+                        compileKrigingSurrogate(surrogate, pathCompiled)
+                for pathCompiled in pathsCompiled:
+                    os.utime(pathCompiled)
+                propSurrogate = MultiOutputSurrogate.fromSurrogates([(CompiledKrigingSurrogate(path = pathCompiled, eval_rmse = evalRmse), outputs) for pathCompiled, outputs in zip(pathsCompiled, propSurrogate.outputGroups())])
+
+            elif surrogateType == 'sparse':
+                propSurrogate = MultiOutputSurrogate(propOutputNames, sharedHyperparameters, surrogateClass = SparseKrigingSurrogate, eval_rmse = evalRmse)
+                propSurrogate.train(x, y)
+
+            else:
+                raise ValueError(f'Unknown prop surrogate type {surrogateType}')
+
+            if fidelity == 'corrected':
+                propSurrogate = CorrectedMultiOutputSurrogate(parametricPropSurrogate, propSurrogate)
+
+            propSurrogate.contentKey = contentKey
+            propSurrogateRegistry[key] = {output: propSurrogate.view(output) for output in propOutputNames}
+
+        return propSurrogateRegistry[key]
 
 class Battery(om.ExplicitComponent):
 
+    def initialize(self):
+        self.options.declare('num_nodes', default = 1, types = int, desc = 'Number of operating points evaluated simultaneously')
+
     def setup(self):
-        self.add_input('voltage_supply', units = 'V')
-        self.add_input('current', units = 'A')
-        self.add_input('resistance', units = 'ohm')
+        nn = self.options['num_nodes']
+        arange = np.arange(nn)
+
+        self.add_input('voltage_supply', shape = nn, units = 'V')
+        self.add_input('current', shape = nn, units = 'A')
+        self.add_input('resistance', shape = nn, units = 'ohm')
 
-        self.add_output('voltage_out', units = 'V')
-        self.add_output('power', units = 'W')
+        self.add_output('voltage_out', shape = nn, units = 'V')
+        self.add_output('power', shape = nn, units = 'W')
 
-        self.declare_partials(['voltage_out', 'power'], ['voltage_supply', 'current', 'resistance'])
+        self.declare_partials(['voltage_out', 'power'], ['voltage_supply', 'current', 'resistance'], rows = arange, cols = arange)
 
+    @profiledMethod
     def compute(self, inputs, outputs):
         outputs['voltage_out'] = inputs['voltage_supply'] - inputs['current'] * inputs['resistance']
         outputs['power'] = inputs['current'] * inputs['voltage_supply'] - inputs['current']**2 * inputs['resistance']
 
+    @profiledMethod
     def compute_partials(self, inputs, partials):
         partials['voltage_out', 'voltage_supply'] = 1
         partials['voltage_out', 'current'] = -inputs['resistance']
@@ -34,22 +133,27 @@ class ElectronicSpeedController(om.ExplicitComponent):
         self.options.declare('a', default = 1.6054, desc = 'a coefficient for efficiency(throttle) equation: efficiency = a * (1 - 1 / (1 + c*throttle^d))')
         self.options.declare('b', default = 1.6519, desc = 'b coefficient for efficiency(throttle) equation: efficiency = a * (1 - 1 / (1 + c*throttle^d))')
         self.options.declare('c', default = 0.6455, desc = 'c coefficient for efficiency(throttle) equation: efficiency = a * (1 - 1 / (1 + c*throttle^d))')
+        self.options.declare('num_nodes', default = 1, types = int, desc = 'Number of operating points evaluated simultaneously')
 
     def setup(self):
-        self.add_input('voltage_in', units = 'V')
-        self.add_input('current_in', units = 'A')
-        self.add_input('throttle')
+        nn = self.options['num_nodes']
+        arange = np.arange(nn)
 
-        self.add_output('efficiency')
-        self.add_output('voltage_out', units = 'V')
-        self.add_output('current_out', units = 'A')
-        self.add_output('power', units = 'W')
+        self.add_input('voltage_in', shape = nn, units = 'V')
+        self.add_input('current_in', shape = nn, units = 'A')
+        self.add_input('throttle', shape = nn)
 
-        self.declare_partials('efficiency', 'throttle')
-        self.declare_partials('voltage_out', ['voltage_in', 'throttle'])
-        self.declare_partials('current_out', ['current_in', 'throttle'])
-        self.declare_partials('power', ['voltage_in', 'current_in', 'throttle'])
+        self.add_output('efficiency', shape = nn)
+        self.add_output('voltage_out', shape = nn, units = 'V')
+        self.add_output('current_out', shape = nn, units = 'A')
+        self.add_output('power', shape = nn, units = 'W')
 
+        self.declare_partials('efficiency', 'throttle', rows = arange, cols = arange)
+        self.declare_partials('voltage_out', ['voltage_in', 'throttle'], rows = arange, cols = arange)
+        self.declare_partials('current_out', ['current_in', 'throttle'], rows = arange, cols = arange)
+        self.declare_partials('power', ['voltage_in', 'current_in', 'throttle'], rows = arange, cols = arange)
+
+    @profiledMethod
     def compute(self, inputs, outputs):
         
         a = self.options['a']
@@ -61,6 +165,7 @@ class ElectronicSpeedController(om.ExplicitComponent):
         outputs['current_out'] = inputs['current_in'] / inputs['throttle']
         outputs['power'] = (outputs['efficiency'] - 1) * inputs['current_in'] * inputs['voltage_in']
 
+    @profiledMethod
     def compute_partials(self, inputs, partials):
 
         a = self.options['a']
@@ -82,23 +187,32 @@ class ElectronicSpeedController(om.ExplicitComponent):
 
 class Motor(om.ExplicitComponent):
 
+    def initialize(self):
+        self.options.declare('num_nodes', default = 1, types = int, desc = 'Number of operating points evaluated simultaneously')
+
     def setup(self):
-        self.add_input('voltage_in', units = 'V')
-        self.add_input('current', units = 'A')
-        self.add_input('resistance', units = 'ohm')
-        self.add_input('kv', units = 'rpm / V')
-        self.add_input('idle_current', units = 'A')
+        nn = self.options['num_nodes']
+        arange = np.arange(nn)
+
+        self.add_input('voltage_in', shape = nn, units = 'V')
+        self.add_input('current', shape = nn, units = 'A')
+        self.add_input('resistance', shape = nn, units = 'ohm')
+        self.add_input('kv', shape = nn, units = 'rpm / V')
+        self.add_input('idle_current', shape = nn, units = 'A')
         
-        self.add_output('rpm', units = 'rpm')
-        self.add_output('power', units = 'W')
+        self.add_output('rpm', shape = nn, units = 'rpm')
+        self.add_output('power', shape = nn, units = 'W')
 
-        self.declare_partials(['rpm', 'power'], ['voltage_in', 'current', 'resistance', 'kv', 'idle_current'])
+        self.declare_partials('rpm', ['voltage_in', 'current', 'resistance', 'kv'], rows = arange, cols = arange)
+        self.declare_partials('power', ['voltage_in', 'current', 'resistance', 'idle_current'], rows = arange, cols = arange)
 
+    @profiledMethod
     def compute(self, inputs, outputs):
         voltage_prop = inputs['voltage_in'] - inputs['current'] * inputs['resistance']
         outputs['rpm'] = inputs['kv'] * voltage_prop
         outputs['power'] = -inputs['current']**2 * inputs['resistance'] - inputs['idle_current'] * voltage_prop
 
+    @profiledMethod
     def compute_partials(self, inputs, partials):
         voltage_prop = inputs['voltage_in'] - inputs['current'] * inputs['resistance']
         dvoltage_prop_dvoltage_in = 1
@@ -109,62 +223,306 @@ class Motor(om.ExplicitComponent):
         partials['rpm', 'current'] = inputs['kv'] * dvoltage_prop_dcurrent
         partials['rpm', 'resistance'] = inputs['kv'] * dvoltage_prop_dresistance
         partials['rpm', 'kv'] = voltage_prop
-        partials['rpm', 'idle_current'] = 0
 
         partials['power', 'voltage_in'] = -inputs['idle_current'] * dvoltage_prop_dvoltage_in
         partials['power', 'current'] = -2 * inputs['current'] * inputs['resistance'] - inputs['idle_current'] * dvoltage_prop_dcurrent
         partials['power', 'resistance'] = -inputs['current']**2 - inputs['idle_current'] * dvoltage_prop_dresistance
-        partials['power', 'kv'] = 0
         partials['power', 'idle_current'] = -voltage_prop
 
 class Propeller(om.MetaModelUnStructuredComp):
-    pass
+
+    def initialize(self):
+        super().initialize()
+        self.options.declare('prop_model_dir', default = dirPropModel, types = str, desc = 'Directory of the prop model training data and caches')
+        self.options.declare('surrogate_type', default = 'kriging', values = ['kriging', 'compiled', 'sparse'], desc = 'OpenMDAO KrigingSurrogate, the batched NumPy evaluator exported from it or the low-rank sparse Kriging surrogate')
+        self.options.declare('eval_rmse', default = False, types = bool, desc = 'Compute the prediction RMSE with the compiled or sparse surrogate (the Kriging surrogate always does)')
+        self.options.declare('shared_hyperparameters', default = True, types = bool, desc = 'Fit thrust and power with one correlation model instead of one per output')
+        self.options.declare('fidelity', default = 'full', values = ['full', 'parametric', 'corrected'], desc = 'The surrogate_type surrogate, ParametricPropSurrogate coefficient curves against advance ratio, or those curves plus a surrogate_type surrogate of their residual')
+        self.options.declare('evaluation_cache', default = None, types = EvaluationCache, allow_none = True, desc = 'Cache of the surrogate predictions and derivatives keyed by quantized inputs')
+
+    def cacheTag(self):
+        # Keyed on the training data and settings of the surrogate, not on where it was loaded from,
+        # so persisted entries are never served for a retrained model
+        return evaluationCacheTag('prop', self._metadata(propOutputNames[0])['surrogate'].multiOutputSurrogate.contentKey)
+
+    def setup(self):
+        nn = self.options['vec_size']
+        propSurrogates = loadPropSurrogates(self.options['prop_model_dir'], self.options['surrogate_type'], self.options['eval_rmse'], self.options['shared_hyperparameters'], self.options['fidelity'])
+
+        self.add_input('diameter', shape = nn, units = 'inch')
+        self.add_input('pitch', shape = nn, units = 'inch')
+        self.add_input('rpm', shape = nn, units = 'rpm')
+        self.add_input('velocity', shape = nn, units = 'm/s')
+
+        self.add_output('thrust', 0.0, surrogate = propSurrogates['thrust'], shape = nn, units = 'N')
+        self.add_output('power', 0.0, surrogate = propSurrogates['power'], shape = nn, units = 'W')
+        self._cacheTag = self.cacheTag()
+
+    def _train(self):
+        # The surrogates are trained once per process by loadPropSurrogates
+        self.train = False
+
+    @profiledMethod
+    def predictThrustPower(self, x):
+        # Thrust and power, then their RMSE (NaN without), one row per node; thrust and power come
+        # from one evaluation pass
+        prediction = np.full((x.shape[0], 2 * len(propOutputNames)), np.nan)
+        for idxOutput, output in enumerate(propOutputNames):
+            predicted = self._metadata(output)['surrogate'].vectorized_predict(x)
+            if isinstance(predicted, tuple):
+                prediction[:, len(propOutputNames) + idxOutput] = np.reshape(predicted[1], x.shape[0])
+                predicted = predicted[0]
+            prediction[:, idxOutput] = np.reshape(predicted, x.shape[0])
+        return prediction
+
+    @profiledMethod
+    def linearizeThrustPower(self, x):
+        # Derivatives of thrust and power with respect to the inputs, (node, output, input)
+        return np.stack([self._metadata(output)['surrogate'].vectorized_linearize(x)[:, 0, :] for output in propOutputNames], axis = 1)
+
+    def cachedEvaluation(self, evaluate, name, x, valueShape):
+        # Evaluate only the nodes not already in the evaluation cache
+        cache = self.options['evaluation_cache']
+        if cache is None:
+            return evaluate(x)
+
+        tag = self._cacheTag + name.encode()
+        values, logicalHit = cache.get(tag, x, valueShape)
+        if not np.all(logicalHit):
+            values[~logicalHit] = evaluate(x[~logicalHit])
+            cache.put(tag, x[~logicalHit], values[~logicalHit])
+        return values
+
+    @profiledMethod
+    def compute(self, inputs, outputs):
+        # All nodes in one call; the surrogates from loadPropSurrogates are always batched
+        x = np.column_stack([inputs[name] for name in propInputNames])
+        prediction = self.cachedEvaluation(self.predictThrustPower, 'predict', x, (2 * len(propOutputNames),))
+        for idxOutput, output in enumerate(propOutputNames):
+            outputs[output] = prediction[:, idxOutput]
+            rmse = prediction[:, len(propOutputNames) + idxOutput]
+            if not np.all(np.isnan(rmse)):
+                self._metadata(output)['rmse'] = rmse[:, np.newaxis]
+
+    @profiledMethod
+    def compute_partials(self, inputs, partials):
+        x = np.column_stack([inputs[name] for name in propInputNames])
+        jac = self.cachedEvaluation(self.linearizeThrustPower, 'linearize', x, (len(propOutputNames), len(propInputNames)))
+        for idxOutput, output in enumerate(propOutputNames):
+            for idxInput, name in enumerate(propInputNames):
+                partials[output, name] = jac[:, idxOutput, idxInput]
 
 class PowerNet(om.ImplicitComponent):
 
+    def initialize(self):
+        self.options.declare('num_nodes', default = 1, types = int, desc = 'Number of operating points evaluated simultaneously')
+
     def setup(self):
-        self.add_input('power_batt', units = 'W')
-        self.add_input('power_esc', units = 'W')
-        self.add_input('power_motor', units = 'W')
-        self.add_input('power_prop', units = 'W')
+        nn = self.options['num_nodes']
+        arange = np.arange(nn)
+
+        self.add_input('power_batt', shape = nn, units = 'W')
+        self.add_input('power_esc', shape = nn, units = 'W')
+        self.add_input('power_motor', shape = nn, units = 'W')
+        self.add_input('power_prop', shape = nn, units = 'W')
 
-        self.add_output('current', units = 'A')
+        self.add_output('current', shape = nn, units = 'A')
 
-        self.add_residual('power_net', units = 'W')
+        self.add_residual('power_net', shape = (nn,), units = 'W')
 
-        self.declare_partials('power_net', ['power_batt', 'power_esc', 'power_motor', 'power_prop'], val = 1)
+        self.declare_partials('power_net', ['power_batt', 'power_esc', 'power_motor', 'power_prop'], rows = arange, cols = arange, val = 1)
 
+    @profiledMethod
     def apply_nonlinear(self, inputs, outputs, residuals):
         residuals['power_net'] = inputs['power_batt'] + inputs['power_esc'] + inputs['power_motor'] + inputs['power_prop']
 
-class ElectricPropulsion(om.Group):
+class PowerBalance(om.ExplicitComponent):
+
+    # Net power of ElectricPropulsion with the current given instead of solved for, the residual of
+    # PowerNet as an output
+    def initialize(self):
+        self.options.declare('num_nodes', default = 1, types = int, desc = 'Number of operating points evaluated simultaneously')
 
     def setup(self):
+        nn = self.options['num_nodes']
+        arange = np.arange(nn)
 
-        dirSurrogateModels = os.path.join(os.path.dirname(__file__), 'surrogate_models')
-        dirPropModel = os.path.join(dirSurrogateModels, 'prop_model')
-        pathSurrogateModelData = os.path.join(dirPropModel, 'surrogate_model_data.pickle')
-        pathThrustTrainingData = os.path.join(dirPropModel, 'thrust_training_data.dat')
-        pathPowerTrainingData = os.path.join(dirPropModel, 'power_training_data.dat')
+        self.add_input('power_batt', shape = nn, units = 'W')
+        self.add_input('power_esc', shape = nn, units = 'W')
+        self.add_input('power_motor', shape = nn, units = 'W')
+        self.add_input('power_prop', shape = nn, units = 'W')
 
-        with open(pathSurrogateModelData, 'rb') as fileSurrogateModelData:
-            surrogateModelData = pickle.load(fileSurrogateModelData)
+        self.add_output('power_net', shape = nn, units = 'W')
 
-        propModel = om.MetaModelUnStructuredComp()
+        self.declare_partials('power_net', ['power_batt', 'power_esc', 'power_motor', 'power_prop'], rows = arange, cols = arange, val = 1)
 
-        propModel.add_input('diameter', training_data = surrogateModelData['diameter'], units = 'inch')
-        propModel.add_input('pitch', training_data = surrogateModelData['pitch'], units = 'inch')
-        propModel.add_input('rpm', training_data = surrogateModelData['rpm'], units = 'rpm')
-        propModel.add_input('velocity', training_data = surrogateModelData['velocity'], units = 'm/s')
+    def compute(self, inputs, outputs):
+        outputs['power_net'] = inputs['power_batt'] + inputs['power_esc'] + inputs['power_motor'] + inputs['power_prop']
+
+class PowerBalanceSolver(NonlinearSolver):
+
+    # Operating point solver for ElectricPropulsion. Battery, ESC and motor reduce the power balance
+    # to one residual in the battery current per node, R(I) = (I/t - I_0) * V_prop(I) + P_prop(rpm(I)):
+    # shaft power in minus power absorbed by the prop. At the idle current (I = I_0 t) the shaft
+    # power is zero, so R <= 0. The shaft power peaks midway between the idle and stall currents;
+    # the operating point below that peak is bracketed by [idle, peak], and a motor that cannot
+    # reach it there is bracketed by [peak, just below stall], where the shaft power falls linearly
+    # while the prop power falls with rpm^3. The root is found with the Illinois variant of false
+    # position, vectorized over the nodes; every iteration is a single pass through the components
+    # and no linear systems are solved. A node is converged when its residual meets atol or its
+    # bracket has narrowed below current_tol, where the residual is too flat in current (a
+    # windmilling prop near stall) or too noisy to ever meet atol. With an evaluation cache the
+    # converged currents are stored by operating point inputs, and a solve whose nodes are all in
+    # the cache is a single pass.
+    SOLVER = 'NL: PowerBalance'
+
+    def _declare_options(self):
+        super()._declare_options()
+
+        self.options.declare('stall_margin', default = 1e-3, desc = 'Upper bracket of overloaded nodes, as a fraction of the peak power to stall current range below stall')
+        self.options.declare('max_bracket_steps', types = int, default = 5, desc = 'Times the stall margin is divided by 10 for overloaded nodes whose upper bracket has a negative residual')
+        self.options.declare('current_tol', default = 1e-10, desc = 'Nodes whose current bracket is narrower than this (A) are converged whatever their residual')
+        self.options.declare('evaluation_cache', default = None, types = EvaluationCache, allow_none = True, desc = 'Cache of the converged current keyed by quantized operating point inputs')
+
+    def _setup_solvers(self, system, depth):
+        super()._setup_solvers(system, depth)
+        self._disallow_discrete_outputs()
+
+    def _evaluate(self, current):
+        system = self._system()
+        system._outputs['power_net.current'] = current
+        self._gs_iter()
+        self._run_apply()
+        return system._residuals['power_net.current'].copy()
+
+    def _iter_initialize(self):
+        system = self._system()
+
+        # One pass with the current guess to transfer the inputs and compute the ESC efficiency
+        self._gs_iter()
+        voltageSupply = system._inputs['battery.voltage_supply']
+        resistanceBattery = system._inputs['battery.resistance']
+        throttle = system._inputs['esc.throttle']
+        efficiency = system._outputs['esc.efficiency']
+        resistanceMotor = system._inputs['motor.resistance']
+        idleCurrent = system._inputs['motor.idle_current']
+
+        cache = self.options['evaluation_cache']
+        self._cacheHit = False
+        if cache is not None:
+            self._cacheTag = evaluationCacheTag('operating_point', system.prop.cacheTag(), *(system.esc.options[name] for name in ['a', 'b', 'c']))
+            self._cacheInputs = np.column_stack([system._inputs[name] for name in operatingPointInputNames])
+            current, logicalHit = cache.get(self._cacheTag, self._cacheInputs)
+            if np.all(logicalHit):
+                self._cacheHit = True
+                self._logicalCollapsed = np.ones(current.shape, dtype = bool)
+                self._evaluate(current)
+                return 1.0, 0.0
+
+        currentIdle = idleCurrent * throttle
+        currentStall = voltageSupply * throttle * efficiency / (resistanceBattery * throttle * efficiency + resistanceMotor / throttle)
+        currentStall = np.maximum(currentStall, currentIdle)
+
+        self._currentLower = currentIdle
+        self._residualLower = self._evaluate(currentIdle)
+
+        currentPeak = 0.5 * (currentIdle + currentStall)
+        self._currentUpper = currentPeak
+        self._residualUpper = self._evaluate(currentPeak)
+
+        logicalOverloaded = self._residualUpper <= 0
+        if np.any(logicalOverloaded):
+            self._currentLower = np.where(logicalOverloaded, currentPeak, self._currentLower)
+            self._residualLower = np.where(logicalOverloaded, self._residualUpper, self._residualLower)
+
+            stallMargin = self.options['stall_margin'] * np.ones_like(currentIdle)
+            for _ in range(self.options['max_bracket_steps'] + 1):
+                logicalUnbracketed = logicalOverloaded & (self._residualUpper <= 0)
+                if not np.any(logicalUnbracketed):
+                    break
+                self._currentUpper = np.where(logicalUnbracketed, currentStall - stallMargin * (currentStall - currentPeak), self._currentUpper)
+                self._residualUpper = np.where(logicalUnbracketed, self._evaluate(self._currentUpper), self._residualUpper)
+                stallMargin[logicalUnbracketed] /= 10
+
+        self._sideRetained = np.zeros(currentIdle.shape, dtype = int)
+        self._logicalCollapsed = np.zeros(currentIdle.shape, dtype = bool)
+        self._evaluate(self._falsePosition())
+
+        norm = self._iter_get_norm()
+        norm0 = norm if norm != 0.0 else 1.0
+        return norm0, norm
+
+    def _solve(self):
+        super()._solve()
+
+        # Only nodes that met the tolerance are stored
+        cache = self.options['evaluation_cache']
+        if cache is not None and not self._cacheHit:
+            system = self._system()
+            current = system._outputs['power_net.current']
+            logicalConverged = (np.abs(system._residuals['power_net.current']) <= self.options['atol']) | self._logicalCollapsed
+            cache.put(self._cacheTag, self._cacheInputs[logicalConverged], current[logicalConverged])
+
+    def _falsePosition(self):
+        residualRange = self._residualUpper - self._residualLower
+        logicalSecant = residualRange != 0
+        current = 0.5 * (self._currentLower + self._currentUpper)
+        current[logicalSecant] = (self._currentUpper - self._residualUpper * (self._currentUpper - self._currentLower) / np.where(logicalSecant, residualRange, 1))[logicalSecant]
+        return current
+
+    def _single_iteration(self):
+        system = self._system()
+        current = system._outputs['power_net.current'].copy()
+        residual = system._residuals['power_net.current'].copy()
+
+        # Replace the bracket end with the same sign; if the same end is kept twice in a row, halve
+        # its residual (Illinois) so the iteration does not stall on one side
+        logicalUpper = residual > 0
+        logicalLower = ~logicalUpper
+        self._residualLower[logicalUpper & (self._sideRetained == -1)] /= 2
+        self._residualUpper[logicalLower & (self._sideRetained == 1)] /= 2
+        self._currentUpper[logicalUpper] = current[logicalUpper]
+        self._residualUpper[logicalUpper] = residual[logicalUpper]
+        self._currentLower[logicalLower] = current[logicalLower]
+        self._residualLower[logicalLower] = residual[logicalLower]
+        self._sideRetained = np.where(logicalUpper, -1, 1)
+        self._logicalCollapsed = self._currentUpper - self._currentLower <= self.options['current_tol']
+
+        system._outputs['power_net.current'] = self._falsePosition()
+        self._gs_iter()
+
+    def _iter_get_norm(self):
+        # Nodes with a collapsed bracket no longer count; _iter_initialize sets the mask before the
+        # first norm of every solve
+        residual = self._system()._residuals['power_net.current']
+        return np.linalg.norm(residual[~self._logicalCollapsed])
 
-        propModel.add_output('thrust', 0.0, training_data = surrogateModelData['thrust'], surrogate = om.KrigingSurrogate(eval_rmse = True, lapack_driver = 'gesdd', training_cache = pathThrustTrainingData), units = 'N')
-        propModel.add_output('power', 0.0, training_data = surrogateModelData['power'], surrogate = om.KrigingSurrogate(eval_rmse = True, lapack_driver = 'gesdd', training_cache = pathPowerTrainingData), units = 'W')
+class ElectricPropulsion(om.Group):
 
-        self.add_subsystem('battery', Battery())
-        self.add_subsystem('esc', ElectronicSpeedController())
-        self.add_subsystem('motor', Motor())
-        self.add_subsystem('prop', propModel)
-        self.add_subsystem('power_net', PowerNet())
+    def initialize(self):
+        self.options.declare('num_nodes', default = 1, types = int, desc = 'Number of operating points evaluated simultaneously')
+        self.options.declare('prop_model_dir', default = dirPropModel, types = str, desc = 'Directory of the prop model training data and caches')
+        self.options.declare('prop_surrogate_type', default = 'kriging', values = ['kriging', 'compiled', 'sparse'], desc = 'Surrogate used by the prop component')
+        self.options.declare('prop_eval_rmse', default = False, types = bool, desc = 'Compute the prop RMSE with the compiled or sparse surrogate')
+        self.options.declare('prop_shared_hyperparameters', default = True, types = bool, desc = 'Fit prop thrust and power with one correlation model instead of one per output')
+        self.options.declare('prop_fidelity', default = 'full', values = ['full', 'parametric', 'corrected'], desc = 'Prop model fidelity: the surrogate, fitted coefficient curves (fast, for early sweeps and searches) or the curves with a surrogate correction')
+        self.options.declare('power_balance_solver', default = False, types = bool, desc = 'Converge the operating point with PowerBalanceSolver instead of a Newton solver above this group')
+        self.options.declare('evaluation_cache', default = None, types = EvaluationCache, allow_none = True, desc = 'Cache of prop evaluations and converged operating points shared by repeated runs')
+        self.options.declare('fixed_current', default = False, types = bool, desc = 'Take the battery current as the input current and output the net power power_net.power_net instead of solving for the current')
+
+    def setup(self):
+        nn = self.options['num_nodes']
+
+        self.add_subsystem('battery', Battery(num_nodes = nn))
+        self.add_subsystem('esc', ElectronicSpeedController(num_nodes = nn))
+        self.add_subsystem('motor', Motor(num_nodes = nn))
+        self.add_subsystem('prop', Propeller(vec_size = nn, prop_model_dir = self.options['prop_model_dir'], surrogate_type = self.options['prop_surrogate_type'], eval_rmse = self.options['prop_eval_rmse'], shared_hyperparameters = self.options['prop_shared_hyperparameters'], fidelity = self.options['prop_fidelity'], evaluation_cache = self.options['evaluation_cache']))
+        if self.options['fixed_current']:
+            self.add_subsystem('power_net', PowerBalance(num_nodes = nn))
+            self.promotes('battery', inputs = ['current'])
+            self.promotes('esc', inputs = [('current_in', 'current')])
+        else:
+            self.add_subsystem('power_net', PowerNet(num_nodes = nn))
 
         self.connect('battery.voltage_out', 'esc.voltage_in')
         self.connect('esc.voltage_out', 'motor.voltage_in')
@@ -175,7 +533,12 @@ class ElectricPropulsion(om.Group):
         self.connect('esc.power', 'power_net.power_esc')
         self.connect('motor.power', 'power_net.power_motor')
         self.connect('prop.power', 'power_net.power_prop')
-        self.connect('power_net.current', ['battery.current', 'esc.current_in'])
+        if not self.options['fixed_current']:
+            self.connect('power_net.current', ['battery.current', 'esc.current_in'])
+
+        if self.options['power_balance_solver']:
+            self.nonlinear_solver = PowerBalanceSolver(maxiter = 50, atol = 1e-8, rtol = 1e-10, iprint = 0, evaluation_cache = self.options['evaluation_cache'])
+            self.linear_solver = om.DirectSolver(assemble_jac = True)
 
 class RubberMotor(om.ExplicitComponent):
 
@@ -193,18 +556,24 @@ class RubberMotor(om.ExplicitComponent):
         self.options.declare('c_pow', default =  -2.0421,     desc = 'c coefficient for max_power(kv, mass) equation: max_power = a*kv + b*mass + c*kv*mass + d')
         self.options.declare('d_pow', default = 181.3208,     desc = 'd coefficient for max_power(kv, mass) equation: max_power = a*kv + b*mass + c*kv*mass + d')
 
+        self.options.declare('num_nodes', default = 1, types = int, desc = 'Number of operating points evaluated simultaneously')
+
     def setup(self):
-        self.add_input('kv', units = 'rpm/V')
-        self.add_input('mass', units = 'kg')
+        nn = self.options['num_nodes']
+        arange = np.arange(nn)
+
+        self.add_input('kv', shape = nn, units = 'rpm/V')
+        self.add_input('mass', shape = nn, units = 'kg')
         
-        self.add_output('resistance', units = 'ohm')
-        self.add_output('idle_current', units = 'A')
-        self.add_output('max_power', units = 'W')
-        self.add_output('kv_out', units = 'rpm/V')
+        self.add_output('resistance', shape = nn, units = 'ohm')
+        self.add_output('idle_current', shape = nn, units = 'A')
+        self.add_output('max_power', shape = nn, units = 'W')
+        self.add_output('kv_out', shape = nn, units = 'rpm/V')
 
-        self.declare_partials(['resistance', 'idle_current', 'max_power'], ['kv', 'mass'])
-        self.declare_partials('kv_out', 'kv')
+        self.declare_partials(['resistance', 'idle_current', 'max_power'], ['kv', 'mass'], rows = arange, cols = arange)
+        self.declare_partials('kv_out', 'kv', rows = arange, cols = arange, val = 1)
     
+    @profiledMethod
     def compute(self, inputs, outputs):
 
         a_io = self.options['a_io']
@@ -225,6 +594,7 @@ class RubberMotor(om.ExplicitComponent):
         outputs['max_power'] = a_pow*inputs['kv'] + b_pow*inputs['mass'] + c_pow*inputs['kv']*inputs['mass'] + d_pow
         outputs['kv_out'] = inputs['kv']
     
+    @profiledMethod
     def compute_partials(self, inputs, partials):
 
         a_io = self.options['a_io']
@@ -250,19 +620,65 @@ class RubberMotor(om.ExplicitComponent):
         partials['max_power', 'kv'] = a_pow + c_pow * inputs['mass']
         partials['max_power', 'mass'] = b_pow + c_pow * inputs['kv']
 
-        partials['kv_out', 'kv'] = 1
-
 class RubberElectricPropulsion(om.Group):
 
+    def initialize(self):
+        self.options.declare('num_nodes', default = 1, types = int, desc = 'Number of operating points evaluated simultaneously')
+
     def setup(self):
+        nn = self.options['num_nodes']
 
-        self.add_subsystem('electric_propulsion', ElectricPropulsion())
-        self.add_subsystem('rubber_motor', RubberMotor())
+        self.add_subsystem('electric_propulsion', ElectricPropulsion(num_nodes = nn))
+        self.add_subsystem('rubber_motor', RubberMotor(num_nodes = nn))
 
         self.connect('rubber_motor.kv_out', 'electric_propulsion.motor.kv')
         self.connect('rubber_motor.resistance', 'electric_propulsion.motor.resistance')
         self.connect('rubber_motor.idle_current', 'electric_propulsion.motor.idle_current')
 
+class MultipointElectricPropulsion(om.Group):
+
+    # ElectricPropulsion at several flight conditions (e.g. takeoff, climb and cruise) sharing one
+    # design: the prop diameter and pitch, and either the motor kv, resistance and idle current or,
+    # with rubber_motor, the kv and mass of a RubberMotor. The design inputs are promoted to this
+    # group as diameter, pitch, kv, motor_resistance and idle_current (or kv and mass). Each
+    # condition converges its own operating points with PowerBalanceSolver inside a ParallelGroup,
+    # so under MPI the conditions are distributed across the ranks; without MPI they run in turn.
+    def initialize(self):
+        self.options.declare('conditions', types = list, desc = 'Names of the flight conditions')
+        self.options.declare('num_nodes', default = 1, types = int, desc = 'Number of operating points evaluated simultaneously at each condition')
+        self.options.declare('rubber_motor', default = False, types = bool, desc = 'Size the motor with RubberMotor from kv and mass')
+        self.options.declare('prop_model_dir', default = dirPropModel, types = str, desc = 'Directory of the prop model training data and caches')
+        self.options.declare('prop_surrogate_type', default = 'kriging', values = ['kriging', 'compiled', 'sparse'], desc = 'Surrogate used by the prop components')
+        self.options.declare('prop_fidelity', default = 'full', values = ['full', 'parametric', 'corrected'], desc = 'Prop model fidelity of the prop components')
+
+    def setup(self):
+        nn = self.options['num_nodes']
+        srcIndices = np.zeros(nn, dtype = int)
+
+        shared = [('prop.diameter', 'diameter'), ('prop.pitch', 'pitch')]
+        if self.options['rubber_motor']:
+            self.add_subsystem('rubber_motor', RubberMotor(num_nodes = 1), promotes_inputs = ['kv', 'mass'])
+        else:
+            shared += [('motor.kv', 'kv'), ('motor.resistance', 'motor_resistance'), ('motor.idle_current', 'idle_current')]
+
+        conditions = self.add_subsystem('conditions', om.ParallelGroup())
+        for condition in self.options['conditions']:
+            conditions.add_subsystem(condition, ElectricPropulsion(num_nodes = nn, power_balance_solver = True, prop_model_dir = self.options['prop_model_dir'], prop_surrogate_type = self.options['prop_surrogate_type'], prop_fidelity = self.options['prop_fidelity']))
+            conditions.promotes(condition, inputs = shared, src_indices = srcIndices, src_shape = (1,))
+
+            if self.options['rubber_motor']:
+                self.connect('rubber_motor.kv_out', f'conditions.{condition}.motor.kv', src_indices = srcIndices)
+                self.connect('rubber_motor.resistance', f'conditions.{condition}.motor.resistance', src_indices = srcIndices)
+                self.connect('rubber_motor.idle_current', f'conditions.{condition}.motor.idle_current', src_indices = srcIndices)
+
+        self.promotes('conditions', inputs = [alias for _, alias in shared])
+        self.set_input_defaults('diameter', units = 'inch')
+        self.set_input_defaults('pitch', units = 'inch')
+        if not self.options['rubber_motor']:
+            self.set_input_defaults('kv', units = 'rpm/V')
+            self.set_input_defaults('motor_resistance', units = 'ohm')
+            self.set_input_defaults('idle_current', units = 'A')
+
 if __name__=="__main__":
 
     '''
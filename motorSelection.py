@@ -0,0 +1,164 @@
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from motorModelOpenmdog import ElectronicSpeedController, ElectricPropulsion, loadPropSurrogates
+from performanceMap import performanceMapProblem
+from operatingPoint import limitThrottle
+from columnarData import openMotoCalcDatabase
+
+# MotoCalc motorData headers of the motor parameters ElectricPropulsion needs
+motorDataHeaderNames = {'kv': 'kv', 'resistance': 'resistance', 'idle_current': 'idleCurrent', 'mass': 'mass'}
+
+def motorCatalog(motoCalcData, motors = None, headerNames = motorDataHeaderNames):
+
+    if motors is None:
+        motors = list(motoCalcData)
+    motorData = [motoCalcData.motorData(motor) for motor in motors]
+    catalog = {name: np.array([data[header] for data in motorData]) for name, header in headerNames.items()}
+    catalog['motor'] = np.array(motors)
+    return catalog
+
+def motorSelectionBounds(candidates, velocity, thrust, voltage, batteryResistance, powerLimit, airDensity = 1.225, propOptions = None):
+
+    # Necessary conditions for a (motor, prop) candidate to meet every (velocity, thrust)
+    # requirement, from the component equations alone plus one batched prop surrogate call; returns
+    # a pruning reason per candidate, '' for candidates that may qualify.
+    #   stall: the motor cannot turn at full throttle (idle current at or above stall current)
+    #   power: the ideal (momentum theory) power for the thrust exceeds the most shaft power the
+    #          motor can deliver, the peak of (I - I_0) V_prop, or the battery power limit
+    #   rpm:   the prop does not make the thrust even at the no-load rpm kv V
+    # propOptions are the ElectricPropulsion prop options of the candidates' exact evaluation, so
+    # the bound uses the same prop model (data directory, surrogate, fidelity) as the solve.
+    propOptions = ElectricPropulsion(**(propOptions or {})).options
+    efficiency = ElectronicSpeedController().options
+    efficiencyFull = efficiency['a'] * (1 - 1 / (1 + efficiency['b']))
+
+    voltageMotor = voltage * efficiencyFull
+    resistanceTotal = batteryResistance * efficiencyFull + candidates['resistance']
+    currentStall = voltageMotor / resistanceTotal
+    shaftPowerMax = np.minimum(resistanceTotal * np.maximum(currentStall - candidates['idle_current'], 0)**2 / 4, efficiencyFull * powerLimit)
+
+    diskArea = np.pi / 4 * (candidates['diameter'][:, np.newaxis] * 0.0254)**2
+    inducedVelocity = -velocity / 2 + np.sqrt(velocity**2 / 4 + thrust / (2 * airDensity * diskArea))
+    idealPower = thrust * (velocity + inducedVelocity)
+
+    nCandidates = candidates['kv'].size
+    rpmMax = np.repeat(candidates['kv'] * voltageMotor, velocity.size)
+    x = np.column_stack([np.repeat(candidates['diameter'], velocity.size), np.repeat(candidates['pitch'], velocity.size), rpmMax, np.tile(velocity, nCandidates)])
+    thrustMax = loadPropSurrogates(propOptions['prop_model_dir'], propOptions['prop_surrogate_type'], False, propOptions['prop_shared_hyperparameters'], propOptions['prop_fidelity'])['thrust'].vectorized_predict(x)
+    thrustMax = (thrustMax[0] if isinstance(thrustMax, tuple) else thrustMax).reshape(nCandidates, velocity.size)
+
+    reason = np.full(nCandidates, '', dtype = object)
+    reason[np.any(thrustMax < thrust, axis = 1)] = 'rpm'
+    reason[np.any(idealPower > shaftPowerMax[:, np.newaxis], axis = 1)] = 'power'
+    reason[currentStall <= candidates['idle_current']] = 'stall'
+    return reason
+
+def evaluateMotorCandidates(candidates, velocity, thrust, voltage, batteryResistance, propOptions):
+
+    # Battery power each candidate needs to make the required thrust at each velocity, every
+    # (candidate, requirement) pair a node of one problem; inf where full throttle falls short
+    nCandidates = candidates['kv'].size
+    nRequirements = velocity.size
+    prob = performanceMapProblem(nCandidates * nRequirements, propOptions)
+
+    prob.set_val('esc.throttle', 1.)
+    prob.set_val('prop.velocity', np.tile(velocity, nCandidates), units = 'm/s')
+    prob.set_val('prop.diameter', np.repeat(candidates['diameter'], nRequirements), units = 'inch')
+    prob.set_val('prop.pitch', np.repeat(candidates['pitch'], nRequirements), units = 'inch')
+    prob.set_val('battery.voltage_supply', voltage, units = 'V')
+    prob.set_val('battery.resistance', batteryResistance, units = 'ohm')
+    prob.set_val('motor.kv', np.repeat(candidates['kv'], nRequirements), units = 'rpm/V')
+    prob.set_val('motor.resistance', np.repeat(candidates['resistance'], nRequirements), units = 'ohm')
+    prob.set_val('motor.idle_current', np.repeat(candidates['idle_current'], nRequirements), units = 'A')
+
+    thrustRequired = np.tile(thrust, nCandidates)
+    limitThrottle(prob, 'thrust', thrustRequired, units = 'N')
+
+    power = prob.get_val('battery.power', units = 'W').copy()
+    power[prob.get_val('prop.thrust', units = 'N') < thrustRequired * (1 - 1e-6)] = np.inf
+    return power.reshape(nCandidates, nRequirements), prob.get_val('esc.throttle').reshape(nCandidates, nRequirements).copy()
+
+def selectMotors(motoCalcData, velocity, thrust, props, voltage, batteryResistance, powerLimit, motors = None, nWorkers = None, chunkSize = 500, headerNames = motorDataHeaderNames, propOptions = None):
+
+    # Every catalog motor with every (diameter, pitch) prop against a mission requirement: make
+    # thrust[i] (N) at velocity[i] (m/s) without exceeding powerLimit (W) of battery power.
+    # Candidates that fail the analytic bounds are pruned before any operating point is solved;
+    # the rest are solved in chunks on a process pool and ranked by the mean battery power they
+    # need over the requirement points.
+    if propOptions is None:
+        propOptions = {'prop_surrogate_type': 'compiled'}
+    velocity = np.atleast_1d(np.asarray(velocity, dtype = float))
+    thrust = np.broadcast_to(np.asarray(thrust, dtype = float), velocity.shape)
+    props = np.atleast_2d(np.asarray(props, dtype = float))
+    tStart = time.time()
+
+    catalog = motorCatalog(motoCalcData, motors, headerNames)
+    nMotors = catalog['motor'].size
+    candidates = {name: np.repeat(values, len(props)) for name, values in catalog.items()}
+    candidates['diameter'] = np.tile(props[:, 0], nMotors)
+    candidates['pitch'] = np.tile(props[:, 1], nMotors)
+    nCandidates = candidates['motor'].size
+
+    reason = motorSelectionBounds(candidates, velocity, thrust, voltage, batteryResistance, powerLimit, propOptions = propOptions)
+    idxSurvivors = np.flatnonzero(reason == '')
+    tBounds = time.time() - tStart
+
+    power = np.full((nCandidates, velocity.size), np.inf)
+    throttle = np.full((nCandidates, velocity.size), np.nan)
+    chunks = [idxSurvivors[idxStart:idxStart + chunkSize] for idxStart in range(0, idxSurvivors.size, chunkSize)]
+    if chunks:
+        with ProcessPoolExecutor(max_workers = nWorkers) as executor:
+            numericalNames = ['kv', 'resistance', 'idle_current', 'diameter', 'pitch']
+            futures = [executor.submit(evaluateMotorCandidates, {name: candidates[name][idxChunk] for name in numericalNames}, velocity, thrust, voltage, batteryResistance, propOptions) for idxChunk in chunks]
+            for idxChunk, future in zip(chunks, futures):
+                power[idxChunk], throttle[idxChunk] = future.result()
+
+    logicalInfeasible = (reason == '') & np.any(power > powerLimit, axis = 1)
+    reason[logicalInfeasible] = 'infeasible'
+    score = np.where(reason == '', np.mean(power, axis = 1), np.inf)
+    idxRanked = [idxCandidate for idxCandidate in np.argsort(score, kind = 'stable') if np.isfinite(score[idxCandidate])]
+
+    ranking = [{
+        'motor': str(candidates['motor'][idxCandidate]),
+        'diameter': float(candidates['diameter'][idxCandidate]),
+        'pitch': float(candidates['pitch'][idxCandidate]),
+        'mass': float(candidates['mass'][idxCandidate]),
+        'meanPower': float(score[idxCandidate]),
+        'power': power[idxCandidate].tolist(),
+        'throttle': throttle[idxCandidate].tolist()
+    } for idxCandidate in idxRanked]
+
+    return {
+        'ranking': ranking,
+        'nCandidates': int(nCandidates),
+        'pruned': {name: int(np.sum(reason == name)) for name in ['stall', 'power', 'rpm']},
+        'solved': int(idxSurvivors.size),
+        'infeasible': int(np.sum(logicalInfeasible)),
+        'boundsTime': tBounds,
+        'wallTime': time.time() - tStart
+    }
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description = 'Rank MotoCalc motors and props against a thrust requirement under a battery power limit')
+    parser.add_argument('pathMotoCalcData', help = 'MotoCalc .mat export or converted columnar database directory')
+    parser.add_argument('--velocity', type = float, nargs = '+', required = True, help = 'requirement velocities (m/s)')
+    parser.add_argument('--thrust', type = float, nargs = '+', required = True, help = 'thrust required at each velocity (N)')
+    parser.add_argument('--diameters', type = float, nargs = '+', required = True, help = 'prop diameters (inch)')
+    parser.add_argument('--pitches', type = float, nargs = '+', required = True, help = 'prop pitches (inch)')
+    parser.add_argument('--voltage', type = float, default = 22.2, help = 'battery voltage (V)')
+    parser.add_argument('--battery-resistance', type = float, default = 0.012, help = 'battery resistance (ohm)')
+    parser.add_argument('--power-limit', type = float, default = 1000, help = 'battery power limit (W)')
+    parser.add_argument('--workers', type = int, default = None, help = 'number of worker processes (default: number of CPUs)')
+    parser.add_argument('--top', type = int, default = 10, help = 'number of candidates printed')
+    parser.add_argument('--prop-fidelity', default = 'full', choices = ['full', 'parametric', 'corrected'], help = 'prop model fidelity; parametric for a fast first screening')
+    args = parser.parse_args()
+
+    props = [(diameter, pitch) for diameter in args.diameters for pitch in args.pitches]
+    selection = selectMotors(openMotoCalcDatabase(args.pathMotoCalcData), args.velocity, args.thrust, props, args.voltage, args.battery_resistance, args.power_limit, nWorkers = args.workers, propOptions = {'prop_surrogate_type': 'compiled', 'prop_fidelity': args.prop_fidelity})
+
+    print(f'{selection["nCandidates"]} candidates, pruned {selection["pruned"]}, solved {selection["solved"]}, infeasible {selection["infeasible"]} in {selection["wallTime"]:.1f} s')
+    for rank, candidate in enumerate(selection['ranking'][:args.top]):
+        print(f'{rank + 1:3d} {candidate["motor"]:30s} {candidate["diameter"]:5.1f} x {candidate["pitch"]:4.1f} in, mean power {candidate["meanPower"]:7.1f} W, mass {candidate["mass"]:.3f} kg')
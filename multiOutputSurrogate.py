@@ -0,0 +1,186 @@
+import numpy as np
+import openmdao.api as om
+from surrogateCache import CachedKrigingSurrogate
+
+class MultiOutputSurrogate(object):
+
+    # Several outputs trained on identical inputs. With shared hyperparameters one surrogate is fit to
+    # all outputs at once (one correlation model and one factorization); otherwise each output gets
+    # its own surrogate. MetaModelUnStructuredComp sees one OutputSurrogate view per output; the views
+    # register their training data here and evaluation of all outputs (for one point or a batch)
+    # happens in one pass, cached on the query points so the second output reuses the first one's
+    # work. The cache is one (key, result) tuple replaced as a whole, so threads sharing the
+    # surrogate never read another thread's result. contentKey is set by the code that trains the
+    # surrogate to the hash of its training data and settings, and identifies it in evaluation caches.
+    def __init__(self, outputs, sharedHyperparameters = True, surrogateClass = CachedKrigingSurrogate, seedCaches = None, **surrogateOptions):
+        self.outputs = list(outputs)
+        self.sharedHyperparameters = sharedHyperparameters
+        self.surrogateClass = surrogateClass
+        self.seedCaches = seedCaches or {}
+        self.surrogateOptions = surrogateOptions
+
+        self.surrogates = []
+        self.contentKey = None
+        self._trainingInput = None
+        self._trainingOutput = {}
+        self._lastPredict = (None, None)
+        self._lastLinearize = (None, None)
+
+    @classmethod
+    def fromSurrogates(cls, surrogates):
+
+        # Wrap already trained surrogates, given as [(surrogate, [outputs it predicts]), ...]
+        multiOutputSurrogate = cls([output for _, outputs in surrogates for output in outputs])
+        multiOutputSurrogate.surrogates = [(surrogate, list(outputs)) for surrogate, outputs in surrogates]
+        return multiOutputSurrogate
+
+    def outputGroups(self):
+        if self.sharedHyperparameters:
+            return [self.outputs]
+        return [[output] for output in self.outputs]
+
+    def _newSurrogate(self, outputs):
+        surrogate = self.surrogateClass(**self.surrogateOptions)
+        if len(outputs) == 1 and outputs[0] in self.seedCaches and 'seed_cache' in surrogate.options:
+            surrogate.options['seed_cache'] = self.seedCaches[outputs[0]]
+        return surrogate
+
+    def cachePaths(self, x, y):
+        x = np.asarray(x, dtype = float)
+        return [self._newSurrogate(outputs).cachePath(x, np.column_stack([y[output] for output in outputs])) for outputs in self.outputGroups()]
+
+    def train(self, x, y):
+        x = np.asarray(x, dtype = float)
+        self.surrogates = []
+        for outputs in self.outputGroups():
+            surrogate = self._newSurrogate(outputs)
+            surrogate.train(x, np.column_stack([y[output] for output in outputs]))
+            self.surrogates.append((surrogate, outputs))
+
+        self._lastPredict = (None, None)
+        self._lastLinearize = (None, None)
+
+    def addTrainingData(self, output, x, y):
+        x = np.asarray(x, dtype = float)
+        if self._trainingInput is not None and not np.array_equal(self._trainingInput, x):
+            raise ValueError('All outputs of a MultiOutputSurrogate must be trained on the same inputs')
+        self._trainingInput = x
+        self._trainingOutput[output] = np.asarray(y, dtype = float).reshape(x.shape[0])
+
+        if len(self._trainingOutput) == len(self.outputs):
+            self.train(self._trainingInput, self._trainingOutput)
+            self._trainingInput = None
+            self._trainingOutput = {}
+
+    def predict(self, x):
+        x = np.atleast_2d(np.asarray(x, dtype = float))
+        key = x.tobytes()
+        lastKey, prediction = self._lastPredict
+        if lastKey != key:
+            prediction = {}
+            for surrogate, outputs in self.surrogates:
+                if hasattr(surrogate, 'vectorized_linearize'):
+                    predicted = surrogate.vectorized_predict(x)
+                else:
+                    # KrigingSurrogate.predict only handles the RMSE of a single point
+                    predicted = [surrogate.predict(xPoint) for xPoint in x]
+                    if isinstance(predicted[0], tuple):
+                        predicted = tuple(np.concatenate(part) for part in zip(*predicted))
+                    else:
+                        predicted = np.concatenate(predicted)
+                y, rmse = predicted if isinstance(predicted, tuple) else (predicted, None)
+                y = np.reshape(y, (x.shape[0], len(outputs)))
+                for idxOutput, output in enumerate(outputs):
+                    prediction[output] = (y[:, idxOutput:idxOutput + 1], None if rmse is None else np.reshape(rmse, (x.shape[0], len(outputs)))[:, idxOutput:idxOutput + 1])
+            self._lastPredict = (key, prediction)
+        return prediction
+
+    def linearize(self, x):
+        x = np.atleast_2d(np.asarray(x, dtype = float))
+        key = x.tobytes()
+        lastKey, jacobian = self._lastLinearize
+        if lastKey != key:
+            jacobian = {}
+            for surrogate, outputs in self.surrogates:
+                if hasattr(surrogate, 'vectorized_linearize'):
+                    jac = surrogate.vectorized_linearize(x)
+                else:
+                    jac = np.array([surrogate.linearize(xPoint) for xPoint in x])
+                for idxOutput, output in enumerate(outputs):
+                    jacobian[output] = jac[:, idxOutput:idxOutput + 1, :]
+            self._lastLinearize = (key, jacobian)
+        return jacobian
+
+    def view(self, output):
+        return OutputSurrogate(self, output)
+
+class OutputSurrogate(om.SurrogateModel):
+
+    # One output of a MultiOutputSurrogate, usable wherever MetaModelUnStructuredComp expects a surrogate
+    def __init__(self, multiOutputSurrogate, output, **kwargs):
+        super().__init__(**kwargs)
+        self.multiOutputSurrogate = multiOutputSurrogate
+        self.output = output
+        self.trained = bool(multiOutputSurrogate.surrogates)
+
+    def train(self, x, y):
+        super().train(x, y)
+        self.multiOutputSurrogate.addTrainingData(self.output, x, y)
+
+    def predict(self, x):
+        y, rmse = self.multiOutputSurrogate.predict(x)[self.output]
+        if rmse is None:
+            return y
+        return y, rmse
+
+    def linearize(self, x):
+        return self.multiOutputSurrogate.linearize(x)[self.output][0]
+
+    def vectorized_predict(self, x):
+        return self.predict(x)
+
+    def vectorized_linearize(self, x):
+        return self.multiOutputSurrogate.linearize(x)[self.output]
+
+class CorrectedMultiOutputSurrogate(MultiOutputSurrogate):
+
+    # Sum of a base model and a correction trained on its residual, both MultiOutputSurrogates of
+    # the same outputs; the RMSE is the correction's. Either trained parts are combined or train()
+    # fits the base to the data and the correction to what the base leaves unexplained.
+    def __init__(self, base, correction):
+        super().__init__(base.outputs)
+        self.base = base
+        self.correction = correction
+        self.surrogates = base.surrogates + correction.surrogates
+
+    def train(self, x, y):
+        x = np.asarray(x, dtype = float)
+        self.base.train(x, y)
+        basePrediction = self.base.predict(x)
+        self.correction.train(x, {output: np.asarray(y[output], dtype = float).reshape(x.shape[0]) - basePrediction[output][0][:, 0] for output in self.outputs})
+        self.surrogates = self.base.surrogates + self.correction.surrogates
+
+        self._lastPredict = (None, None)
+        self._lastLinearize = (None, None)
+
+    def predict(self, x):
+        x = np.atleast_2d(np.asarray(x, dtype = float))
+        key = x.tobytes()
+        lastKey, prediction = self._lastPredict
+        if lastKey != key:
+            basePrediction = self.base.predict(x)
+            correctionPrediction = self.correction.predict(x)
+            prediction = {output: (basePrediction[output][0] + correctionPrediction[output][0], correctionPrediction[output][1]) for output in self.outputs}
+            self._lastPredict = (key, prediction)
+        return prediction
+
+    def linearize(self, x):
+        x = np.atleast_2d(np.asarray(x, dtype = float))
+        key = x.tobytes()
+        lastKey, jacobian = self._lastLinearize
+        if lastKey != key:
+            baseJacobian = self.base.linearize(x)
+            correctionJacobian = self.correction.linearize(x)
+            jacobian = {output: baseJacobian[output] + correctionJacobian[output] for output in self.outputs}
+            self._lastLinearize = (key, jacobian)
+        return jacobian
@@ -0,0 +1,80 @@
+import numpy as np
+
+# Quantities an operating point can be limited by, as paths inside ElectricPropulsion; all of them
+# increase monotonically with throttle
+limitQuantities = {
+    'power': 'battery.power',
+    'current': 'power_net.current',
+    'thrust': 'prop.thrust'
+}
+
+def limitThrottle(prob, quantity, limit, units = None, path = '', minThrottle = 0.05, rtol = 1e-8, maxiter = 50):
+
+    # Throttle at every node of a set-up ElectricPropulsion problem that makes quantity (power,
+    # current or thrust) equal to limit (one value or one per node), or full throttle where the
+    # limit is not reached. Nodes over the limit at full throttle are bracketed by [minThrottle, 1]
+    # and solved together with the Illinois variant of false position, one run_model per
+    # iteration, and the problem is left at the returned operating point. path is the pathname of
+    # the ElectricPropulsion group, '' when its variables are promoted to the top.
+    def name(relativeName):
+        return f'{path}.{relativeName}' if path else relativeName
+
+    nameThrottle = name('esc.throttle')
+    nameQuantity = name(limitQuantities[quantity])
+
+    def evaluate(throttle):
+        prob.set_val(nameThrottle, throttle)
+        prob.run_model()
+        return prob.get_val(nameQuantity, units = units) - limit
+
+    throttleUpper = np.ones(np.size(prob.get_val(nameThrottle)))
+    excessUpper = evaluate(throttleUpper)
+    logicalLimited = excessUpper > 0
+    nEvaluations = 1
+
+    result = {'throttle': throttleUpper, 'limited': logicalLimited, 'converged': np.ones_like(logicalLimited), 'evaluations': nEvaluations}
+    if not np.any(logicalLimited):
+        return result
+
+    throttleLower = np.where(logicalLimited, minThrottle, 1.)
+    excessLower = np.where(logicalLimited, evaluate(throttleLower), 0.)
+    nEvaluations += 1
+
+    # Nodes still over the limit at minThrottle are left there and reported as not converged
+    logicalBracketed = logicalLimited & (excessLower <= 0)
+    throttle = np.where(logicalLimited, throttleLower, 1.)
+    excess = np.where(logicalLimited, excessLower, excessUpper)
+    tolerance = rtol * np.maximum(np.abs(limit), 1.)
+    sideRetained = np.zeros(throttle.size, dtype = int)
+
+    while nEvaluations < maxiter + 2:
+        logicalActive = logicalBracketed & (np.abs(excess) > tolerance)
+        if not np.any(logicalActive):
+            break
+
+        excessRange = excessUpper - excessLower
+        throttleNew = 0.5 * (throttleLower + throttleUpper)
+        logicalSecant = logicalActive & (excessRange != 0)
+        throttleNew[logicalSecant] = (throttleUpper - excessUpper * (throttleUpper - throttleLower) / np.where(logicalSecant, excessRange, 1))[logicalSecant]
+        throttle = np.where(logicalActive, throttleNew, throttle)
+
+        excessNew = evaluate(throttle)
+        nEvaluations += 1
+        excess = np.where(logicalActive, excessNew, excess)
+
+        # Same bracket update as PowerBalanceSolver: replace the end with the same sign and halve
+        # the other end's excess when it has been kept twice in a row
+        logicalUpper = logicalActive & (excess > 0)
+        logicalLower = logicalActive & (excess <= 0)
+        excessLower[logicalUpper & (sideRetained == -1)] /= 2
+        excessUpper[logicalLower & (sideRetained == 1)] /= 2
+        throttleUpper[logicalUpper] = throttle[logicalUpper]
+        excessUpper[logicalUpper] = excess[logicalUpper]
+        throttleLower[logicalLower] = throttle[logicalLower]
+        excessLower[logicalLower] = excess[logicalLower]
+        sideRetained = np.where(logicalUpper, -1, np.where(logicalLower, 1, sideRetained))
+
+    result['throttle'] = throttle
+    result['converged'] = ~logicalLimited | (logicalBracketed & (np.abs(excess) <= tolerance))
+    result['evaluations'] = nEvaluations
+    return result
@@ -0,0 +1,110 @@
+import numpy as np
+import openmdao.api as om
+
+class ParametricPropSurrogate(om.SurrogateModel):
+
+    # Low fidelity prop model: thrust and power coefficients as polynomials in the advance ratio
+    # J = V / (n D) and the pitch ratio P / D, least squares fit to the training data, with
+    # T = C_T rho n^2 D^4 and P = C_P rho n^3 D^5. Inputs are diameter and pitch (inch), rpm and
+    # velocity (m/s), outputs thrust (N) and power (W), the columns of the prop training data.
+    # Evaluation costs a few dozen flops per point whatever the number of training points, and the
+    # fit takes milliseconds, so it is not cached. Outside the advance ratio and pitch ratio range of
+    # the training data the coefficients are held at the values at the end of the range. The RMSE
+    # is the RMS coefficient residual of the fit scaled like the output.
+    # Exponents of n and D in the thrust and power factors
+    dimensionalExponents = np.array([[2, 4], [3, 5]])
+
+    def _declare_options(self):
+        self.options.declare('advance_ratio_degree', types = int, default = 4, desc = 'Degree of the coefficient polynomials in advance ratio')
+        self.options.declare('pitch_ratio_degree', types = int, default = 2, desc = 'Degree of the coefficient polynomials in pitch ratio')
+        self.options.declare('air_density', default = 1.225, desc = 'Air density (kg/m^3) of the coefficient definitions')
+        self.options.declare('eval_rmse', types = bool, default = False, desc = 'Also return the root mean squared error of the prediction')
+
+    def similarity(self, x):
+
+        # Advance ratio, pitch ratio and the dimensional factors rho n^a D^b of thrust and power
+        diameter, pitch, rpm, velocity = np.atleast_2d(x).T
+        revolutions = np.maximum(rpm, 1.) / 60
+        diameterMeters = diameter * 0.0254
+        advanceRatio = velocity / (revolutions * diameterMeters)
+        thrustFactor = self.options['air_density'] * revolutions**2 * diameterMeters**4
+        factor = np.column_stack([thrustFactor, thrustFactor * revolutions * diameterMeters])
+        return advanceRatio, pitch / diameter, factor
+
+    def basis(self, advanceRatio, pitchRatio):
+
+        # Polynomial terms and their derivatives with respect to advance ratio and pitch ratio,
+        # (point, term); both ratios are normalized to [-1, 1] over the training range
+        u = (np.clip(advanceRatio, *self.advanceRatioRange) - np.mean(self.advanceRatioRange)) / (np.ptp(self.advanceRatioRange) / 2)
+        v = (np.clip(pitchRatio, *self.pitchRatioRange) - np.mean(self.pitchRatioRange)) / (np.ptp(self.pitchRatioRange) / 2)
+        logicalAdvance = (advanceRatio >= self.advanceRatioRange[0]) & (advanceRatio <= self.advanceRatioRange[1])
+        logicalPitch = (pitchRatio >= self.pitchRatioRange[0]) & (pitchRatio <= self.pitchRatioRange[1])
+
+        # Vandermonde matrices and their derivatives; the terms are the products of one column of each
+        degreeAdvance = self.options['advance_ratio_degree']
+        degreePitch = self.options['pitch_ratio_degree']
+        powersU = np.vander(u, degreeAdvance + 1, increasing = True)
+        powersV = np.vander(v, degreePitch + 1, increasing = True)
+        dpowersU = np.zeros_like(powersU)
+        dpowersU[:, 1:] = powersU[:, :-1] * np.arange(1, degreeAdvance + 1)
+        dpowersV = np.zeros_like(powersV)
+        dpowersV[:, 1:] = powersV[:, :-1] * np.arange(1, degreePitch + 1)
+
+        nPoints = u.size
+        values = (powersU[:, :, np.newaxis] * powersV[:, np.newaxis, :]).reshape(nPoints, -1)
+        dvalues_dadvance = (dpowersU[:, :, np.newaxis] * powersV[:, np.newaxis, :]).reshape(nPoints, -1) * (logicalAdvance / (np.ptp(self.advanceRatioRange) / 2))[:, np.newaxis]
+        dvalues_dpitch = (powersU[:, :, np.newaxis] * dpowersV[:, np.newaxis, :]).reshape(nPoints, -1) * (logicalPitch / (np.ptp(self.pitchRatioRange) / 2))[:, np.newaxis]
+        return values, dvalues_dadvance, dvalues_dpitch
+
+    def train(self, x, y):
+        super().train(x, y)
+        x, y = np.atleast_2d(x, y)
+        if y.shape[1] != 2:
+            raise ValueError('ParametricPropSurrogate is trained on thrust and power together')
+
+        advanceRatio, pitchRatio, factor = self.similarity(x)
+        self.advanceRatioRange = (np.min(advanceRatio), np.max(advanceRatio))
+        self.pitchRatioRange = (np.min(pitchRatio), np.max(pitchRatio))
+
+        values, _, _ = self.basis(advanceRatio, pitchRatio)
+        coefficients = y / factor
+        self.weights = np.linalg.lstsq(values, coefficients, rcond = None)[0]
+        self.coefficientRmse = np.sqrt(np.mean((values.dot(self.weights) - coefficients)**2, axis = 0))
+
+    def vectorized_predict(self, x):
+        advanceRatio, pitchRatio, factor = self.similarity(x)
+        values, _, _ = self.basis(advanceRatio, pitchRatio)
+        y = values.dot(self.weights) * factor
+        if self.options['eval_rmse']:
+            return y, self.coefficientRmse * factor
+        return y
+
+    def vectorized_linearize(self, x):
+
+        # (point, output, input) with inputs diameter, pitch, rpm, velocity
+        diameter, pitch, rpm, velocity = np.atleast_2d(x).T
+        advanceRatio, pitchRatio, factor = self.similarity(x)
+        values, dvalues_dadvance, dvalues_dpitch = self.basis(advanceRatio, pitchRatio)
+        coefficient = values.dot(self.weights)
+        dcoefficient_dadvance = dvalues_dadvance.dot(self.weights)
+        dcoefficient_dpitch = dvalues_dpitch.dot(self.weights)
+
+        logicalTurning = rpm > 1.
+        rpmEffective = np.maximum(rpm, 1.)
+        dadvance_ddiameter = -advanceRatio / diameter
+        dadvance_drpm = -advanceRatio / rpmEffective * logicalTurning
+        dadvance_dvelocity = 1 / (rpmEffective / 60 * diameter * 0.0254)
+
+        exponentRevolutions, exponentDiameter = self.dimensionalExponents.T
+        jac = np.empty((x.shape[0], 2, 4))
+        jac[:, :, 0] = factor * (dcoefficient_dadvance * dadvance_ddiameter[:, np.newaxis] - dcoefficient_dpitch * (pitch / diameter**2)[:, np.newaxis] + coefficient * exponentDiameter / diameter[:, np.newaxis])
+        jac[:, :, 1] = factor * dcoefficient_dpitch / diameter[:, np.newaxis]
+        jac[:, :, 2] = factor * (dcoefficient_dadvance * dadvance_drpm[:, np.newaxis] + coefficient * exponentRevolutions * (logicalTurning / rpmEffective)[:, np.newaxis])
+        jac[:, :, 3] = factor * dcoefficient_dadvance * dadvance_dvelocity[:, np.newaxis]
+        return jac
+
+    def predict(self, x):
+        return self.vectorized_predict(np.atleast_2d(x))
+
+    def linearize(self, x):
+        return self.vectorized_linearize(np.atleast_2d(x))[0]
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import openmdao.api as om
+from motorModelOpenmdog import ElectricPropulsion
+from columnarData import loadColumnIndex, loadColumns
+
+# Grid dimensions of a performance map, in this order, and the ElectricPropulsion inputs they set
+# (in the units those inputs are declared with)
+performanceMapInputs = {
+    'throttle': 'esc.throttle',
+    'velocity': 'prop.velocity',
+    'diameter': 'prop.diameter',
+    'pitch': 'prop.pitch',
+    'voltage': 'battery.voltage_supply',
+    'battery_resistance': 'battery.resistance',
+    'kv': 'motor.kv',
+    'idle_current': 'motor.idle_current',
+    'motor_resistance': 'motor.resistance'
+}
+performanceMapOutputs = ['prop.thrust', 'battery.power', 'power_net.current', 'motor.rpm', 'esc.efficiency']
+
+# One problem per chunk size and prop settings, built once in each worker process
+performanceMapProblems = {}
+
+def performanceMapProblem(nn, propOptions):
+
+    key = (nn, tuple(sorted(propOptions.items())))
+    if key not in performanceMapProblems:
+        prob = om.Problem(reports = None)
+        prob.model.add_subsystem('electric_propulsion', ElectricPropulsion(num_nodes = nn, power_balance_solver = True, **propOptions), promotes = ['*'])
+        prob.setup()
+        performanceMapProblems[key] = prob
+    return performanceMapProblems[key]
+
+def evaluatePerformanceMapChunk(dirMap, idxChunk, grids, outputs, idxStart, idxStop, propOptions):
+
+    # Evaluate the flat grid points idxStart:idxStop as the nodes of one vectorized problem and
+    # write them to a chunk file, moved into place only once complete
+    names = list(performanceMapInputs)
+    shape = tuple(len(grids[name]) for name in names)
+    idxGrid = np.unravel_index(np.arange(idxStart, idxStop), shape)
+
+    prob = performanceMapProblem(idxStop - idxStart, propOptions)
+    for name, idxName in zip(names, idxGrid):
+        prob.set_val(performanceMapInputs[name], np.asarray(grids[name], dtype = float)[idxName])
+    prob.set_val('power_net.current', 10.)
+    prob.run_model()
+
+    chunk = {output: prob.get_val(output) for output in outputs}
+    chunk['power_balance_residual'] = sum(prob.get_val(name) for name in ['battery.power', 'esc.power', 'motor.power', 'prop.power'])
+
+    # The criterion PowerBalanceSolver stops on: the residual meets atol or the current is pinned by
+    # a collapsed bracket. Nodes that ran out of iterations are left in the map but flagged.
+    solver = prob.model.electric_propulsion.nonlinear_solver
+    chunk['converged'] = (np.abs(prob.model.electric_propulsion._residuals['power_net.current']) <= solver.options['atol']) | solver._logicalCollapsed
+
+    pathChunk = performanceMapChunkPath(dirMap, idxChunk)
+    pathTemporary = f'{pathChunk}.{os.getpid()}.tmp'
+    with open(pathTemporary, 'wb') as fileChunk:
+        np.savez(fileChunk, **chunk)
+    os.replace(pathTemporary, pathChunk)
+
+    return idxChunk
+
+def performanceMapChunkPath(dirMap, idxChunk):
+
+    return os.path.join(dirMap, 'chunks', f'chunk_{idxChunk:06d}.npz')
+
+def createPerformanceMap(grids, dirMap, outputs = None, chunkSize = 10000, nWorkers = None, propOptions = None):
+
+    # Evaluate ElectricPropulsion over the Cartesian product of the grids (one array per entry of
+    # performanceMapInputs). The points are split into chunks of chunkSize nodes evaluated on a
+    # process pool, each checkpointed to dirMap/chunks, so an interrupted run resumes with the
+    # missing chunks only. The chunks are then streamed into one memory-mapped .npy file per output
+    # with the grid shape, readable with loadPerformanceMap.
+    if outputs is None:
+        outputs = performanceMapOutputs
+    if propOptions is None:
+        propOptions = {}
+
+    names = list(performanceMapInputs)
+    missing = [name for name in names if name not in grids]
+    if missing:
+        raise ValueError(f'Performance map grids missing for {missing}')
+
+    grids = {name: np.atleast_1d(np.asarray(grids[name], dtype = float)).tolist() for name in names}
+    shape = tuple(len(grids[name]) for name in names)
+    nPoints = int(np.prod(shape))
+    nChunks = -(-nPoints // chunkSize)
+    outputs = list(outputs)
+    columns = [output.replace('.', '_') for output in outputs] + ['power_balance_residual', 'converged']
+
+    # A run is only resumed with the settings it was started with
+    settings = {'grids': grids, 'outputs': list(outputs), 'chunkSize': chunkSize, 'propOptions': propOptions}
+    pathSettings = os.path.join(dirMap, 'settings.json')
+    if os.path.exists(pathSettings):
+        with open(pathSettings, 'r') as fileSettings:
+            if json.load(fileSettings) != settings:
+                raise ValueError(f'{dirMap} holds a performance map with different settings')
+    else:
+        os.makedirs(os.path.join(dirMap, 'chunks'), exist_ok = True)
+        with open(pathSettings, 'w') as fileSettings:
+            json.dump(settings, fileSettings, indent = 4)
+
+    idxChunks = [idxChunk for idxChunk in range(nChunks) if not os.path.exists(performanceMapChunkPath(dirMap, idxChunk))]
+    print(f'{nPoints} points in {nChunks} chunks, {nChunks - len(idxChunks)} already evaluated')
+
+    tStart = time.time()
+    if idxChunks:
+        with ProcessPoolExecutor(max_workers = nWorkers) as executor:
+            futures = [executor.submit(evaluatePerformanceMapChunk, dirMap, idxChunk, grids, outputs, idxChunk*chunkSize, min((idxChunk + 1)*chunkSize, nPoints), propOptions) for idxChunk in idxChunks]
+            for idxFuture, future in enumerate(as_completed(futures)):
+                future.result()
+                if (idxFuture + 1) % max(len(futures) // 20, 1) == 0 or idxFuture + 1 == len(futures):
+                    print(f'Chunk ({idxFuture + 1}/{len(futures)}), {time.time() - tStart:.1f} s')
+
+    # Stream the chunks into the output arrays; the index is written last, so a map without one is
+    # incomplete
+    columnArrays = {column: np.lib.format.open_memmap(os.path.join(dirMap, f'{column}.npy'), mode = 'w+', dtype = bool if column == 'converged' else float, shape = (nPoints,)) for column in columns}
+    for idxChunk in range(nChunks):
+        with np.load(performanceMapChunkPath(dirMap, idxChunk)) as chunk:
+            for output, column in zip(outputs + ['power_balance_residual', 'converged'], columns):
+                columnArrays[column][idxChunk*chunkSize:(idxChunk + 1)*chunkSize] = chunk[output]
+    for columnArray in columnArrays.values():
+        columnArray.flush()
+    del columnArrays
+
+    index = {'columns': columns, 'outputs': list(outputs), 'names': names, 'shape': list(shape), 'grids': grids}
+    pathIndex = os.path.join(dirMap, 'index.json')
+    pathTemporary = f'{pathIndex}.{os.getpid()}.tmp'
+    with open(pathTemporary, 'w') as fileIndex:
+        json.dump(index, fileIndex, indent = 4)
+    os.replace(pathTemporary, pathIndex)
+
+    print(f'Performance map written to {dirMap} in {time.time() - tStart:.1f} s')
+
+    return loadPerformanceMap(dirMap)
+
+def loadPerformanceMap(dirMap, mmap = True):
+
+    # Grids and memory-mapped output arrays shaped like the grid, e.g. thrust[throttle, velocity, ...]
+    index = loadColumnIndex(dirMap)
+    performanceMap = {column: values.reshape(index['shape']) for column, values in loadColumns(dirMap, mmap).items()}
+    performanceMap['grids'] = {name: np.array(grid) for name, grid in index['grids'].items()}
+    return performanceMap
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description = 'Evaluate ElectricPropulsion over a Cartesian grid of operating points and designs')
+    parser.add_argument('pathGrids', help = 'JSON file with one list of values per grid dimension: ' + ', '.join(performanceMapInputs))
+    parser.add_argument('dirMap', help = 'output directory; an interrupted run in it is resumed')
+    parser.add_argument('--workers', type = int, default = None, help = 'number of worker processes (default: number of CPUs)')
+    parser.add_argument('--chunk-size', type = int, default = 10000, help = 'points evaluated together as the nodes of one problem')
+    parser.add_argument('--prop-surrogate', default = 'compiled', choices = ['kriging', 'compiled', 'sparse'], help = 'prop surrogate type')
+    parser.add_argument('--prop-fidelity', default = 'full', choices = ['full', 'parametric', 'corrected'], help = 'prop model fidelity')
+    args = parser.parse_args()
+
+    with open(args.pathGrids, 'r') as fileGrids:
+        grids = json.load(fileGrids)
+
+    createPerformanceMap(grids, args.dirMap, chunkSize = args.chunk_size, nWorkers = args.workers, propOptions = {'prop_surrogate_type': args.prop_surrogate, 'prop_fidelity': args.prop_fidelity})
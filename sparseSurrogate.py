@@ -0,0 +1,145 @@
+import os
+import numpy as np
+import scipy.linalg as linalg
+from scipy.optimize import minimize
+from compiledSurrogate import CompiledKrigingSurrogate, saveCompiledSurrogate, loadCompiledSurrogate
+from surrogateCache import dirSurrogateCache, surrogateCacheKey
+from instrumentation import ProfiledSection
+
+def farthestPointSample(X, nPoints):
+
+    # Greedy maximin design: start from the point closest to the centre of the (normalized) data and
+    # repeatedly add the point farthest from all points chosen so far; O(n * nPoints)
+    idxPoints = [int(np.argmin(np.sum(X**2, axis = 1)))]
+    distanceSquared = np.sum((X - X[idxPoints[0]])**2, axis = 1)
+    for _ in range(nPoints - 1):
+        idxPoint = int(np.argmax(distanceSquared))
+        idxPoints.append(idxPoint)
+        distanceSquared = np.minimum(distanceSquared, np.sum((X - X[idxPoint])**2, axis = 1))
+
+    return np.array(idxPoints)
+
+def gaussianCorrelation(XA, XB, thetas):
+
+    XA = XA * np.sqrt(thetas)
+    XB = XB * np.sqrt(thetas)
+    distanceSquared = np.sum(XA**2, axis = 1)[:, np.newaxis] + np.sum(XB**2, axis = 1) - 2 * XA.dot(XB.T)
+    return np.exp(-np.maximum(distanceSquared, 0))
+
+class SparseKrigingSurrogate(CompiledKrigingSurrogate):
+
+    # Low-rank (subset of regressors / DTC) Kriging through m inducing points picked by farthest point
+    # sampling of the training inputs. Training is O(n m^2) and streams the training points in chunks,
+    # so memory is O(m^2 + chunk_size m) however many points there are; hyperparameters are fit on a
+    # random subset of hyperparameter_points. A trained model is a set of m weights, so evaluation
+    # (inherited from CompiledKrigingSurrogate) costs O(m) per point, independent of n.
+    def _declare_options(self):
+        super()._declare_options()
+
+        self.options.declare('num_inducing', types = int, default = 256, desc = 'Number of inducing points m')
+        self.options.declare('hyperparameter_points', types = int, default = 2000, desc = 'Training points used to fit the correlation and noise hyperparameters')
+        self.options.declare('chunk_size', types = int, default = 10000, desc = 'Training points processed at once when assembling the weights')
+        self.options.declare('jitter', default = 1e-8, desc = 'Diagonal added to the inducing point correlation matrix')
+        self.options.declare('cache_dir', types = str, default = dirSurrogateCache, allow_none = True, desc = 'Directory of the content-addressed cache of trained surrogates, None to disable')
+        self.options.declare('refresh', types = bool, default = False, desc = 'Retrain and overwrite the cache entry even if one exists')
+
+    def cachePath(self, x, y):
+        settings = {name: self.options[name] for name in ['num_inducing', 'hyperparameter_points', 'jitter']}
+        settings['surrogate'] = type(self).__name__
+        return os.path.join(self.options['cache_dir'], surrogateCacheKey(x, y, settings) + '.npz')
+
+    def train(self, x, y):
+        x, y = np.atleast_2d(x, y)
+
+        pathCache = None
+        if self.options['cache_dir'] is not None:
+            pathCache = self.cachePath(x, y)
+            if os.path.exists(pathCache) and not self.options['refresh']:
+                with ProfiledSection('surrogate', f'{type(self).__name__}.load'):
+                    self.setEvaluationData(**loadCompiledSurrogate(pathCache, self.options['eval_rmse']))
+                os.utime(pathCache)
+                return
+
+        with ProfiledSection('surrogate', f'{type(self).__name__}.train'):
+            self._fit(x, y, pathCache)
+
+    def _fit(self, x, y, pathCache):
+        nPoints, nDims = x.shape
+
+        X_mean = np.mean(x, axis = 0)
+        X_std = np.std(x, axis = 0)
+        Y_mean = np.mean(y, axis = 0)
+        Y_std = np.std(y, axis = 0)
+        X_std[X_std == 0.] = 1.
+        Y_std[Y_std == 0.] = 1.
+
+        X = (x - X_mean) / X_std
+        Y = (y - Y_mean) / Y_std
+
+        Z = X[farthestPointSample(X, min(self.options['num_inducing'], nPoints))]
+
+        nFit = min(nPoints, self.options['hyperparameter_points'])
+        idxFit = np.sort(np.random.default_rng(0).choice(nPoints, nFit, replace = False))
+
+        # The hyperparameter subset is assembled in one chunk: the likelihood is flat enough that the
+        # rounding of a chunked sum changes the optimizer's path, and the trained model would depend
+        # on chunk_size
+        def negativeLogLikelihood(parameters):
+            return self._fitWeights(X[idxFit], Y[idxFit], Z, np.exp(parameters[:nDims]), np.exp(parameters[nDims]), nFit)['negativeLogLikelihood']
+
+        bounds = [(np.log(1e-5), np.log(1e5)) for _ in range(nDims)] + [(np.log(1e-8), np.log(1.))]
+        optResult = minimize(negativeLogLikelihood, np.append(np.log(1e-1) * np.ones(nDims), np.log(1e-4)), method = 'L-BFGS-B', bounds = bounds)
+
+        thetas = np.exp(optResult.x[:nDims])
+        noise = np.exp(optResult.x[nDims])
+        weights = self._fitWeights(X, Y, Z, thetas, noise, self.options['chunk_size'])
+
+        evaluationData = {
+            'X': Z,
+            'X_mean': X_mean,
+            'X_std': X_std,
+            'Y_mean': Y_mean,
+            'Y_std': Y_std,
+            'thetas': thetas,
+            'alpha': weights['alpha'],
+            'sigma2': weights['sigma2'] * np.square(Y_std),
+            'inverse_correlation': weights['inverseCorrelation']
+        }
+        self.setEvaluationData(**evaluationData)
+
+        if pathCache is not None:
+            saveCompiledSurrogate(pathCache, evaluationData)
+
+    def _fitWeights(self, X, Y, Z, thetas, noise, chunkSize):
+
+        # With K_mm = L L^T and V = L^-1 K_mn, the low-rank covariance is Q = V^T V and
+        # B = noise I + V V^T is only m x m. Accumulate V V^T and V Y chunk by chunk.
+        nPoints = X.shape[0]
+        nInducing = Z.shape[0]
+
+        L = linalg.cholesky(gaussianCorrelation(Z, Z, thetas) + self.options['jitter'] * np.eye(nInducing), lower = True)
+
+        VVt = np.zeros((nInducing, nInducing))
+        VY = np.zeros((nInducing, Y.shape[1]))
+        for idxStart in range(0, nPoints, chunkSize):
+            V = linalg.solve_triangular(L, gaussianCorrelation(Z, X[idxStart:idxStart + chunkSize], thetas), lower = True)
+            VVt += V.dot(V.T)
+            VY += V.dot(Y[idxStart:idxStart + chunkSize])
+
+        LB = linalg.cholesky(noise * np.eye(nInducing) + VVt, lower = True)
+        c = linalg.solve_triangular(LB, VY, lower = True)
+
+        # Concentrated likelihood of Y under Q + noise I (Woodbury / matrix determinant lemma)
+        quadratic = (np.sum(Y**2, axis = 0) - np.sum(c**2, axis = 0)) / noise
+        logDeterminant = (nPoints - nInducing) * np.log(noise) + 2 * np.sum(np.log(np.diag(LB)))
+        sigma2 = np.maximum(quadratic, 1e-300) / nPoints
+        negativeLogLikelihood = np.log(np.sum(sigma2)) + logDeterminant / nPoints
+
+        # Predictive mean weights alpha = L^-T B^-1 V Y, and the matrix giving the DTC variance
+        # 1 - k (K_mm^-1 - noise (L B L^T)^-1) k^T
+        alpha = linalg.solve_triangular(L.T, linalg.solve_triangular(LB.T, c, lower = False), lower = False)
+        LInverse = linalg.solve_triangular(L, np.eye(nInducing), lower = True)
+        LBInverseLInverse = linalg.solve_triangular(LB, LInverse, lower = True)
+        inverseCorrelation = LInverse.T.dot(LInverse) - noise * LBInverseLInverse.T.dot(LBInverseLInverse)
+
+        return {'alpha': alpha, 'sigma2': sigma2, 'inverseCorrelation': inverseCorrelation, 'negativeLogLikelihood': negativeLogLikelihood}
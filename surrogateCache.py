@@ -0,0 +1,135 @@
+import os
+import time
+import shutil
+from hashlib import sha256
+import numpy as np
+import openmdao.api as om
+from instrumentation import ProfiledSection
+
+dirSurrogateCache = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'surrogate_models', 'cache')
+
+def surrogateCacheKey(x, y, settings):
+
+    # Hash of everything that determines the trained surrogate: the training arrays exactly as
+    # MetaModelUnStructuredComp hands them to train() and the surrogate settings
+    x = np.ascontiguousarray(np.atleast_2d(x), dtype = float)
+    y = np.ascontiguousarray(np.atleast_2d(y), dtype = float)
+
+    cacheHash = sha256()
+    for array in [x, y]:
+        cacheHash.update(str(array.shape).encode())
+        cacheHash.update(array.tobytes())
+    for name in sorted(settings):
+        value = settings[name]
+        cacheHash.update(name.encode())
+        if isinstance(value, np.ndarray):
+            cacheHash.update(np.ascontiguousarray(value, dtype = float).tobytes())
+        else:
+            cacheHash.update(repr(value).encode())
+
+    return cacheHash.hexdigest()
+
+def evictSurrogateCache(dirCache = dirSurrogateCache, maxBytes = None, maxAge = None, keep = (), maxTemporaryAge = 3600.):
+
+    # Files are grouped by cache key, the part of the name before the first dot, so a trained
+    # surrogate is evicted together with its compiled export, while adaptive selection sidecars and
+    # evaluation cache pickles are entries of their own. Files are touched on every hit, so the newest
+    # modification time in a group is its last use. Remove groups unused for longer than maxAge
+    # seconds, then the least recently used ones until the cache fits in maxBytes. Temporary files
+    # are left by interrupted writes once older than maxTemporaryAge seconds and are removed too;
+    # younger ones may belong to a write in progress
+    if not os.path.isdir(dirCache):
+        return []
+
+    now = time.time()
+    groups = {}
+    evicted = []
+    for name in os.listdir(dirCache):
+        path = os.path.join(dirCache, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if not os.path.isfile(path):
+            continue
+
+        if name.endswith('.tmp'):
+            if now - stat.st_mtime > maxTemporaryAge:
+                try:
+                    os.remove(path)
+                    evicted.append(path)
+                except FileNotFoundError:
+                    pass
+            continue
+
+        group = groups.setdefault(name.split('.')[0], {'mtime': 0., 'size': 0, 'paths': []})
+        group['mtime'] = max(group['mtime'], stat.st_mtime)
+        group['size'] += stat.st_size
+        group['paths'].append(path)
+
+    keep = {os.path.abspath(path) for path in keep}
+    entries = sorted(groups.values(), key = lambda group: group['mtime'])
+    totalBytes = sum(group['size'] for group in entries)
+    for group in entries:
+        expired = maxAge is not None and now - group['mtime'] > maxAge
+        oversize = maxBytes is not None and totalBytes > maxBytes
+        if not (expired or oversize) or any(os.path.abspath(path) in keep for path in group['paths']):
+            continue
+        for path in group['paths']:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            evicted.append(path)
+        totalBytes -= group['size']
+
+    return evicted
+
+class CachedKrigingSurrogate(om.KrigingSurrogate):
+
+    def _declare_options(self):
+        super()._declare_options()
+
+        self.options.declare('cache_dir', types = str, default = dirSurrogateCache, desc = 'Directory of the content-addressed cache of trained surrogates')
+        self.options.declare('seed_cache', types = str, default = None, desc = 'Existing KrigingSurrogate training_cache file used instead of training when it was trained on the same data')
+        self.options.declare('refresh', types = bool, default = False, desc = 'Retrain and overwrite the cache entry even if one exists')
+        self.options.declare('max_cache_bytes', default = None, desc = 'Evict least recently used entries until the cache directory is below this size')
+        self.options.declare('max_cache_age', default = None, desc = 'Evict entries that have not been used for this many seconds')
+
+    def cachePath(self, x, y):
+        settings = {name: self.options[name] for name in ['nugget', 'lapack_driver', 'eval_rmse']}
+        return os.path.join(self.options['cache_dir'], surrogateCacheKey(x, y, settings) + '.npz')
+
+    def train(self, x, y, **kwargs):
+        x, y = np.atleast_2d(x, y)
+        pathCache = self.cachePath(x, y)
+
+        if os.path.exists(pathCache) and not self.options['refresh']:
+            # Hit: KrigingSurrogate loads the weights instead of training
+            self.options['training_cache'] = pathCache
+            with ProfiledSection('surrogate', f'{type(self).__name__}.load'):
+                super().train(x, y, **kwargs)
+            os.utime(pathCache)
+
+        else:
+            # Miss: train into a private file and move it into place, so concurrent processes
+            # never see a partially written entry
+            os.makedirs(self.options['cache_dir'], exist_ok = True)
+            pathTraining = f'{pathCache}.{os.getpid()}.tmp'
+            seedCache = self.options['seed_cache']
+            if seedCache is not None and os.path.exists(seedCache):
+                shutil.copyfile(seedCache, pathTraining)
+
+            self.options['training_cache'] = pathTraining
+            try:
+                with ProfiledSection('surrogate', f'{type(self).__name__}.train'):
+                    super().train(x, y, **kwargs)
+                os.replace(pathTraining, pathCache)
+            finally:
+                if os.path.exists(pathTraining):
+                    os.remove(pathTraining)
+
+        self.options['training_cache'] = None
+
+        if self.options['max_cache_bytes'] is not None or self.options['max_cache_age'] is not None:
+            evictSurrogateCache(self.options['cache_dir'], self.options['max_cache_bytes'], self.options['max_cache_age'], keep = [pathCache])
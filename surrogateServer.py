@@ -0,0 +1,408 @@
+import os
+import sys
+import time
+import stat
+import getpass
+import argparse
+import secrets
+import tempfile
+import threading
+import traceback
+from hashlib import sha256
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+import numpy as np
+import openmdao.api as om
+from motorModelOpenmdog import ElectricPropulsion, loadPropSurrogates, dirPropModel, propInputNames, propOutputNames
+from createMotorSurrogateModels import loadMotorSurrogate, surrogateInputNames, surrogateOutputNames
+from performanceMap import performanceMapInputs, performanceMapOutputs
+from operatingPoint import limitThrottle
+
+# Per-user directory of the default socket and generated authentication keys
+if os.environ.get('XDG_RUNTIME_DIR'):
+    dirRuntime = os.path.join(os.environ['XDG_RUNTIME_DIR'], 'surrogateServer')
+else:
+    dirRuntime = os.path.join(tempfile.gettempdir(), f'surrogateServer-{os.getuid() if hasattr(os, "getuid") else getpass.getuser()}')
+
+# Unix socket where available, otherwise a localhost port
+if sys.platform == 'win32':
+    defaultAddress = ('localhost', 47610)
+else:
+    defaultAddress = os.path.join(dirRuntime, 'surrogateServer.sock')
+
+# ElectricPropulsion prop options of the server, overridable per request
+defaultPropOptions = {
+    'prop_model_dir': dirPropModel,
+    'prop_surrogate_type': 'compiled',
+    'prop_eval_rmse': False,
+    'prop_shared_hyperparameters': True,
+    'prop_fidelity': 'full'
+}
+
+def parseAddress(address):
+
+    # 'host:port' for a TCP socket, anything else is a Unix socket path
+    if isinstance(address, str) and ':' in address and os.path.sep not in address:
+        host, port = address.rsplit(':', 1)
+        return (host, int(port))
+    return address
+
+def privateRuntimeDirectory():
+
+    # Created with mode 0700 before anything is placed in it. An existing directory must belong to
+    # this user and be closed to others, otherwise another user could have planted or could read
+    # the socket and keys
+    os.makedirs(dirRuntime, mode = 0o700, exist_ok = True)
+    status = os.lstat(dirRuntime)
+    if not stat.S_ISDIR(status.st_mode) or (hasattr(os, 'getuid') and status.st_uid != os.getuid()) or status.st_mode & 0o077:
+        raise RuntimeError(f'{dirRuntime} must be a directory owned by the current user with mode 0700')
+    return dirRuntime
+
+def authkeyPath(address):
+
+    # File in the runtime directory holding the generated key of the server on an address
+    return os.path.join(dirRuntime, f'authkey-{sha256(repr(parseAddress(address)).encode()).hexdigest()[:16]}')
+
+def readAuthkey(address):
+    privateRuntimeDirectory()
+    with open(authkeyPath(address), 'rb') as fileAuthkey:
+        return fileAuthkey.read()
+
+def paddedNodes(nPoints):
+
+    # Operating point problems are set up for power of two node counts, so a handful of problems
+    # serve every request size; requests are padded by repeating their last point
+    return 1 << max(int(nPoints) - 1, 0).bit_length()
+
+class SurrogateServer(object):
+
+    # Long-running process that keeps the prop and motor surrogates and set-up ElectricPropulsion
+    # problems in memory and answers requests over a multiprocessing.connection socket, so queries
+    # cost milliseconds instead of the seconds of imports, data loading and problem setup. Every
+    # connection is served by its own thread; requests on one connection are answered in order.
+    # A request is {'method': name, 'arguments': {...}} and the response {'status': 'ok', 'result':
+    # ...} or {'status': 'error', 'error': message, 'traceback': text}. Operating point problems are
+    # kept in a pool per (node count, prop options) and each is used by one thread at a time, with
+    # every input reset on each request; the surrogates are shared. Messages are pickled in both
+    # directions, so every connection is authenticated: a TCP address requires an authkey, and on a
+    # Unix socket without one a random key is generated and written to authkeyPath(address) in the
+    # private runtime directory for clients on the same account to read.
+    def __init__(self, address = defaultAddress, authkey = None, propOptions = None, motors = (), preloadNodes = (1,)):
+        self.address = parseAddress(address)
+        if authkey is None and not isinstance(self.address, str):
+            raise ValueError('A TCP address requires an authkey')
+        self.generatedAuthkey = authkey is None
+        self.authkey = secrets.token_bytes(32) if authkey is None else authkey
+        self.propOptions = dict(defaultPropOptions, **(propOptions or {}))
+
+        self.motorSurrogates = {}
+        self.motorSurrogatesLock = threading.RLock()
+        self.problemPool = {}
+        self.problemPoolLock = threading.Lock()
+        self.statisticsLock = threading.Lock()
+        self.requestStatistics = {}
+        self.tStart = time.time()
+        self.stopping = threading.Event()
+        self.listener = None
+
+        self.methods = {
+            'ping': self.ping,
+            'statistics': self.statistics,
+            'motors': self.motors,
+            'predictProp': self.predictProp,
+            'predictMotor': self.predictMotor,
+            'operatingPoints': self.operatingPoints,
+            'shutdown': self.shutdown
+        }
+
+        # Pay the setup cost before the first request
+        self.propSurrogate()
+        for motor in motors:
+            self.motorSurrogate(motor)
+        for nn in preloadNodes:
+            self.releaseProblem(self.acquireProblem(paddedNodes(nn), self.propOptions), self.propOptions)
+
+    def propSurrogate(self, propOptions = None):
+        options = dict(self.propOptions, **(propOptions or {}))
+        propSurrogates = loadPropSurrogates(options['prop_model_dir'], options['prop_surrogate_type'], options['prop_eval_rmse'], options['prop_shared_hyperparameters'], options['prop_fidelity'])
+        return propSurrogates[propOutputNames[0]].multiOutputSurrogate
+
+    def motorSurrogate(self, motor):
+        with self.motorSurrogatesLock:
+            if motor not in self.motorSurrogates:
+                self.motorSurrogates[motor] = loadMotorSurrogate(motor)
+            return self.motorSurrogates[motor]
+
+    def acquireProblem(self, nn, propOptions):
+        # An idle problem and the initial values of its inputs, set up if there is none
+        key = (nn, tuple(sorted(propOptions.items())))
+        with self.problemPoolLock:
+            idleProblems = self.problemPool.setdefault(key, [])
+            if idleProblems:
+                return idleProblems.pop()
+
+        prob = om.Problem(reports = None)
+        prob.model.add_subsystem('electric_propulsion', ElectricPropulsion(num_nodes = nn, power_balance_solver = True, **propOptions), promotes = ['*'])
+        prob.setup()
+        prob.final_setup()
+        return prob, {name: prob.get_val(path).copy() for name, path in performanceMapInputs.items()}
+
+    def releaseProblem(self, problem, propOptions):
+        key = (problem[0].model.electric_propulsion.options['num_nodes'], tuple(sorted(propOptions.items())))
+        with self.problemPoolLock:
+            self.problemPool[key].append(problem)
+
+    @staticmethod
+    def queryPoints(x, nInputs):
+        x = np.atleast_2d(np.asarray(x, dtype = float))
+        if x.ndim != 2 or x.shape[1] != nInputs:
+            raise ValueError(f'Query points must be an array of shape (n, {nInputs}), got {x.shape}')
+        return x
+
+    @staticmethod
+    def surrogateResult(multiOutputSurrogate, outputs, x, linearize):
+        prediction = multiOutputSurrogate.predict(x)
+        result = {}
+        for output in outputs:
+            y, rmse = prediction[output]
+            result[output] = y[:, 0].copy()
+            if rmse is not None:
+                result[f'{output}_rmse'] = rmse[:, 0].copy()
+        if linearize:
+            jacobian = multiOutputSurrogate.linearize(x)
+            result['jacobian'] = np.concatenate([jacobian[output] for output in outputs], axis = 1)
+        return result
+
+    def ping(self):
+        return {'pid': os.getpid(), 'uptime': time.time() - self.tStart}
+
+    def statistics(self):
+        with self.statisticsLock:
+            return {method: dict(entry) for method, entry in self.requestStatistics.items()}
+
+    def motors(self):
+        with self.motorSurrogatesLock:
+            return sorted(self.motorSurrogates)
+
+    def predictProp(self, x, linearize = False, propOptions = None):
+        # Thrust (N) and power (W) at points (diameter, pitch, rpm, velocity); the jacobian is
+        # (point, output, input)
+        return self.surrogateResult(self.propSurrogate(propOptions), propOutputNames, self.queryPoints(x, len(propInputNames)), linearize)
+
+    def predictMotor(self, motor, x, linearize = False):
+        # Thrust (N) and inputPower (W) of a motor's surrogate at points (propDiameter, propPitch,
+        # throttle, velocity)
+        return self.surrogateResult(self.motorSurrogate(motor), surrogateOutputNames, self.queryPoints(x, len(surrogateInputNames)), linearize)
+
+    def operatingPoints(self, inputs, limit = None, outputs = None, propOptions = None):
+        # Converged ElectricPropulsion operating points. inputs maps the performance map input names
+        # (throttle, velocity, diameter, pitch, voltage, battery_resistance, kv, idle_current,
+        # motor_resistance) to values broadcast to a common node count, in the units of the
+        # ElectricPropulsion inputs. limit = (quantity, value, units) finds the throttle that holds
+        # power, current or thrust at value with limitThrottle (throttle is then ignored).
+        unknown = set(inputs) - set(performanceMapInputs)
+        if unknown:
+            raise ValueError(f'Unknown operating point inputs {sorted(unknown)}')
+        if outputs is None:
+            outputs = performanceMapOutputs
+        propOptions = dict(self.propOptions, **(propOptions or {}))
+
+        values = np.broadcast_arrays(*[np.atleast_1d(np.asarray(value, dtype = float)) for value in inputs.values()])
+        nPoints = values[0].size
+        nn = paddedNodes(nPoints)
+        idxPoints = np.minimum(np.arange(nn), nPoints - 1)
+
+        problem = self.acquireProblem(nn, propOptions)
+        prob, defaultInputs = problem
+        try:
+            for name, value in defaultInputs.items():
+                prob.set_val(performanceMapInputs[name], value)
+            for name, value in zip(inputs, values):
+                prob.set_val(performanceMapInputs[name], value.ravel()[idxPoints])
+            prob.set_val('power_net.current', 10.)
+            if limit is None:
+                prob.run_model()
+            else:
+                quantity, limitValue, units = limit
+                limitThrottle(prob, quantity, np.broadcast_to(limitValue, (nPoints,))[idxPoints], units = units)
+            result = {output: prob.get_val(output)[:nPoints].copy() for output in outputs}
+            result['esc.throttle'] = prob.get_val('esc.throttle')[:nPoints].copy()
+        finally:
+            self.releaseProblem(problem, propOptions)
+
+        return result
+
+    def shutdown(self):
+        self.stopping.set()
+        return True
+
+    def handleRequest(self, request):
+        tStart = time.perf_counter()
+        method = request.get('method')
+        try:
+            if method not in self.methods:
+                raise ValueError(f'Unknown method {method}')
+            response = {'status': 'ok', 'result': self.methods[method](**request.get('arguments', {}))}
+        except Exception as error:
+            response = {'status': 'error', 'error': f'{type(error).__name__}: {error}', 'traceback': traceback.format_exc()}
+
+        with self.statisticsLock:
+            entry = self.requestStatistics.setdefault(str(method), {'count': 0, 'errors': 0, 'time': 0.})
+            entry['count'] += 1
+            entry['errors'] += response['status'] == 'error'
+            entry['time'] += time.perf_counter() - tStart
+        return response
+
+    def handleConnection(self, connection):
+        with connection:
+            while not self.stopping.is_set():
+                try:
+                    request = connection.recv()
+                except (EOFError, OSError):
+                    break
+                connection.send(self.handleRequest(request))
+
+        # A shutdown request wakes the accept loop
+        if self.stopping.is_set():
+            self.wakeListener()
+
+    def wakeListener(self):
+        try:
+            Client(self.address, authkey = self.authkey).close()
+        except OSError:
+            pass
+
+    def removeStaleSocket(self):
+        # A socket file left by a server that is no longer running would block the listener
+        if not isinstance(self.address, str) or not os.path.exists(self.address):
+            return
+        try:
+            Client(self.address, authkey = self.authkey).close()
+        except AuthenticationError:
+            # A live server with a different key answered the handshake
+            pass
+        except OSError:
+            os.remove(self.address)
+            return
+        raise RuntimeError(f'A server is already listening on {self.address}')
+
+    def writeAuthkey(self):
+        # Written to a private file and moved into place, so a client never reads a partial key
+        pathAuthkey = authkeyPath(self.address)
+        pathTemporary = f'{pathAuthkey}.{os.getpid()}.tmp'
+        fileDescriptor = os.open(pathTemporary, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fileDescriptor, 'wb') as fileAuthkey:
+            fileAuthkey.write(self.authkey)
+        os.replace(pathTemporary, pathAuthkey)
+        return pathAuthkey
+
+    def serve(self):
+        # Accept connections until a shutdown request. The socket is created with mode 0600 by
+        # binding under a restrictive umask, so it is never reachable by other users
+        if self.address == defaultAddress or self.generatedAuthkey:
+            privateRuntimeDirectory()
+        self.removeStaleSocket()
+        pathAuthkey = self.writeAuthkey() if self.generatedAuthkey else None
+
+        try:
+            umask = os.umask(0o177)
+            try:
+                self.listener = Listener(self.address, backlog = 64, authkey = self.authkey)
+            finally:
+                os.umask(umask)
+
+            with self.listener:
+                while not self.stopping.is_set():
+                    try:
+                        connection = self.listener.accept()
+                    except (OSError, AuthenticationError):
+                        continue
+                    threading.Thread(target = self.handleConnection, args = (connection,), daemon = True).start()
+        finally:
+            if pathAuthkey is not None and os.path.exists(pathAuthkey):
+                os.remove(pathAuthkey)
+
+class SurrogateClient(object):
+
+    # Connection to a SurrogateServer; one request at a time per client, so threads that want
+    # concurrent requests each open their own. Errors raised by the server are raised here as
+    # RuntimeError with the server traceback. Without an authkey the key generated by a server on a
+    # Unix socket is read from the runtime directory.
+    def __init__(self, address = defaultAddress, authkey = None, timeout = 0.):
+        address = parseAddress(address)
+        if authkey is None and not isinstance(address, str):
+            raise ValueError('A TCP address requires an authkey')
+        tStop = time.time() + timeout
+        while True:
+            try:
+                self.connection = Client(address, authkey = readAuthkey(address) if authkey is None else authkey)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.time() >= tStop:
+                    raise
+                time.sleep(0.05)
+        self.lock = threading.Lock()
+
+    def request(self, method, **arguments):
+        with self.lock:
+            self.connection.send({'method': method, 'arguments': arguments})
+            response = self.connection.recv()
+        if response['status'] != 'ok':
+            raise RuntimeError(f'{response["error"]}\n\nServer traceback:\n{response["traceback"]}')
+        return response['result']
+
+    def ping(self):
+        return self.request('ping')
+
+    def statistics(self):
+        return self.request('statistics')
+
+    def motors(self):
+        return self.request('motors')
+
+    def predictProp(self, diameter, pitch, rpm, velocity, linearize = False, propOptions = None):
+        x = np.column_stack(np.broadcast_arrays(*[np.atleast_1d(np.asarray(value, dtype = float)) for value in [diameter, pitch, rpm, velocity]]))
+        return self.request('predictProp', x = x, linearize = linearize, propOptions = propOptions)
+
+    def predictMotor(self, motor, propDiameter, propPitch, throttle, velocity, linearize = False):
+        x = np.column_stack(np.broadcast_arrays(*[np.atleast_1d(np.asarray(value, dtype = float)) for value in [propDiameter, propPitch, throttle, velocity]]))
+        return self.request('predictMotor', motor = motor, x = x, linearize = linearize)
+
+    def operatingPoints(self, limit = None, outputs = None, propOptions = None, **inputs):
+        return self.request('operatingPoints', inputs = inputs, limit = limit, outputs = outputs, propOptions = propOptions)
+
+    def shutdown(self):
+        return self.request('shutdown')
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description = 'Serve prop and motor surrogate evaluations and ElectricPropulsion operating points over a local socket')
+    parser.add_argument('--address', default = defaultAddress, help = 'Unix socket path or host:port (default: %(default)s)')
+    parser.add_argument('--authkey', default = os.environ.get('SURROGATE_SERVER_AUTHKEY'), help = 'connection authentication key (default: $SURROGATE_SERVER_AUTHKEY); required for host:port, generated and written to the runtime directory for a Unix socket if not given')
+    parser.add_argument('--prop-model-dir', default = dirPropModel, help = 'prop model directory')
+    parser.add_argument('--prop-surrogate', default = 'compiled', choices = ['kriging', 'compiled', 'sparse'], help = 'prop surrogate type')
+    parser.add_argument('--prop-fidelity', default = 'full', choices = ['full', 'parametric', 'corrected'], help = 'prop model fidelity')
+    parser.add_argument('--motors', nargs = '+', default = [], help = 'motor surrogates loaded at startup (others are loaded on first request)')
+    parser.add_argument('--preload-nodes', type = int, nargs = '+', default = [1], help = 'operating point problem sizes set up at startup')
+    args = parser.parse_args()
+
+    authkey = None if args.authkey is None else args.authkey.encode()
+    if authkey is None and not isinstance(parseAddress(args.address), str):
+        parser.error('a host:port address requires --authkey or $SURROGATE_SERVER_AUTHKEY')
+    propOptions = {'prop_model_dir': args.prop_model_dir, 'prop_surrogate_type': args.prop_surrogate, 'prop_fidelity': args.prop_fidelity}
+    tStart = time.time()
+    server = SurrogateServer(args.address, authkey, propOptions, args.motors, args.preload_nodes)
+    print(f'Surrogate server ready on {server.address} in {time.time() - tStart:.1f} s')
+    if server.generatedAuthkey:
+        print(f'Generated authkey in {authkeyPath(server.address)}')
+    server.serve()
@@ -0,0 +1,137 @@
+import os
+import argparse
+import numpy as np
+from columnarData import saveSurrogateModelData, saveColumns
+from motorModelOpenmdog import ElectronicSpeedController
+
+# Synthetic stand-ins for the APC prop model and the MotoCalc export, so the surrogates and
+# propulsion models can be trained and timed without the external data. The prop follows
+# thrust and power coefficient curves against advance ratio J = V / (n D) with the shape of
+# typical APC data: C_T and C_P fall roughly linearly with J and scale with pitch / diameter, and
+# C_T reaches zero (windmilling) at J slightly above pitch / diameter.
+airDensity = 1.225
+
+def propCoefficients(diameter, pitch, rpm, velocity):
+
+    # Thrust and power coefficients of the synthetic prop; diameter and pitch in inch
+    pitchRatio = pitch / diameter
+    advanceRatio = velocity / (np.maximum(rpm, 1.) / 60 * diameter * 0.0254)
+    advanceRatioZero = 1.05 * pitchRatio + 0.1
+
+    thrustCoefficient = 0.11 * np.sqrt(pitchRatio) * (1 - advanceRatio / advanceRatioZero) * (1 + 0.1 * advanceRatio / advanceRatioZero)
+    powerCoefficient = (0.02 + 0.06 * pitchRatio**1.5) * (1 - 0.55 * (advanceRatio / advanceRatioZero)**2)
+    return thrustCoefficient, powerCoefficient
+
+def propPerformance(diameter, pitch, rpm, velocity):
+
+    # Thrust (N) and prop power (W, negative: absorbed from the shaft, as in Propeller)
+    thrustCoefficient, powerCoefficient = propCoefficients(diameter, pitch, rpm, velocity)
+    revolutions = rpm / 60
+    diameterMeters = diameter * 0.0254
+    thrust = thrustCoefficient * airDensity * revolutions**2 * diameterMeters**4
+    power = -powerCoefficient * airDensity * revolutions**3 * diameterMeters**5
+    return thrust, power
+
+def syntheticPropData(nPoints, seed = 0, noise = 0.):
+
+    # Scattered prop table in the layout of the APC prop model's surrogate_model_data; noise is a
+    # relative standard deviation added to thrust and power
+    rng = np.random.default_rng(seed)
+    diameter = rng.uniform(8, 24, nPoints)
+    pitch = diameter * rng.uniform(0.3, 0.8, nPoints)
+    rpm = rng.uniform(1000, 12000, nPoints) * 10 / diameter
+    velocity = rng.uniform(0, 1, nPoints) * 0.9 * (1.05 * pitch / diameter + 0.1) * rpm / 60 * diameter * 0.0254
+
+    thrust, power = propPerformance(diameter, pitch, rpm, velocity)
+    thrust *= 1 + noise * rng.standard_normal(nPoints)
+    power *= 1 + noise * rng.standard_normal(nPoints)
+    return {'diameter': diameter, 'pitch': pitch, 'rpm': rpm, 'velocity': velocity, 'thrust': thrust, 'power': power}
+
+def createSyntheticPropModel(dirModel, nPoints, seed = 0, noise = 0.):
+
+    # A prop model directory usable as prop_model_dir of Propeller and ElectricPropulsion
+    saveSurrogateModelData(dirModel, syntheticPropData(nPoints, seed, noise))
+    return dirModel
+
+def motorOperatingPoints(kv, resistance, idleCurrent, voltage, throttle, diameter, pitch, velocity, batteryResistance = 0.012, maxiter = 60):
+
+    # Battery current, motor rpm, thrust and battery power of a motor with the synthetic prop, with
+    # the ESC model of ElectronicSpeedController; the motor current is bisected between idle and
+    # stall, where the shaft power (I - I_0) V_prop meets the prop power
+    escOptions = ElectronicSpeedController().options
+    efficiency = escOptions['a'] * (1 - 1 / (1 + escOptions['b'] * throttle**escOptions['c']))
+
+    def residual(motorCurrent):
+        batteryCurrent = motorCurrent * throttle
+        motorVoltage = (voltage - batteryCurrent * batteryResistance) * throttle * efficiency
+        propVoltage = motorVoltage - motorCurrent * resistance
+        rpm = kv * propVoltage
+        _, propPower = propPerformance(diameter, pitch, rpm, velocity)
+        return (motorCurrent - idleCurrent) * propVoltage + propPower, rpm, batteryCurrent
+
+    currentLower = idleCurrent * np.ones(np.broadcast(kv, throttle, velocity, diameter).shape)
+    currentUpper = voltage * throttle * efficiency / (batteryResistance * throttle**2 * efficiency + resistance) * np.ones_like(currentLower)
+    currentUpper = np.maximum(currentUpper, currentLower)
+    currentUpper = idleCurrent + 0.5 * (currentUpper - idleCurrent)
+    for _ in range(maxiter):
+        current = 0.5 * (currentLower + currentUpper)
+        logicalPositive = residual(current)[0] > 0
+        currentUpper = np.where(logicalPositive, current, currentUpper)
+        currentLower = np.where(logicalPositive, currentLower, current)
+
+    _, rpm, batteryCurrent = residual(0.5 * (currentLower + currentUpper))
+    thrust, _ = propPerformance(diameter, pitch, rpm, velocity)
+    return {'current': batteryCurrent, 'rpm': rpm, 'thrust': thrust, 'inputPower': batteryCurrent * voltage}
+
+def syntheticMotoCalcData(dirDatabase, nMotors, props = ((10, 5), (12, 6), (14, 7), (16, 8)), throttles = (0.25, 0.5, 0.75, 1.), nVelocities = 15, voltage = 22.2, seed = 0):
+
+    # Converted MotoCalc database (as written by convertMotoCalcData and read by
+    # openMotoCalcDatabase) of nMotors random motors, each with a performance table over props,
+    # throttles and velocities up to the windmilling speed of the prop at full throttle
+    rng = np.random.default_rng(seed)
+    kv = rng.uniform(150, 600, nMotors)
+    resistance = 4. / kv * rng.uniform(0.5, 1.5, nMotors)
+    idleCurrent = rng.uniform(0.4, 2.5, nMotors)
+    mass = 6. / np.sqrt(kv) * rng.uniform(0.8, 1.2, nMotors)
+
+    motors = [f'Synthetic {idxMotor:05d}' for idxMotor in range(nMotors)]
+    motorPerformanceDataHeaders = ['propDiameter', 'propPitch', 'throttle', 'velocity', 'thrust', 'inputPower', 'current', 'rpm']
+    rows = []
+    for idxMotor in range(nMotors):
+        idxProp, throttle, fraction = [grid.ravel() for grid in np.meshgrid(np.arange(len(props)), throttles, np.linspace(0, 1, nVelocities), indexing = 'ij')]
+        diameter, pitch = np.asarray(props, dtype = float)[idxProp].T
+        velocity = fraction * 0.8 * (1.05 * pitch / diameter + 0.1) * kv[idxMotor] * voltage / 60 * diameter * 0.0254
+        point = motorOperatingPoints(kv[idxMotor], resistance[idxMotor], idleCurrent[idxMotor], voltage, throttle, diameter, pitch, velocity)
+        rows.append(np.column_stack([diameter, pitch, throttle, velocity, point['thrust'], point['inputPower'], point['current'], point['rpm']]))
+
+    nRows = np.array([motorRows.shape[0] for motorRows in rows])
+    rowStop = np.cumsum(nRows)
+    motorPerformanceData = np.concatenate(rows, axis = 0)
+
+    columns = {'motorData': np.column_stack([kv, resistance, idleCurrent, mass])}
+    for idxHeader, header in enumerate(motorPerformanceDataHeaders):
+        columns[header] = motorPerformanceData[:, idxHeader]
+
+    index = {
+        'motors': motors,
+        'motorDataHeaders': ['kv', 'resistance', 'idleCurrent', 'mass'],
+        'motorPerformanceDataHeaders': motorPerformanceDataHeaders,
+        'rows': {motor: [int(stop - n), int(stop)] for motor, stop, n in zip(motors, rowStop, nRows)}
+    }
+    saveColumns(dirDatabase, columns, index)
+    return dirDatabase
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description = 'Write a synthetic prop model and MotoCalc database for offline training and benchmarks')
+    parser.add_argument('dirOutput', help = 'output directory; prop_model/ and motoCalcData/ are written in it')
+    parser.add_argument('--prop-points', type = int, default = 2000, help = 'number of prop table points')
+    parser.add_argument('--motors', type = int, default = 20, help = 'number of motors')
+    parser.add_argument('--velocities', type = int, default = 15, help = 'velocities per prop and throttle in each motor table')
+    parser.add_argument('--noise', type = float, default = 0., help = 'relative noise on prop thrust and power')
+    parser.add_argument('--seed', type = int, default = 0, help = 'random seed')
+    args = parser.parse_args()
+
+    createSyntheticPropModel(os.path.join(args.dirOutput, 'prop_model'), args.prop_points, args.seed, args.noise)
+    syntheticMotoCalcData(os.path.join(args.dirOutput, 'motoCalcData'), args.motors, nVelocities = args.velocities, seed = args.seed)
+    print(f'Synthetic prop model and MotoCalc database written to {args.dirOutput}')
@@ -0,0 +1,14 @@
+import os
+import sys
+import pytest
+
+# The modules live at the top of the repository, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('OPENMDAO_REPORTS', '0')
+
+from syntheticData import createSyntheticPropModel
+
+@pytest.fixture(scope = 'session')
+def syntheticPropModel(tmp_path_factory):
+    # Small synthetic prop model; with fidelity 'parametric' nothing is written to the surrogate cache
+    return createSyntheticPropModel(str(tmp_path_factory.mktemp('prop_model')), 400)
@@ -0,0 +1,37 @@
+import numpy as np
+import openmdao.api as om
+from adaptiveSampling import selectTrainingPoints
+
+def responseTable(nPoints = 400, seed = 0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(-1, 1, (nPoints, 2))
+    y = np.column_stack([np.sin(2 * x[:, 0]) * np.cos(x[:, 1]), x[:, 0]**2 + 0.5 * x[:, 1]])
+    return x, y
+
+def heldOutRmsError(x, y, idxSelected):
+    surrogate = om.KrigingSurrogate(lapack_driver = 'gesdd')
+    surrogate.train(x[idxSelected], y[idxSelected])
+    idxHeldOut = np.setdiff1d(np.arange(x.shape[0]), idxSelected)
+    return np.sqrt(np.mean(((surrogate.predict(x[idxHeldOut]) - y[idxHeldOut]) / np.std(y, axis = 0))**2, axis = 0))
+
+def test_tolerance_stops_selection():
+    x, y = responseTable()
+    idxSelected, history = selectTrainingPoints(x, y, nInitial = 10, maxPoints = 200, tolerance = 1e-3, nAdd = 5)
+    assert idxSelected.size < 200 and idxSelected.size == history[-1]['nPoints']
+    assert np.all(np.array(history[-1]['rmsError']) <= 1e-3)
+    assert all(np.any(np.array(entry['rmsError']) > 1e-3) for entry in history[:-1])
+    assert np.unique(idxSelected).size == idxSelected.size
+
+def test_max_points_caps_selection():
+    x, y = responseTable()
+    idxSelected, history = selectTrainingPoints(x, y, nInitial = 10, maxPoints = 42, tolerance = 0., nAdd = 5)
+    assert idxSelected.size == 42
+    assert [entry['nPoints'] for entry in history] == [10, 15, 20, 25, 30, 35, 40, 42]
+
+def test_reported_error_is_the_dense_kriging_held_out_error():
+    x, y = responseTable()
+    idxSelected, history = selectTrainingPoints(x, y, nInitial = 10, maxPoints = 200, tolerance = 1e-3, nAdd = 5)
+    # Trained on the sorted selection, so the hyperparameter fit may differ in the last digits
+    rmsError = heldOutRmsError(x, y, idxSelected)
+    np.testing.assert_allclose(rmsError, history[-1]['rmsError'], rtol = 1e-2)
+    assert np.all(rmsError <= 1e-3)
@@ -0,0 +1,133 @@
+import os
+import json
+import pickle
+import numpy as np
+import scipy as sc
+from columnarData import saveColumns, loadColumn, loadColumns, loadColumnIndex, columnDirectory, saveSurrogateModelData, loadSurrogateModelData, openMotoCalcDatabase
+
+def legacyLoadMotoCalcData(pathMotoCalcData):
+
+    # The original dictionary loader, kept verbatim as the reference
+    motoCalcDataMatlab = sc.io.loadmat(pathMotoCalcData)
+
+    strVars = ['motors', 'motorDataHeaders', 'motorPerformanceDataHeaders']
+    for var in strVars:
+        motoCalcDataMatlab[var] = [string.strip(' ') for string in motoCalcDataMatlab[var]]
+
+    motoCalcDataMatlab['motorData'] = motoCalcDataMatlab['motorData'].astype(float)
+    motoCalcDataMatlab['motorPerformanceData'] = np.squeeze(motoCalcDataMatlab['motorPerformanceData']).tolist()
+    motoCalcDataMatlab['motorPerformanceData'] = [data.astype(float) for data in motoCalcDataMatlab['motorPerformanceData']]
+
+    motoCalcData = {}
+    for idxMotor, motor in enumerate(motoCalcDataMatlab['motors']):
+        motoCalcData[motor] = {}
+        for idxMotorDataHeader, motorDataHeader in enumerate(motoCalcDataMatlab['motorDataHeaders']):
+            motoCalcData[motor][motorDataHeader] = motoCalcDataMatlab['motorData'][idxMotor, idxMotorDataHeader]
+        motoCalcData[motor]['motorPerformanceData'] = {}
+        for idxMotorPerformanceDataHeader, motorPerformanceDataHeader in enumerate(motoCalcDataMatlab['motorPerformanceDataHeaders']):
+            motoCalcData[motor]['motorPerformanceData'][motorPerformanceDataHeader] = motoCalcDataMatlab['motorPerformanceData'][idxMotor][:, idxMotorPerformanceDataHeader]
+
+    return motoCalcData
+
+def writeMotoCalcExport(pathMotoCalcData, nMotors = 4, seed = 0):
+
+    # Same layout as the MATLAB export: space padded character arrays and a cell array with one
+    # performance table per motor
+    rng = np.random.default_rng(seed)
+    motorPerformanceData = np.empty(nMotors, dtype = object)
+    for idxMotor in range(nMotors):
+        motorPerformanceData[idxMotor] = rng.uniform(0, 100, (rng.integers(5, 40), 4))
+    sc.io.savemat(pathMotoCalcData, {
+        'motors': [f'Motor {idxMotor}'.ljust(12) for idxMotor in range(nMotors)],
+        'motorDataHeaders': ['kv  ', 'mass'],
+        'motorPerformanceDataHeaders': ['propDiameter', 'throttle    ', 'velocity    ', 'thrust      '],
+        'motorData': rng.uniform(100, 500, (nMotors, 2)),
+        'motorPerformanceData': motorPerformanceData
+    })
+
+def test_columns_round_trip(tmp_path):
+    dirColumns = str(tmp_path / 'columns')
+    columns = {'x': np.linspace(0, 1, 7), 'n': np.arange(7, dtype = np.int64), 'flag': np.arange(7) % 2 == 0, 'table': np.arange(14.).reshape(7, 2)}
+    saveColumns(dirColumns, columns, {'source': 'test'})
+
+    index = loadColumnIndex(dirColumns)
+    assert index['source'] == 'test' and index['columns'] == list(columns)
+    for mmap in [True, False]:
+        loaded = loadColumns(dirColumns, mmap)
+        assert list(loaded) == list(columns)
+        for name, column in columns.items():
+            assert loaded[name].dtype == column.dtype
+            np.testing.assert_array_equal(loaded[name], column)
+    assert isinstance(loadColumns(dirColumns)['x'], np.memmap)
+
+def test_columns_overwrite(tmp_path):
+    dirColumns = str(tmp_path / 'columns')
+    saveColumns(dirColumns, {'x': np.zeros(3), 'y': np.ones(3)})
+    saveColumns(dirColumns, {'x': np.arange(5.)})
+    loaded = loadColumns(dirColumns, mmap = False)
+    assert list(loaded) == ['x']
+    np.testing.assert_array_equal(loaded['x'], np.arange(5.))
+
+def test_columns_overwrite_keeps_previous_version(tmp_path):
+    dirColumns = str(tmp_path / 'columns')
+    versions = []
+    for value in range(4):
+        saveColumns(dirColumns, {'x': np.full(3, float(value))})
+        versions.append(loadColumnIndex(dirColumns)['version'])
+
+        # A reader that loaded the index before this save still finds its columns
+        if value > 0:
+            np.testing.assert_array_equal(loadColumn(columnDirectory(dirColumns, {'version': versions[-2]}), 'x'), np.full(3, value - 1.))
+
+    assert sorted(name for name in os.listdir(dirColumns) if name != 'index.json') == versions[-2:]
+
+def test_unversioned_columns_are_replaced(tmp_path):
+    dirColumns = str(tmp_path / 'columns')
+    os.makedirs(dirColumns)
+    np.save(os.path.join(dirColumns, 'x.npy'), np.zeros(3))
+    np.save(os.path.join(dirColumns, 'y.npy'), np.zeros(3))
+    with open(os.path.join(dirColumns, 'index.json'), 'w') as fileIndex:
+        json.dump({'columns': ['x', 'y']}, fileIndex)
+    np.testing.assert_array_equal(loadColumns(dirColumns)['x'], np.zeros(3))
+
+    # The first versioned save converts the directory: no legacy column is left behind, including
+    # one the new index does not name
+    saveColumns(dirColumns, {'x': np.ones(3)})
+    assert not [name for name in os.listdir(dirColumns) if name.endswith('.npy')]
+    assert list(loadColumns(dirColumns)) == ['x']
+    np.testing.assert_array_equal(loadColumns(dirColumns)['x'], np.ones(3))
+
+    saveColumns(dirColumns, {'x': np.full(3, 2.)})
+    np.testing.assert_array_equal(loadColumns(dirColumns)['x'], np.full(3, 2.))
+
+def test_legacy_surrogate_model_pickle_is_converted(tmp_path):
+    dirModel = str(tmp_path)
+    surrogateModelData = {name: np.random.default_rng(0).uniform(size = 20) for name in ['diameter', 'pitch', 'rpm', 'velocity', 'thrust', 'power']}
+    with open(os.path.join(dirModel, 'surrogate_model_data.pickle'), 'wb') as fileSurrogateModelData:
+        pickle.dump(surrogateModelData, fileSurrogateModelData)
+
+    loaded = loadSurrogateModelData(dirModel)
+    assert os.path.exists(os.path.join(dirModel, 'surrogate_model_data', 'index.json'))
+    for name, column in surrogateModelData.items():
+        np.testing.assert_array_equal(loaded[name], column)
+
+    saveSurrogateModelData(dirModel, {name: 2 * column for name, column in surrogateModelData.items()})
+    np.testing.assert_array_equal(loadSurrogateModelData(dirModel)['thrust'], 2 * surrogateModelData['thrust'])
+
+def test_motocalc_conversion_matches_legacy_loader(tmp_path):
+    pathMotoCalcData = str(tmp_path / 'motocalc.mat')
+    writeMotoCalcExport(pathMotoCalcData)
+    legacy = legacyLoadMotoCalcData(pathMotoCalcData)
+    database = openMotoCalcDatabase(pathMotoCalcData)
+
+    assert list(database) == list(legacy)
+    for motor, motorEntry in legacy.items():
+        converted = database[motor]
+        assert set(converted) == set(motorEntry)
+        for header, value in motorEntry.items():
+            if header == 'motorPerformanceData':
+                assert list(converted[header]) == list(value)
+                for name, column in value.items():
+                    np.testing.assert_array_equal(converted[header][name], column)
+            else:
+                assert converted[header] == value
@@ -0,0 +1,57 @@
+import os
+import numpy as np
+import openmdao.api as om
+import surrogateCache
+import motorModelOpenmdog
+from motorModelOpenmdog import loadPropSurrogates
+from compiledSurrogate import compileKrigingSurrogate, CompiledKrigingSurrogate
+from columnarData import loadSurrogateModelData, saveSurrogateModelData
+from syntheticData import createSyntheticPropModel, syntheticPropData
+
+def test_compiled_surrogate_matches_kriging(tmp_path):
+    data = syntheticPropData(60, seed = 1)
+    x = np.column_stack([data[name] for name in ['diameter', 'pitch', 'rpm', 'velocity']])
+    y = np.column_stack([data['thrust'], data['power']])
+
+    surrogate = om.KrigingSurrogate(eval_rmse = True, lapack_driver = 'gesdd')
+    surrogate.train(x, y)
+    pathCompiled = str(tmp_path / 'prop.compiled.npz')
+    compileKrigingSurrogate(surrogate, pathCompiled)
+    compiledSurrogate = CompiledKrigingSurrogate(path = pathCompiled, eval_rmse = True)
+
+    queryData = syntheticPropData(20, seed = 2)
+    xQuery = np.column_stack([queryData[name] for name in ['diameter', 'pitch', 'rpm', 'velocity']])
+    prediction, rmse = compiledSurrogate.vectorized_predict(xQuery)
+    jac = compiledSurrogate.vectorized_linearize(xQuery)
+
+    # The RMSE is 1 - r^T R^-1 r, which cancels near the training points, so it is compared against
+    # the largest RMSE rather than point by point
+    rmseScale = rmse.max()
+    for idxPoint, point in enumerate(xQuery):
+        predictionPoint, rmsePoint = surrogate.predict(point)
+        np.testing.assert_allclose(prediction[idxPoint], predictionPoint[0], rtol = 1e-8, atol = 1e-8 * np.abs(y).max())
+        np.testing.assert_allclose(rmse[idxPoint], rmsePoint[0], rtol = 0, atol = 1e-5 * rmseScale)
+        np.testing.assert_allclose(jac[idxPoint], surrogate.linearize(point), rtol = 1e-8, atol = 1e-10 * np.abs(jac).max())
+
+def test_changed_training_data_recompiles(tmp_path, monkeypatch):
+    # The compiled files are named after the training data, so changed data is exported to a new
+    # file instead of serving the surrogate compiled from the old data
+    dirModel = createSyntheticPropModel(str(tmp_path / 'prop_model'), 40)
+    dirCache = tmp_path / 'cache'
+    monkeypatch.setattr(surrogateCache, 'dirSurrogateCache', str(dirCache))
+    xQuery = np.array([[12., 6., 5000., 5.], [16., 10., 4000., 10.]])
+
+    monkeypatch.setattr(motorModelOpenmdog, 'propSurrogateRegistry', {})
+    thrust = loadPropSurrogates(dirModel, 'compiled', False)['thrust'].multiOutputSurrogate.predict(xQuery)['thrust'][0]
+    pathsCompiled = {name for name in os.listdir(dirCache) if name.endswith('.compiled.npz')}
+    assert len(pathsCompiled) == 1
+
+    surrogateModelData = {name: np.array(column) for name, column in loadSurrogateModelData(dirModel, mmap = False).items()}
+    surrogateModelData['thrust'] = 2 * surrogateModelData['thrust']
+    saveSurrogateModelData(dirModel, surrogateModelData)
+
+    monkeypatch.setattr(motorModelOpenmdog, 'propSurrogateRegistry', {})
+    thrustRetrained = loadPropSurrogates(dirModel, 'compiled', False)['thrust'].multiOutputSurrogate.predict(xQuery)['thrust'][0]
+    pathsRecompiled = {name for name in os.listdir(dirCache) if name.endswith('.compiled.npz')}
+    assert len(pathsRecompiled) == 2 and pathsCompiled < pathsRecompiled
+    np.testing.assert_allclose(thrustRetrained, 2 * thrust, rtol = 1e-6)
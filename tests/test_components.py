@@ -0,0 +1,54 @@
+import numpy as np
+import openmdao.api as om
+import pytest
+from openmdao.utils.assert_utils import assert_check_partials
+from motorModelOpenmdog import Battery, ElectronicSpeedController, Motor, PowerNet, PowerBalance, RubberMotor
+
+# Component class and the range of every input the operating points are drawn from
+components = {
+    'battery': (Battery, {'voltage_supply': (10., 30.), 'current': (0., 50.), 'resistance': (0.005, 0.05)}),
+    'esc': (ElectronicSpeedController, {'voltage_in': (10., 30.), 'current_in': (1., 50.), 'throttle': (0.1, 1.)}),
+    'motor': (Motor, {'voltage_in': (10., 30.), 'current': (1., 50.), 'resistance': (0.005, 0.05), 'kv': (100., 1000.), 'idle_current': (0.5, 2.)}),
+    'power_net': (PowerNet, {'power_batt': (100., 500.), 'power_esc': (-50., 0.), 'power_motor': (-100., 0.), 'power_prop': (-400., 0.), 'current': (1., 50.)}),
+    'power_balance': (PowerBalance, {'power_batt': (100., 500.), 'power_esc': (-50., 0.), 'power_motor': (-100., 0.), 'power_prop': (-400., 0.)}),
+    'rubber_motor': (RubberMotor, {'kv': (200., 1000.), 'mass': (0.1, 1.)})
+}
+
+def componentProblem(name, nn, values):
+    # values holds one array of nn values per input (and, for PowerNet, its output)
+    prob = om.Problem(reports = None)
+    prob.model.add_subsystem(name, components[name][0](num_nodes = nn))
+    prob.setup(force_alloc_complex = True)
+    for variable, value in values.items():
+        prob.set_val(f'{name}.{variable}', value)
+    prob.run_model()
+    # run_model leaves the residuals of an implicit component without a solver unevaluated
+    prob.model.run_apply_nonlinear()
+    return prob
+
+def results(prob):
+    # Outputs and residuals by variable name; the residual is the only result of the implicit PowerNet
+    return {variable: (meta['val'], meta['resids']) for variable, meta in prob.model.list_outputs(residuals = True, prom_name = False, out_stream = None)}
+
+@pytest.mark.parametrize('name', list(components))
+def test_vectorized_matches_scalar_runs(name):
+    nn = 5
+    rng = np.random.default_rng(0)
+    values = {variable: rng.uniform(lower, upper, nn) for variable, (lower, upper) in components[name][1].items()}
+
+    resultsVectorized = results(componentProblem(name, nn, values))
+    for node in range(nn):
+        resultsNode = results(componentProblem(name, 1, {variable: value[node] for variable, value in values.items()}))
+        assert set(resultsNode) == set(resultsVectorized)
+        for variable, (output, residual) in resultsNode.items():
+            np.testing.assert_allclose(resultsVectorized[variable][0][node], output[0], rtol = 1e-14)
+            np.testing.assert_allclose(resultsVectorized[variable][1][node], residual[0], rtol = 1e-14)
+
+@pytest.mark.parametrize('name', list(components))
+def test_diagonal_partials(name):
+    # Complex step differentiates the full jacobian, so a coupling between nodes that the diagonal
+    # rows and cols declarations do not include would show up as an error
+    nn = 4
+    rng = np.random.default_rng(1)
+    prob = componentProblem(name, nn, {variable: rng.uniform(lower, upper, nn) for variable, (lower, upper) in components[name][1].items()})
+    assert_check_partials(prob.check_partials(method = 'cs', out_stream = None), atol = 1e-10, rtol = 1e-10)
@@ -0,0 +1,91 @@
+import numpy as np
+import openmdao.api as om
+from motorModelOpenmdog import ElectricPropulsion
+from columnarData import saveSurrogateModelData
+from continuation import OperatingPointResidual, sweepOperatingPoints
+
+design = {'battery.voltage_supply': 22.2, 'battery.resistance': 0.012, 'motor.kv': 400., 'motor.resistance': 0.015, 'motor.idle_current': 1., 'prop.diameter': 12., 'prop.pitch': 6.}
+
+def propulsionProblem(dirModel, throttle, powerBalanceSolver = False):
+    prob = om.Problem(reports = None)
+    prob.model.add_subsystem('electric_propulsion', ElectricPropulsion(num_nodes = np.size(throttle), power_balance_solver = powerBalanceSolver, prop_model_dir = dirModel, prop_fidelity = 'parametric'), promotes = ['*'])
+    prob.setup()
+    for name, value in design.items():
+        prob.set_val(name, value)
+    prob.set_val('esc.throttle', throttle)
+    prob.set_val('prop.velocity', 0.)
+    prob.set_val('power_net.current', 10.)
+    return prob
+
+def createFoldingPropModel(dirModel, nPoints = 300, seed = 0):
+
+    # A prop whose power coefficient rises with the fourth power of the advance ratio, so the power
+    # it absorbs grows like V^4 / n at high speed. The power balance then has two operating points
+    # at moderate speed that merge at a turning point near 43 m/s, past which there is none.
+    rng = np.random.default_rng(seed)
+    diameter = rng.uniform(10, 14, nPoints)
+    pitch = diameter * rng.uniform(0.4, 0.6, nPoints)
+    rpm = rng.uniform(500, 12000, nPoints)
+    advanceRatio = rng.uniform(0, 10, nPoints)
+    revolutions = rpm / 60
+    diameterMeters = diameter * 0.0254
+    velocity = advanceRatio * revolutions * diameterMeters
+    thrust = (0.1 - 0.08 * advanceRatio) * 1.225 * revolutions**2 * diameterMeters**4
+    power = -(0.03 + 0.3 * advanceRatio**4) * 1.225 * revolutions**3 * diameterMeters**5
+    saveSurrogateModelData(dirModel, {'diameter': diameter, 'pitch': pitch, 'rpm': rpm, 'velocity': velocity, 'thrust': thrust, 'power': power})
+    return dirModel
+
+def test_natural_sweep_matches_cold_solves(syntheticPropModel):
+    throttle = np.array([0.5, 0.8, 1.])
+    velocity = np.linspace(0., 20., 9)
+    prob = propulsionProblem(syntheticPropModel, throttle)
+    sweep = sweepOperatingPoints(prob, 'velocity', velocity, atol = 1e-9, record = ('prop.thrust',))
+    assert np.all(sweep['converged'])
+    np.testing.assert_array_equal(sweep['parameter'], np.repeat(velocity[:, np.newaxis], throttle.size, axis = 1))
+
+    # The sweep runs on its own copy of the group
+    np.testing.assert_array_equal(prob.get_val('prop.velocity'), 0.)
+
+    probCold = propulsionProblem(syntheticPropModel, throttle, powerBalanceSolver = True)
+    for idxVelocity, value in enumerate(velocity):
+        probCold.set_val('prop.velocity', value)
+        probCold.set_val('power_net.current', 10.)
+        probCold.run_model()
+        np.testing.assert_allclose(sweep['current'][idxVelocity], probCold.get_val('power_net.current'), rtol = 1e-8)
+        np.testing.assert_allclose(sweep['prop.thrust'][idxVelocity], probCold.get_val('prop.thrust'), rtol = 1e-8)
+
+def test_warm_start_cuts_iterations(syntheticPropModel):
+    # thrustCurve.py used to reset the current to 10 A before every velocity
+    velocity = np.linspace(0., 20., 11)
+    prob = propulsionProblem(syntheticPropModel, 1.)
+    warm = sweepOperatingPoints(prob, 'velocity', velocity)
+    cold = [sweepOperatingPoints(prob, 'velocity', [value], current = 10.) for value in velocity]
+    assert np.all(warm['converged']) and all(np.all(sweep['converged']) for sweep in cold)
+
+    iterationsWarm = warm['iterations'][1:]
+    iterationsCold = np.array([sweep['iterations'][0] for sweep in cold])[1:]
+    assert np.all(iterationsWarm <= iterationsCold)
+    assert iterationsWarm.sum() <= 0.7 * iterationsCold.sum()
+
+def test_arclength_sweep_passes_turning_point(tmp_path):
+    dirModel = createFoldingPropModel(str(tmp_path / 'folding_prop'))
+    prob = propulsionProblem(dirModel, 1.)
+    prob.set_val('power_net.current', 40.)
+    sweep = sweepOperatingPoints(prob, 'velocity', np.linspace(30., 60., 16), method = 'arclength')
+    assert np.all(sweep['converged'])
+
+    # Up to the turning point on the low current branch, then back down on the high current one
+    # until the branch leaves the sweep below its start
+    velocity = sweep['parameter'][:, 0]
+    current = sweep['current'][:, 0]
+    idxTurn = np.argmax(velocity)
+    assert 0 < idxTurn < velocity.size - 1 and velocity[idxTurn] < 50.
+    assert np.all(np.diff(velocity[:idxTurn + 1]) > 0) and np.all(np.diff(velocity[idxTurn:]) < 0)
+    assert velocity[-1] < 30.
+    assert np.all(np.diff(current) > 0)
+
+    # Every step is an operating point, and the two branches differ at the same velocity
+    residualFunction = OperatingPointResidual(prob, 'velocity')
+    for velocityStep, currentStep in zip(velocity, current):
+        assert abs(residualFunction(np.array([currentStep]), np.array([velocityStep]))[0]) <= 1e-6
+    assert np.interp(40., velocity[idxTurn:][::-1], current[idxTurn:][::-1]) > 2 * np.interp(40., velocity[:idxTurn + 1], current[:idxTurn + 1])
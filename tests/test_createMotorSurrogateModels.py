@@ -0,0 +1,25 @@
+import os
+import json
+import createMotorSurrogateModels
+
+def crashingTrainMotorModel(motoCalcDataMotor, motor, *args):
+    # Kills the worker like a segfault or the OOM killer would, breaking the pool
+    if motor == 'crash':
+        os._exit(1)
+    return {'motor': motor, 'status': 'trained', 'time': 0.0, 'error': None}
+
+def test_failed_workers_are_recorded(tmp_path, monkeypatch):
+    monkeypatch.setattr(createMotorSurrogateModels, 'isMotorModelCached', lambda *args: False)
+    monkeypatch.setattr(createMotorSurrogateModels, 'trainMotorModel', crashingTrainMotorModel)
+    pathSummary = str(tmp_path / 'summary.json')
+
+    # One motor whose data cannot be sent to a worker, one that kills its worker
+    motoCalcData = {'unpicklable': {'motorPerformanceData': lambda: None}, 'crash': {}, 'other': {}}
+    summaryData = createMotorSurrogateModels.trainMotorModels(motoCalcData, nWorkers = 1, pathSummary = pathSummary)
+
+    statuses = {result['motor']: result['status'] for result in summaryData['motors']}
+    assert list(statuses) == list(motoCalcData)
+    assert statuses['unpicklable'] == statuses['crash'] == 'failed'
+    assert sum(summaryData['counts'].values()) == len(motoCalcData)
+    with open(pathSummary, 'r') as fileSummary:
+        assert json.load(fileSummary) == summaryData
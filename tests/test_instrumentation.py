@@ -0,0 +1,68 @@
+import csv
+import json
+import pytest
+import openmdao.api as om
+from openmdao.solvers.solver import NonlinearSolver
+import instrumentation
+from instrumentation import Profiler, ProfiledSection
+from motorModelOpenmdog import ElectricPropulsion
+
+def solverMethods():
+    return {(cls, name): cls.__dict__[name] for cls, name, _ in [(NonlinearSolver, '_solve', None)] + Profiler.linearMethods}
+
+def test_solver_patches_are_restored():
+    original = solverMethods()
+    with Profiler():
+        assert instrumentation.activeProfiler is not None
+        patched = solverMethods()
+        assert all(patched[method] is not original[method] for method in original)
+    assert solverMethods() == original
+    assert instrumentation.activeProfiler is None
+
+    # Also when the profiled block raises, and a new profiler can start afterwards
+    with pytest.raises(ValueError):
+        with Profiler():
+            raise ValueError('raised inside the profiled block')
+    assert solverMethods() == original
+    assert instrumentation.activeProfiler is None
+    with Profiler(solvers = False):
+        assert solverMethods() == original
+    assert instrumentation.activeProfiler is None
+
+def test_sections_and_solves_are_exported(syntheticPropModel, tmp_path):
+    prob = om.Problem(reports = None)
+    prob.model.add_subsystem('electric_propulsion', ElectricPropulsion(num_nodes = 3, power_balance_solver = True, prop_model_dir = syntheticPropModel, prop_fidelity = 'parametric'), promotes = ['*'])
+    prob.setup()
+    for name, value in {'battery.voltage_supply': 22.2, 'battery.resistance': 0.012, 'motor.kv': 400., 'motor.resistance': 0.015, 'motor.idle_current': 1., 'prop.diameter': 12., 'prop.pitch': 6., 'esc.throttle': 1., 'prop.velocity': [0., 5., 10.], 'power_net.current': 10.}.items():
+        prob.set_val(name, value)
+
+    with Profiler() as profiler:
+        for _ in range(2):
+            with ProfiledSection('test', 'section'):
+                prob.run_model()
+    # Nothing is recorded once the profiler has stopped
+    with ProfiledSection('test', 'section'):
+        prob.run_model()
+
+    pathJson = str(tmp_path / 'profile.json')
+    pathCsv = str(tmp_path / 'profile.csv')
+    profiler.saveJson(pathJson)
+    profiler.saveCsv(pathCsv)
+
+    with open(pathJson) as fileProfile:
+        profile = json.load(fileProfile)
+    with open(pathCsv, newline = '') as fileProfile:
+        rows = {(row['category'], row['name']): row for row in csv.DictReader(fileProfile)}
+    calls = {(row['category'], row['name']): row for row in profile['calls']}
+    assert set(calls) == set(rows)
+
+    section = calls['test', 'section']
+    assert section['count'] == 2 and 0 < section['time'] <= profile['wallTime']
+    assert int(rows['test', 'section']['count']) == 2 and float(rows['test', 'section']['time']) == pytest.approx(section['time'])
+
+    battery = calls['component', 'Battery.compute']
+    solve = calls['nonlinear_solver', 'NL: PowerBalance electric_propulsion']
+    assert solve['count'] == 2 and solve['iterations'] > 0
+    assert battery['count'] >= solve['iterations']
+    assert [entry['system'] for entry in profile['solves']] == ['electric_propulsion'] * 2
+    assert sum(entry['iterations'] for entry in profile['solves']) == solve['iterations']
@@ -0,0 +1,38 @@
+import numpy as np
+import openmdao.api as om
+import pytest
+from openmdao.utils.assert_utils import assert_check_partials
+from missionAnalysis import BatteryCapacity, cumulativeTrapezoid, cumulativeTrapezoidPartials
+
+@pytest.mark.parametrize('nn', [1, 2, 5, 40])
+def test_cumulative_trapezoid_partials_match_dense(nn):
+    # Dense reference: integral k sums segment m < k, which depends on nodes m and m + 1
+    rng = np.random.default_rng(nn)
+    time = np.cumsum(rng.uniform(0.5, 2., nn))
+    integrand = rng.uniform(1., 30., nn)
+    segmentTime = np.zeros((max(nn - 1, 0), nn))
+    segmentIntegrand = np.zeros((max(nn - 1, 0), nn))
+    for segment in range(nn - 1):
+        integrandMean = 0.5 * (integrand[segment] + integrand[segment + 1])
+        segmentTime[segment, [segment, segment + 1]] = [-integrandMean, integrandMean]
+        segmentIntegrand[segment, [segment, segment + 1]] = 0.5 * (time[segment + 1] - time[segment])
+    integralTime = np.vstack([np.zeros((1, nn)), np.cumsum(segmentTime, axis = 0)])
+    integralIntegrand = np.vstack([np.zeros((1, nn)), np.cumsum(segmentIntegrand, axis = 0)])
+
+    rows, cols = np.tril_indices(nn)
+    partialTime, partialIntegrand = cumulativeTrapezoidPartials(time, integrand, rows, cols)
+    np.testing.assert_allclose(cumulativeTrapezoid(time, integrand), [np.trapezoid(integrand[:k + 1], time[:k + 1]) for k in range(nn)])
+    np.testing.assert_allclose(partialTime, integralTime[rows, cols])
+    np.testing.assert_allclose(partialIntegrand, integralIntegrand[rows, cols])
+
+def test_battery_capacity_partials():
+    rng = np.random.default_rng(0)
+    prob = om.Problem(reports = None)
+    prob.model.add_subsystem('battery', BatteryCapacity(num_nodes = 6))
+    prob.setup(force_alloc_complex = True)
+    prob.set_val('battery.time', np.cumsum(rng.uniform(1., 5., 6)))
+    prob.set_val('battery.current', rng.uniform(5., 40., 6))
+    prob.set_val('battery.voltage_supply', rng.uniform(20., 25., 6))
+    prob.set_val('battery.resistance', 0.01)
+    prob.run_model()
+    assert_check_partials(prob.check_partials(method = 'cs', out_stream = None), atol = 1e-10, rtol = 1e-10)
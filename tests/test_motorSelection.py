@@ -0,0 +1,15 @@
+import numpy as np
+import pytest
+from motorSelection import motorSelectionBounds
+
+def boundCandidates():
+    # A motor that reaches the thrust and one whose no-load rpm is far too low
+    return {'kv': np.array([800., 50.]), 'resistance': np.array([0.05, 0.05]), 'idle_current': np.array([1., 1.]), 'diameter': np.array([10., 10.]), 'pitch': np.array([5., 5.])}
+
+def test_bounds_use_the_prop_options(syntheticPropModel, tmp_path):
+    propOptions = {'prop_model_dir': syntheticPropModel, 'prop_fidelity': 'parametric'}
+    reason = motorSelectionBounds(boundCandidates(), np.array([0., 10.]), np.array([5., 5.]), 11.1, 0.01, 1000., propOptions = propOptions)
+    assert list(reason) == ['', 'rpm']
+
+    with pytest.raises(FileNotFoundError):
+        motorSelectionBounds(boundCandidates(), np.array([0., 10.]), np.array([5., 5.]), 11.1, 0.01, 1000., propOptions = dict(propOptions, prop_model_dir = str(tmp_path)))
@@ -0,0 +1,52 @@
+import numpy as np
+from multiOutputSurrogate import MultiOutputSurrogate, CorrectedMultiOutputSurrogate
+from parametricSurrogate import ParametricPropSurrogate
+from surrogateCache import CachedKrigingSurrogate
+from columnarData import loadSurrogateModelData
+
+propInputNames = ['diameter', 'pitch', 'rpm', 'velocity']
+propOutputNames = ['thrust', 'power']
+
+def propTrainingData(dirModel, nPoints = 60):
+    surrogateModelData = loadSurrogateModelData(dirModel, mmap = False)
+    x = np.column_stack([surrogateModelData[name][:nPoints] for name in propInputNames])
+    y = {output: surrogateModelData[output][:nPoints] for output in propOutputNames}
+    return x, y
+
+def test_corrected_surrogate_trains_correction_on_residual(syntheticPropModel, tmp_path):
+    x, y = propTrainingData(syntheticPropModel)
+    cacheDir = str(tmp_path)
+
+    corrected = CorrectedMultiOutputSurrogate(MultiOutputSurrogate(propOutputNames, surrogateClass = ParametricPropSurrogate), MultiOutputSurrogate(propOutputNames, cache_dir = cacheDir))
+    corrected.train(x, y)
+
+    # The same composite built from parts trained separately
+    base = MultiOutputSurrogate(propOutputNames, surrogateClass = ParametricPropSurrogate)
+    base.train(x, y)
+    basePrediction = base.predict(x)
+    correction = MultiOutputSurrogate(propOutputNames, cache_dir = cacheDir)
+    correction.train(x, {output: y[output] - basePrediction[output][0][:, 0] for output in propOutputNames})
+    reference = CorrectedMultiOutputSurrogate(base, correction)
+
+    xQuery = x[:5] * 1.01
+    prediction = corrected.predict(xQuery)
+    referencePrediction = reference.predict(xQuery)
+    jacobian = corrected.linearize(xQuery)
+    referenceJacobian = reference.linearize(xQuery)
+    for output in propOutputNames:
+        np.testing.assert_allclose(prediction[output][0], referencePrediction[output][0], rtol = 1e-10)
+        np.testing.assert_allclose(jacobian[output], referenceJacobian[output], rtol = 1e-10)
+
+    # Kriging interpolates the residual, so the composite reproduces the training data
+    prediction = corrected.predict(x)
+    for output in propOutputNames:
+        np.testing.assert_allclose(prediction[output][0][:, 0], y[output], rtol = 1e-6, atol = 1e-6 * np.max(np.abs(y[output])))
+
+def test_corrected_surrogate_views_train_it(syntheticPropModel, tmp_path):
+    x, y = propTrainingData(syntheticPropModel)
+    corrected = CorrectedMultiOutputSurrogate(MultiOutputSurrogate(propOutputNames, surrogateClass = ParametricPropSurrogate), MultiOutputSurrogate(propOutputNames, cache_dir = str(tmp_path)))
+    for output in propOutputNames:
+        corrected.view(output).train(x, y[output][:, np.newaxis])
+
+    assert len(corrected.surrogates) == 2
+    assert all(isinstance(surrogate, CachedKrigingSurrogate) for surrogate, _ in corrected.correction.surrogates)
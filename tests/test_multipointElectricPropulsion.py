@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+import openmdao.api as om
+from openmdao.utils.assert_utils import assert_check_totals
+from motorModelOpenmdog import MultipointElectricPropulsion, ElectricPropulsion
+
+conditions = {
+    'takeoff': {'prop.velocity': [0., 2.], 'esc.throttle': [1., 0.9], 'battery.voltage_supply': 22.2},
+    'cruise': {'prop.velocity': [10., 15.], 'esc.throttle': [0.6, 0.7], 'battery.voltage_supply': 21.}
+}
+design = {'diameter': 12., 'pitch': 6., 'kv': 400.}
+fixedMotor = {'motor_resistance': 0.015, 'idle_current': 1.}
+rubberMotor = {'mass': 0.3}
+
+def conditionInputs(condition):
+    return dict(conditions[condition], **{'battery.resistance': 0.012, 'power_net.current': 10.})
+
+def multipointProblem(propModel, rubber):
+    prob = om.Problem(reports = None)
+    prob.model.add_subsystem('multipoint', MultipointElectricPropulsion(conditions = list(conditions), num_nodes = 2, rubber_motor = rubber, prop_model_dir = propModel, prop_fidelity = 'parametric'), promotes = ['*'])
+    prob.setup()
+    for name, value in dict(design, **(rubberMotor if rubber else fixedMotor)).items():
+        prob.set_val(name, value)
+    for condition in conditions:
+        for name, value in conditionInputs(condition).items():
+            prob.set_val(f'conditions.{condition}.{name}', value)
+    prob.run_model()
+    return prob
+
+@pytest.mark.parametrize('rubber', [False, True])
+def test_totals_match_finite_differences(syntheticPropModel, rubber):
+    prob = multipointProblem(syntheticPropModel, rubber)
+    of = [f'conditions.{condition}.{name}' for condition in conditions for name in ['prop.thrust', 'battery.power', 'power_net.current']]
+    wrt = list(design) + list(rubberMotor if rubber else fixedMotor)
+    assert_check_totals(prob.check_totals(of = of, wrt = wrt, form = 'central', step = 1e-6, step_calc = 'rel', out_stream = None), atol = 1e-6, rtol = 1e-6)
+
+@pytest.mark.parametrize('rubber', [False, True])
+def test_conditions_match_single_point_runs(syntheticPropModel, rubber):
+    prob = multipointProblem(syntheticPropModel, rubber)
+    if rubber:
+        motor = {name: prob.get_val(f'rubber_motor.{output}')[0] for name, output in [('motor.kv', 'kv_out'), ('motor.resistance', 'resistance'), ('motor.idle_current', 'idle_current')]}
+    else:
+        motor = {'motor.kv': design['kv'], 'motor.resistance': fixedMotor['motor_resistance'], 'motor.idle_current': fixedMotor['idle_current']}
+
+    for condition in conditions:
+        probCondition = om.Problem(reports = None)
+        probCondition.model.add_subsystem('electric_propulsion', ElectricPropulsion(num_nodes = 2, power_balance_solver = True, prop_model_dir = syntheticPropModel, prop_fidelity = 'parametric'), promotes = ['*'])
+        probCondition.setup()
+        for name, value in dict(conditionInputs(condition), **motor, **{'prop.diameter': design['diameter'], 'prop.pitch': design['pitch']}).items():
+            probCondition.set_val(name, value)
+        probCondition.run_model()
+
+        for name in ['prop.thrust', 'battery.power', 'power_net.current', 'motor.rpm']:
+            np.testing.assert_allclose(prob.get_val(f'conditions.{condition}.{name}'), probCondition.get_val(name), rtol = 1e-10)
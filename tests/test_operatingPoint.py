@@ -0,0 +1,59 @@
+import numpy as np
+import openmdao.api as om
+from motorModelOpenmdog import ElectricPropulsion
+from operatingPoint import limitThrottle, limitQuantities
+
+velocities = np.array([0., 5., 10.])
+
+def propulsionProblem(propModel, velocity, promoted = True):
+    prob = om.Problem(reports = None)
+    prob.model.add_subsystem('electric_propulsion', ElectricPropulsion(num_nodes = np.size(velocity), power_balance_solver = True, prop_model_dir = propModel, prop_fidelity = 'parametric'), promotes = ['*'] if promoted else None)
+    prob.setup()
+    path = '' if promoted else 'electric_propulsion.'
+    for name, value in {'battery.voltage_supply': 22.2, 'battery.resistance': 0.012, 'motor.kv': 400., 'motor.resistance': 0.015, 'motor.idle_current': 1., 'prop.diameter': 12., 'prop.pitch': 6., 'esc.throttle': 1., 'prop.velocity': velocity, 'power_net.current': 10.}.items():
+        prob.set_val(path + name, value)
+    return prob
+
+def fullThrottle(propModel, quantity):
+    prob = propulsionProblem(propModel, velocities)
+    prob.run_model()
+    return prob.get_val(limitQuantities[quantity]).copy()
+
+def test_node_under_limit_stays_at_full_throttle(syntheticPropModel):
+    power = fullThrottle(syntheticPropModel, 'power')
+    prob = propulsionProblem(syntheticPropModel, velocities)
+
+    result = limitThrottle(prob, 'power', 1.5 * power)
+    np.testing.assert_array_equal(result['throttle'], 1.)
+    assert not np.any(result['limited']) and np.all(result['converged'])
+    assert result['evaluations'] == 1
+    np.testing.assert_allclose(prob.get_val('battery.power'), power, rtol = 1e-10)
+
+def test_nodes_over_limit_converge_to_their_limits(syntheticPropModel):
+    for quantity in ['power', 'current', 'thrust']:
+        limit = np.array([0.5, 0.7, 0.9]) * fullThrottle(syntheticPropModel, quantity)
+        prob = propulsionProblem(syntheticPropModel, velocities)
+
+        rtol = 1e-8
+        result = limitThrottle(prob, quantity, limit, rtol = rtol)
+        assert np.all(result['limited']) and np.all(result['converged'])
+        assert np.all((result['throttle'] > 0.05) & (result['throttle'] < 1.))
+        # The problem is left at the returned operating point
+        np.testing.assert_array_equal(prob.get_val('esc.throttle'), result['throttle'])
+        np.testing.assert_allclose(prob.get_val(limitQuantities[quantity]), limit, rtol = 0, atol = rtol * np.maximum(np.abs(limit), 1.).max())
+
+def test_mixed_nodes_match_scalar_calls(syntheticPropModel):
+    # One node under its limit, two over it: the vectorized call must give every node the throttle
+    # a call on that node alone gives, here through an unpromoted group and a limit in kW
+    power = fullThrottle(syntheticPropModel, 'power')
+    limit = np.array([2., 0.5, 0.7]) * power
+    prob = propulsionProblem(syntheticPropModel, velocities)
+    result = limitThrottle(prob, 'power', limit)
+    np.testing.assert_array_equal(result['limited'], [False, True, True])
+
+    for idxNode, velocity in enumerate(velocities):
+        probNode = propulsionProblem(syntheticPropModel, [velocity], promoted = False)
+        resultNode = limitThrottle(probNode, 'power', limit[idxNode] / 1000., units = 'kW', path = 'electric_propulsion')
+        assert resultNode['limited'][0] == result['limited'][idxNode] and resultNode['converged'][0]
+        np.testing.assert_allclose(resultNode['throttle'][0], result['throttle'][idxNode], rtol = 1e-6)
+        np.testing.assert_allclose(probNode.get_val('electric_propulsion.battery.power'), prob.get_val('battery.power')[idxNode], rtol = 1e-6)
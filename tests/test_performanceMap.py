@@ -0,0 +1,17 @@
+import numpy as np
+from performanceMap import createPerformanceMap, loadPerformanceMap
+
+grids = {'throttle': [0.3, 0.6, 1.], 'velocity': [0., 10., 20.], 'diameter': [12.], 'pitch': [6.], 'voltage': [22.2], 'battery_resistance': [0.012], 'kv': [400.], 'idle_current': [1.], 'motor_resistance': [0.015]}
+
+def test_performance_map_flags_convergence(syntheticPropModel, tmp_path):
+    # Outputs given as a tuple, two chunks of a 9 point grid
+    dirMap = str(tmp_path / 'map')
+    performanceMap = createPerformanceMap(grids, dirMap, outputs = ('prop.thrust', 'battery.power'), chunkSize = 5, nWorkers = 1, propOptions = {'prop_model_dir': syntheticPropModel, 'prop_fidelity': 'parametric'})
+
+    assert performanceMap['prop_thrust'].shape == (3, 3, 1, 1, 1, 1, 1, 1, 1)
+    assert performanceMap['converged'].dtype == bool
+    assert np.all(performanceMap['converged'])
+    np.testing.assert_array_less(np.abs(performanceMap['power_balance_residual']), 1e-6)
+
+    reloaded = loadPerformanceMap(dirMap, mmap = False)
+    np.testing.assert_array_equal(reloaded['battery_power'], performanceMap['battery_power'])
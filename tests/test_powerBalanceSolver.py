@@ -0,0 +1,70 @@
+import numpy as np
+import openmdao.api as om
+import pytest
+from motorModelOpenmdog import ElectricPropulsion
+from evaluationCache import EvaluationCache
+
+design = {'battery.voltage_supply': 22.2, 'battery.resistance': 0.012, 'motor.kv': 400., 'motor.resistance': 0.015, 'motor.idle_current': 1., 'prop.diameter': 12., 'prop.pitch': 6.}
+
+def operatingPoints(dirModel, throttle, velocity, powerBalanceSolver, evaluationCache = None):
+    prob = om.Problem(reports = None)
+    if not powerBalanceSolver:
+        prob.model.nonlinear_solver = om.NewtonSolver(solve_subsystems = True, maxiter = 50, atol = 1e-10, rtol = 1e-12, iprint = -1)
+        prob.model.linear_solver = om.DirectSolver()
+    prob.model.add_subsystem('electric_propulsion', ElectricPropulsion(num_nodes = throttle.size, power_balance_solver = powerBalanceSolver, prop_model_dir = dirModel, prop_fidelity = 'parametric', evaluation_cache = evaluationCache), promotes = ['*'])
+    prob.setup()
+    for name, value in design.items():
+        prob.set_val(name, value)
+    prob.set_val('esc.throttle', throttle)
+    prob.set_val('prop.velocity', velocity)
+    prob.set_val('power_net.current', 10.)
+    prob.run_model()
+    return {name: prob.get_val(name).copy() for name in ['power_net.current', 'prop.thrust', 'motor.rpm', 'battery.power', 'esc.power', 'motor.power', 'prop.power']}
+
+@pytest.mark.parametrize('seed', range(3))
+def test_power_balance_solver_matches_newton(syntheticPropModel, seed):
+    rng = np.random.default_rng(seed)
+    throttle = rng.uniform(0.3, 1., 8)
+    velocity = rng.uniform(0., 25., 8)
+    newton = operatingPoints(syntheticPropModel, throttle, velocity, False)
+    powerBalance = operatingPoints(syntheticPropModel, throttle, velocity, True)
+    for name, value in newton.items():
+        np.testing.assert_allclose(powerBalance[name], value, rtol = 1e-7, err_msg = name)
+
+def test_power_balance_solver_converges_every_node(syntheticPropModel):
+    # From idle throttle to full throttle and from static to well past the prop's zero thrust speed
+    throttle, velocity = [values.ravel() for values in np.meshgrid(np.linspace(0.1, 1., 5), np.linspace(0., 60., 7))]
+    result = operatingPoints(syntheticPropModel, throttle, velocity, True)
+    residual = result['battery.power'] + result['esc.power'] + result['motor.power'] + result['prop.power']
+    np.testing.assert_array_less(np.abs(residual), 1e-6 * np.maximum(np.abs(result['battery.power']), 1.))
+    assert np.all(result['motor.rpm'] > 0)
+
+@pytest.mark.parametrize('atol, currentTol', [(1e-300, 1e-10), (1e-8, 1e3)])
+def test_collapsed_bracket_is_converged(syntheticPropModel, atol, currentTol):
+    # An unreachable atol is met by the bracket narrowing below current_tol instead, and a wide
+    # current_tol stops the solve as soon as every bracket is that narrow
+    prob = om.Problem(reports = None)
+    prob.model.add_subsystem('electric_propulsion', ElectricPropulsion(num_nodes = 6, power_balance_solver = True, prop_model_dir = syntheticPropModel, prop_fidelity = 'parametric'), promotes = ['*'])
+    prob.setup()
+    solver = prob.model.electric_propulsion.nonlinear_solver
+    solver.options.update({'atol': atol, 'rtol': 1e-300, 'current_tol': currentTol, 'err_on_non_converge': True})
+    for name, value in design.items():
+        prob.set_val(name, value)
+    prob.set_val('esc.throttle', np.linspace(0.1, 1., 6))
+    prob.set_val('prop.velocity', np.linspace(0., 30., 6))
+    prob.set_val('power_net.current', 10.)
+    prob.run_model()
+
+    assert solver._iter_count < solver.options['maxiter']
+    assert np.all(solver._currentUpper - solver._currentLower <= currentTol)
+    if currentTol > 1:
+        assert solver._iter_count == 1
+
+def test_cached_operating_points_match_solved(syntheticPropModel):
+    throttle = np.linspace(0.4, 1., 6)
+    velocity = np.linspace(0., 20., 6)
+    evaluationCache = EvaluationCache()
+    solved = operatingPoints(syntheticPropModel, throttle, velocity, True, evaluationCache)
+    replayed = operatingPoints(syntheticPropModel, throttle, velocity, True, evaluationCache)
+    for name, value in solved.items():
+        np.testing.assert_allclose(replayed[name], value, rtol = 1e-12, err_msg = name)
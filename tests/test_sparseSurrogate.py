@@ -0,0 +1,72 @@
+import os
+import numpy as np
+import openmdao.api as om
+from sparseSurrogate import SparseKrigingSurrogate, farthestPointSample
+from compiledSurrogate import CompiledKrigingSurrogate
+from syntheticData import syntheticPropData
+
+propInputNames = ['diameter', 'pitch', 'rpm', 'velocity']
+
+def propTable(nPoints, seed):
+    data = syntheticPropData(nPoints, seed = seed)
+    return np.column_stack([data[name] for name in propInputNames]), np.column_stack([data['thrust'], data['power']])
+
+def test_farthest_point_sample_spreads_points():
+    X = np.linspace(-1., 1., 11)[:, np.newaxis]
+    np.testing.assert_array_equal(farthestPointSample(X, 3), [5, 0, 10])
+    assert len(set(farthestPointSample(X, 11))) == 11
+
+def test_sparse_surrogate_accuracy_against_dense_kriging():
+    x, y = propTable(300, 1)
+    xQuery, yQuery = propTable(100, 2)
+    yStd = np.std(yQuery, axis = 0)
+
+    surrogate = SparseKrigingSurrogate(num_inducing = 100, cache_dir = None)
+    surrogate.train(x, y)
+    denseSurrogate = om.KrigingSurrogate(lapack_driver = 'gesdd')
+    denseSurrogate.train(x, y)
+
+    # Normalized RMS error on held-out points: the sparse surrogate through a third of the training
+    # points is no worse than dense Kriging on all of them
+    errorSparse = np.sqrt(np.mean(((surrogate.vectorized_predict(xQuery) - yQuery) / yStd)**2, axis = 0))
+    errorDense = np.sqrt(np.mean(((np.array([denseSurrogate.predict(point)[0] for point in xQuery]) - yQuery) / yStd)**2, axis = 0))
+    assert np.all(errorSparse < 2e-2)
+    assert np.all(errorSparse < 2 * errorDense)
+
+def test_sparse_surrogate_cache_round_trip(tmp_path, monkeypatch):
+    x, y = propTable(200, 1)
+    xQuery, _ = propTable(20, 2)
+
+    surrogate = SparseKrigingSurrogate(num_inducing = 50, eval_rmse = True, cache_dir = str(tmp_path))
+    surrogate.train(x, y)
+    prediction, rmse = surrogate.vectorized_predict(xQuery)
+    pathCache = surrogate.cachePath(x, y)
+    assert os.listdir(tmp_path) == [os.path.basename(pathCache)]
+
+    # A second training on the same data loads the cache entry instead of fitting
+    def fitNotAllowed(self, x, y, pathCache):
+        raise AssertionError('fit despite a cache entry')
+    monkeypatch.setattr(SparseKrigingSurrogate, '_fit', fitNotAllowed)
+    cachedSurrogate = SparseKrigingSurrogate(num_inducing = 50, eval_rmse = True, cache_dir = str(tmp_path))
+    cachedSurrogate.train(x, y)
+    for predictionCached, predictionTrained in zip(cachedSurrogate.vectorized_predict(xQuery), [prediction, rmse]):
+        np.testing.assert_array_equal(predictionCached, predictionTrained)
+
+    # The cache entry is in the compiled format
+    compiledSurrogate = CompiledKrigingSurrogate(path = pathCache, eval_rmse = True)
+    for predictionCompiled, predictionTrained in zip(compiledSurrogate.vectorized_predict(xQuery), [prediction, rmse]):
+        np.testing.assert_array_equal(predictionCompiled, predictionTrained)
+    np.testing.assert_array_equal(compiledSurrogate.vectorized_linearize(xQuery), surrogate.vectorized_linearize(xQuery))
+
+def test_chunked_training_matches_unchunked():
+    x, y = propTable(300, 1)
+    xQuery, _ = propTable(50, 2)
+
+    surrogate = SparseKrigingSurrogate(num_inducing = 60, cache_dir = None)
+    surrogate.train(x, y)
+    chunkedSurrogate = SparseKrigingSurrogate(num_inducing = 60, chunk_size = 7, cache_dir = None)
+    chunkedSurrogate.train(x, y)
+
+    np.testing.assert_array_equal(chunkedSurrogate.thetas, surrogate.thetas)
+    prediction = surrogate.vectorized_predict(xQuery)
+    np.testing.assert_allclose(chunkedSurrogate.vectorized_predict(xQuery), prediction, rtol = 0, atol = 1e-8 * np.abs(prediction).max())
@@ -0,0 +1,98 @@
+import os
+import shutil
+import time
+import numpy as np
+import openmdao.api as om
+import motorModelOpenmdog
+from motorModelOpenmdog import ElectricPropulsion
+from columnarData import loadSurrogateModelData, saveSurrogateModelData
+from evaluationCache import EvaluationCache
+from surrogateCache import surrogateCacheKey, evictSurrogateCache
+
+def thrustAtFullThrottle(dirModel, evaluationCache):
+    prob = om.Problem(reports = None)
+    prob.model.add_subsystem('electric_propulsion', ElectricPropulsion(num_nodes = 3, power_balance_solver = True, prop_model_dir = dirModel, prop_fidelity = 'parametric', evaluation_cache = evaluationCache), promotes = ['*'])
+    prob.setup()
+    for name, value in {'battery.voltage_supply': 22.2, 'battery.resistance': 0.012, 'motor.kv': 400., 'motor.resistance': 0.015, 'motor.idle_current': 1., 'prop.diameter': 12., 'prop.pitch': 6., 'esc.throttle': 1.}.items():
+        prob.set_val(name, value)
+    prob.set_val('prop.velocity', [0., 10., 20.])
+    prob.set_val('power_net.current', 10.)
+    prob.run_model()
+    return prob.get_val('prop.thrust').copy()
+
+def test_cache_key_follows_content():
+    x = np.arange(12.).reshape(4, 3)
+    y = np.arange(4.)
+    settings = {'nugget': 1e-10, 'eval_rmse': True}
+    key = surrogateCacheKey(x, y, settings)
+    assert surrogateCacheKey(x.copy(), y.copy(), dict(settings)) == key
+    assert surrogateCacheKey(x + 1e-12, y, settings) != key
+    assert surrogateCacheKey(x, y, dict(settings, nugget = 1e-9)) != key
+
+def test_persisted_evaluations_not_served_after_retraining(syntheticPropModel, tmp_path, monkeypatch):
+    # The prop and operating point tags follow the training data, not the model directory, so a
+    # persisted cache misses after the data changes instead of replaying the old operating points
+    dirModel = str(tmp_path / 'prop_model')
+    shutil.copytree(syntheticPropModel, dirModel)
+    pathCache = str(tmp_path / 'evaluations.pickle')
+
+    monkeypatch.setattr(motorModelOpenmdog, 'propSurrogateRegistry', {})
+    evaluationCache = EvaluationCache(path = pathCache)
+    thrust = thrustAtFullThrottle(dirModel, evaluationCache)
+    evaluationCache.save()
+
+    # Same data in a new process: every operating point is replayed from the file
+    monkeypatch.setattr(motorModelOpenmdog, 'propSurrogateRegistry', {})
+    evaluationCache = EvaluationCache(path = pathCache)
+    np.testing.assert_allclose(thrustAtFullThrottle(dirModel, evaluationCache), thrust)
+    assert evaluationCache.statistics()['misses'] == 0
+
+    surrogateModelData = {name: np.array(column) for name, column in loadSurrogateModelData(dirModel, mmap = False).items()}
+    surrogateModelData['thrust'] = 2 * surrogateModelData['thrust']
+    saveSurrogateModelData(dirModel, surrogateModelData)
+
+    monkeypatch.setattr(motorModelOpenmdog, 'propSurrogateRegistry', {})
+    evaluationCache = EvaluationCache(path = pathCache)
+    np.testing.assert_allclose(thrustAtFullThrottle(dirModel, evaluationCache), 2 * thrust, rtol = 1e-6)
+
+def cacheFile(dirCache, name, age, size = 100):
+    path = os.path.join(dirCache, name)
+    with open(path, 'wb') as fileCache:
+        fileCache.write(b'\0' * size)
+    os.utime(path, (time.time() - age, time.time() - age))
+    return path
+
+def test_eviction_removes_companion_files_together(tmp_path):
+    dirCache = str(tmp_path)
+    cacheFile(dirCache, 'aaaa.npz', 1000)
+    cacheFile(dirCache, 'aaaa.compiled.npz', 10)
+    cacheFile(dirCache, 'bbbb.npz', 1000)
+    cacheFile(dirCache, 'bbbb.compiled.npz', 1000)
+    cacheFile(dirCache, 'cccc.json', 1000)
+    cacheFile(dirCache, 'thrustCurve_evaluations.pickle', 1000)
+
+    # A recently used compiled export keeps its Kriging entry
+    evicted = evictSurrogateCache(dirCache, maxAge = 100)
+    assert sorted(os.path.basename(path) for path in evicted) == ['bbbb.compiled.npz', 'bbbb.npz', 'cccc.json', 'thrustCurve_evaluations.pickle']
+    assert sorted(os.listdir(dirCache)) == ['aaaa.compiled.npz', 'aaaa.npz']
+
+def test_eviction_to_size_and_keep(tmp_path):
+    dirCache = str(tmp_path)
+    pathOld = cacheFile(dirCache, 'aaaa.npz', 300)
+    cacheFile(dirCache, 'bbbb.npz', 200)
+    cacheFile(dirCache, 'bbbb.compiled.npz', 200)
+    cacheFile(dirCache, 'cccc.npz', 100)
+
+    evicted = evictSurrogateCache(dirCache, maxBytes = 250, keep = [pathOld])
+    assert sorted(os.path.basename(path) for path in evicted) == ['bbbb.compiled.npz', 'bbbb.npz']
+    assert sorted(os.listdir(dirCache)) == ['aaaa.npz', 'cccc.npz']
+
+def test_eviction_removes_stale_temporary_files(tmp_path):
+    dirCache = str(tmp_path)
+    cacheFile(dirCache, 'aaaa.npz', 10)
+    cacheFile(dirCache, 'aaaa.npz.123.tmp', 7200)
+    cacheFile(dirCache, 'bbbb.npz.456.tmp', 10)
+
+    evicted = evictSurrogateCache(dirCache)
+    assert [os.path.basename(path) for path in evicted] == ['aaaa.npz.123.tmp']
+    assert sorted(os.listdir(dirCache)) == ['aaaa.npz', 'bbbb.npz.456.tmp']
@@ -0,0 +1,92 @@
+import os
+import socket
+import threading
+from multiprocessing import AuthenticationError
+import numpy as np
+import pytest
+import openmdao.api as om
+import surrogateServer
+from surrogateServer import SurrogateServer, SurrogateClient, authkeyPath
+from motorModelOpenmdog import ElectricPropulsion, loadPropSurrogates
+
+def startServer(address, propModel, authkey = None):
+    server = SurrogateServer(address, authkey, propOptions = {'prop_model_dir': propModel, 'prop_fidelity': 'parametric'})
+    thread = threading.Thread(target = server.serve, daemon = True)
+    thread.start()
+    return thread
+
+@pytest.fixture
+def runtimeDirectory(tmp_path, monkeypatch):
+    # Generated keys go to a private directory of the test instead of the user's runtime directory
+    monkeypatch.setattr(surrogateServer, 'dirRuntime', str(tmp_path / 'runtime'))
+    return tmp_path
+
+def test_round_trip_matches_in_process(syntheticPropModel, runtimeDirectory):
+    address = str(runtimeDirectory / 'server.sock')
+    thread = startServer(address, syntheticPropModel)
+
+    with SurrogateClient(address, timeout = 10.) as client:
+        diameter, pitch, rpm, velocity = np.array([10., 12., 14.]), np.array([5., 6., 8.]), np.array([6000., 5000., 4000.]), np.array([0., 10., 15.])
+        result = client.predictProp(diameter, pitch, rpm, velocity, linearize = True)
+        propSurrogate = loadPropSurrogates(syntheticPropModel, 'compiled', False, True, 'parametric')['thrust'].multiOutputSurrogate
+        x = np.column_stack([diameter, pitch, rpm, velocity])
+        prediction = propSurrogate.predict(x)
+        for output in ['thrust', 'power']:
+            np.testing.assert_allclose(result[output], prediction[output][0][:, 0], rtol = 1e-12)
+        jacobian = propSurrogate.linearize(x)
+        np.testing.assert_allclose(result['jacobian'], np.concatenate([jacobian[output] for output in ['thrust', 'power']], axis = 1), rtol = 1e-12)
+
+        inputs = {'voltage': 22.2, 'battery_resistance': 0.012, 'kv': 400., 'idle_current': 1., 'motor_resistance': 0.015, 'diameter': 12., 'pitch': 6., 'throttle': [0.6, 0.8, 1.], 'velocity': [0., 5., 10.]}
+        operatingPoints = client.operatingPoints(**inputs)
+
+        prob = om.Problem(reports = None)
+        prob.model.add_subsystem('electric_propulsion', ElectricPropulsion(num_nodes = 3, power_balance_solver = True, prop_model_dir = syntheticPropModel, prop_fidelity = 'parametric'), promotes = ['*'])
+        prob.setup()
+        for name, value in inputs.items():
+            prob.set_val(surrogateServer.performanceMapInputs[name], value)
+        prob.set_val('power_net.current', 10.)
+        prob.run_model()
+        for output in ['prop.thrust', 'battery.power', 'power_net.current']:
+            np.testing.assert_allclose(operatingPoints[output], prob.get_val(output), rtol = 1e-8)
+
+        assert client.shutdown()
+    thread.join(10.)
+    assert not thread.is_alive()
+
+def test_wrong_authkey_is_rejected(syntheticPropModel, runtimeDirectory):
+    address = str(runtimeDirectory / 'server.sock')
+    thread = startServer(address, syntheticPropModel, authkey = b'right key')
+
+    with pytest.raises(AuthenticationError):
+        SurrogateClient(address, authkey = b'wrong key', timeout = 10.)
+
+    # A second server with another key must not remove the socket of the live one
+    with pytest.raises(RuntimeError, match = 'already listening'):
+        SurrogateServer(address, b'another key', propOptions = {'prop_model_dir': syntheticPropModel, 'prop_fidelity': 'parametric'}, preloadNodes = ()).removeStaleSocket()
+    assert os.path.exists(address)
+
+    with SurrogateClient(address, authkey = b'right key') as client:
+        assert client.ping()['pid'] == os.getpid()
+        client.shutdown()
+    thread.join(10.)
+    assert not thread.is_alive()
+
+def test_stale_socket_is_removed_and_shutdown_cleans_up(syntheticPropModel, runtimeDirectory):
+    # A socket file left by a server that died without closing its listener
+    address = str(runtimeDirectory / 'server.sock')
+    staleSocket = socket.socket(socket.AF_UNIX)
+    staleSocket.bind(address)
+    staleSocket.close()
+    assert os.path.exists(address)
+
+    thread = startServer(address, syntheticPropModel)
+    with SurrogateClient(address, timeout = 10.) as client:
+        assert client.ping()['pid'] == os.getpid()
+        assert os.path.exists(authkeyPath(address))
+        assert client.shutdown()
+    thread.join(10.)
+
+    # The accept loop ends and the socket and generated key are removed
+    assert not thread.is_alive()
+    assert not os.path.exists(address)
+    assert not os.path.exists(authkeyPath(address))
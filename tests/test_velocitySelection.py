@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from createMotorSurrogateModels import velocityDecimationPattern, selectVelocitySamples
+
+def legacyLogicalKeep(motorPerformanceData):
+
+    # The per-group loop of the original createMotorModel, kept verbatim as the reference
+    nPoints = motorPerformanceData['propDiameter'].size
+
+    propDiameterBreakpoints = np.unique(motorPerformanceData['propDiameter'])
+    throttleBreakpoints = np.unique(motorPerformanceData['throttle'])
+    logicalKeep = np.zeros(nPoints, dtype = bool)
+
+    for propDiameterBreakpoint in propDiameterBreakpoints:
+        propPitchBreakpoints = np.unique(motorPerformanceData['propPitch'][motorPerformanceData['propDiameter'] == propDiameterBreakpoint])
+        for propPitchBreakpoint in propPitchBreakpoints:
+            for throttleBreakpoint in throttleBreakpoints:
+                logicalBreakpoint = np.logical_and.reduce((motorPerformanceData['propDiameter'] == propDiameterBreakpoint, motorPerformanceData['propPitch'] == propPitchBreakpoint, motorPerformanceData['throttle'] == throttleBreakpoint))
+                velocityBreakpoints = motorPerformanceData['velocity'][logicalBreakpoint]
+
+                nBreakpoints = velocityBreakpoints.size
+                nSamples = 10
+                nIntervals = nSamples - 1
+
+                if nBreakpoints > nSamples:
+                    nRemove = nBreakpoints - nSamples
+                    idxMiddle = nSamples // 2 - 1
+                    idxOffMiddle = np.setdiff1d(np.arange(nIntervals), idxMiddle)
+                    nOffMiddle = abs(idxOffMiddle - idxMiddle)
+                    nPattern = 2*nOffMiddle - 1
+                    nGroup = nRemove // nIntervals
+                    idxGroupStart = nGroup*nIntervals
+
+                    nSkip = np.zeros(nIntervals, dtype = int)
+                    nSkip[idxMiddle] = nGroup + (nRemove - idxGroupStart) % 2
+                    nSkip[idxOffMiddle] = np.ceil((nRemove - nPattern) / nIntervals)
+
+                    nIncrement = nSkip + 1
+                    idxKeep = np.cumsum(np.append(1, nIncrement)) - 1
+                    logicalKeepLocal = np.zeros(nBreakpoints, dtype = bool)
+                    logicalKeepLocal[idxKeep] = True
+
+                else:
+                    logicalKeepLocal = np.ones(nBreakpoints, dtype = bool)
+
+                logicalKeep[logicalBreakpoint] = logicalKeepLocal
+
+    return logicalKeep
+
+def performanceTable(groupSizes, seed = 0, shuffle = True):
+
+    # One (propDiameter, propPitch, throttle) group per size with increasing velocities, rows
+    # optionally shuffled so groups are interleaved
+    rng = np.random.default_rng(seed)
+    columns = {name: [] for name in ['propDiameter', 'propPitch', 'throttle', 'velocity']}
+    combinations = [(diameter, pitch, throttle) for diameter in [9., 10.5, 12., 14.] for pitch in [4., 5.5, 7.] for throttle in [0.25, 0.5, 0.75, 1.]]
+    for (diameter, pitch, throttle), nBreakpoints in zip(rng.permutation(combinations), groupSizes):
+        columns['propDiameter'].append(np.full(nBreakpoints, diameter))
+        columns['propPitch'].append(np.full(nBreakpoints, pitch))
+        columns['throttle'].append(np.full(nBreakpoints, throttle))
+        columns['velocity'].append(np.sort(rng.uniform(0, 40, nBreakpoints)))
+    table = {name: np.concatenate(values) if values else np.zeros(0) for name, values in columns.items()}
+    if shuffle:
+        idxShuffle = rng.permutation(table['velocity'].size)
+        table = {name: column[idxShuffle] for name, column in table.items()}
+    return table
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_tables_match_legacy_loop(seed):
+    rng = np.random.default_rng(seed)
+    groupSizes = rng.integers(1, 60, rng.integers(1, 48))
+    table = performanceTable(groupSizes, seed)
+    np.testing.assert_array_equal(selectVelocitySamples(table), legacyLogicalKeep(table))
+
+@pytest.mark.parametrize('groupSizes', [[1], [10], [11], [19], [20], [9, 10, 11], [100, 3, 100], list(range(1, 48))])
+@pytest.mark.parametrize('shuffle', [False, True])
+def test_edge_case_tables_match_legacy_loop(groupSizes, shuffle):
+    table = performanceTable(groupSizes, shuffle = shuffle)
+    np.testing.assert_array_equal(selectVelocitySamples(table), legacyLogicalKeep(table))
+
+def test_empty_table():
+    table = performanceTable([])
+    assert selectVelocitySamples(table).shape == (0,)
+
+@pytest.mark.parametrize('nBreakpoints', range(1, 80))
+def test_pattern_keeps_samples_and_ends(nBreakpoints):
+    logicalKeepLocal = velocityDecimationPattern(nBreakpoints)
+    assert logicalKeepLocal.size == nBreakpoints
+    assert logicalKeepLocal.sum() == min(nBreakpoints, 10)
+    assert logicalKeepLocal[0]
@@ -1,4 +1,5 @@
 import os
+import argparse
 import pickle
 import time
 import numpy as np
@@ -6,6 +7,10 @@ import scipy as sc
 import openmdao.api as om
 import matplotlib.pyplot as plt
 from motorModelOpenmdog import *
+from operatingPoint import limitThrottle
+from evaluationCache import EvaluationCache
+from instrumentation import Profiler
+from surrogateCache import dirSurrogateCache
 
 '''
 class MotorPropeller(om.ExplicitComponent):
@@ -29,86 +34,57 @@ class MotorPropeller(om.ExplicitComponent):
 
 # plt.rcParams["figure.autolayout"] = True
 
+parser = argparse.ArgumentParser(description = 'Plot full throttle and power limited thrust curves')
+parser.add_argument('--evaluation-cache', nargs = '?', default = None, const = os.path.join(dirSurrogateCache, 'thrustCurve_evaluations.pickle'), help = 'keep the operating points in an evaluation cache file between runs (default when given without a path: %(const)s, evicted with the surrogate cache)')
+args = parser.parse_args()
+
+vMax = 60
+n = 51
+velocity = np.linspace(0, vMax, n)
+
+# Every velocity is a node of one vectorized model converged by the power balance solver, so the
+# full-throttle curve is a single run_model and the power-limited curve a throttle search over all
+# velocities at once. With --evaluation-cache the operating points are kept between runs, so
+# replotting the same curves replays them without solving
+evaluationCache = None if args.evaluation_cache is None else EvaluationCache(path = args.evaluation_cache)
+profiler = Profiler().start()
+
 prob = om.Problem()
 model = prob.model
-model.nonlinear_solver = om.NewtonSolver(solve_subsystems = False)
-model.linear_solver = om.DirectSolver()
-model.add_subsystem('electric_propulsion', ElectricPropulsion(), promotes = ['*'])
-model.add_design_var('esc.throttle', lower = 0, upper = 1)
-model.add_objective('prop.thrust', scaler = -1)
-model.add_constraint('battery.power', upper = 1000, units = 'W')
-
-prob.driver = om.pyOptSparseDriver(optimizer = 'IPOPT')
-# prob.driver.options['disp'] = True
+model.add_subsystem('electric_propulsion', ElectricPropulsion(num_nodes = n, power_balance_solver = True, evaluation_cache = evaluationCache), promotes = ['*'])
 prob.setup()
 
 prob.set_val('battery.voltage_supply', 22.2, units = 'V')
 prob.set_val('battery.resistance', 0.012, units = 'ohm')
 prob.set_val('motor.kv', 280, units = 'rpm / V')
-prob.set_val('motor.current_idle', 1.2, units = 'A')
+prob.set_val('motor.idle_current', 1.2, units = 'A')
 prob.set_val('motor.resistance', 26.3, units = 'mohm')
 prob.set_val('prop.diameter', 22, units = 'inch')
 prob.set_val('prop.pitch', 10, units = 'inch')
 
-vMax = 60
-n = 51
-velocity = np.linspace(0, vMax, n)
+prob.set_val('esc.throttle', 1)
+prob.set_val('prop.velocity', velocity, units = 'mi / h')
+prob.set_val('power_net.current', 10, units = 'A')
+prob.run_model()
 
-thrustFullThrottle = np.zeros(n)
-thrustPowerLimited = np.zeros(n)
-powerFullThrottle = np.zeros(n)
-efficiencyFullThrottle = np.zeros(n)
-
-powerPowerLimited = np.zeros(n)
-throttleFullThrottle = np.zeros(n)
-throttlePowerLimited = np.zeros(n)
-efficiencyPowerLimited = np.zeros(n)
-
-for idxV, v in enumerate(velocity):
-    prob.set_val('esc.throttle', 1)
-    prob.set_val('prop.velocity', v, units = 'mi / h')
-    prob.set_val('power_net.current', 10, units = 'A')
-    prob.run_model()
-    thrustFullThrottle[idxV] = prob.get_val('prop.thrust', units = 'lbf')
-    powerFullThrottle[idxV] = prob.get_val('battery.power', units = 'W')
-    throttleFullThrottle[idxV] = prob.get_val('esc.throttle')
-    efficiencyFullThrottle[idxV] = prob.get_val('prop.thrust', units = 'N') * prob.get_val('prop.velocity', units = 'm / s') / (prob.get_val('battery.voltage_supply', units = 'V') * prob.get_val('battery.current', units = 'A'))
-
-    '''
-    if velocity[idxV] > 58.0:
-        
-        n = 21
-        throttleAtVelocity = np.linspace(0, 1, n)
-        thrustAtVelocity = np.zeros(n)
-        powerAtVelocity = np.zeros(n)
-        for idxT, t in enumerate(throttleAtVelocity):
-            prob.set_val('motorModel.throttle', t)
-            prob.run_model()
-            thrustAtVelocity[idxT] = prob.get_val('motorModel.thrust')*0.224809
-            powerAtVelocity[idxT] = prob.get_val('motorModel.inputPower')
-
-        fig = plt.figure()
-        grid = fig.add_gridspec(2, hspace = 0)
-        axes = grid.subplots(sharex = True)
-        fig.suptitle(f'{motor}, {velocity[idxV]:.2f} mph')
-
-        y = [thrustAtVelocity, powerAtVelocity]
-        yLabels = ['Thrust (lb)', 'Power (W)']
-
-        for idxPlot, ax in enumerate(axes):
-            axes[idxPlot].plot(throttleAtVelocity, y[idxPlot])
-            axes[idxPlot].set(xlabel = 'Throttle', ylabel = yLabels[idxPlot], xlim = [0, 1])
-            axes[idxPlot].label_outer()
-
-        plt.show()
-    '''
-
-    prob.run_driver()
-    
-    thrustPowerLimited[idxV] = prob.get_val('prop.thrust', units = 'lbf')
-    powerPowerLimited[idxV] = prob.get_val('battery.power', units = 'W')
-    throttlePowerLimited[idxV] = prob.get_val('esc.throttle')
-    efficiencyPowerLimited[idxV] = prob.get_val('prop.thrust', units = 'N') * prob.get_val('prop.velocity', units = 'm / s') / (prob.get_val('battery.voltage_supply', units = 'V') * prob.get_val('battery.current', units = 'A'))
+thrustFullThrottle = prob.get_val('prop.thrust', units = 'lbf').copy()
+powerFullThrottle = prob.get_val('battery.power', units = 'W').copy()
+throttleFullThrottle = prob.get_val('esc.throttle').copy()
+efficiencyFullThrottle = prob.get_val('prop.thrust', units = 'N') * prob.get_val('prop.velocity', units = 'm / s') / (prob.get_val('battery.voltage_supply', units = 'V') * prob.get_val('battery.current', units = 'A'))
+
+limitThrottle(prob, 'power', 1000, units = 'W')
+
+thrustPowerLimited = prob.get_val('prop.thrust', units = 'lbf').copy()
+powerPowerLimited = prob.get_val('battery.power', units = 'W').copy()
+throttlePowerLimited = prob.get_val('esc.throttle').copy()
+efficiencyPowerLimited = prob.get_val('prop.thrust', units = 'N') * prob.get_val('prop.velocity', units = 'm / s') / (prob.get_val('battery.voltage_supply', units = 'V') * prob.get_val('battery.current', units = 'A'))
+
+profiler.stop()
+print(profiler.report())
+
+if evaluationCache is not None:
+    evaluationCache.save()
+    print('Evaluation cache', evaluationCache.statistics())
 
 fig = plt.figure()
 grid = fig.add_gridspec(4, hspace = 0.5)